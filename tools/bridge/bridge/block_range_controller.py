@@ -0,0 +1,93 @@
+import re
+
+from requests.exceptions import Timeout
+
+# Error messages of different clients for eth_getLogs requests whose block
+# range or response would be too large, e.g. "query returned more than 10000
+# results". Rate limiting errors like "too many requests" must not match, as
+# shrinking the range would only cause more requests.
+RANGE_TOO_LARGE_ERROR_MESSAGE_PATTERN = re.compile(
+    r"more than \d+ results|query returned more than|block range|response size"
+    r"|timed? ?out",
+    re.IGNORECASE,
+)
+
+
+def is_range_too_large_error(error: Exception) -> bool:
+    """Check if an error of an eth_getLogs request indicates a too large block range
+
+    Besides explicit errors about the size of the result, timeouts are
+    considered to be caused by a too large range as well.
+    """
+    if isinstance(error, Timeout):
+        return True
+
+    if isinstance(error, ValueError) and error.args:
+        error_details = error.args[0]
+        if isinstance(error_details, dict):
+            error_message = str(error_details.get("message", ""))
+        else:
+            error_message = str(error_details)
+        return bool(RANGE_TOO_LARGE_ERROR_MESSAGE_PATTERN.search(error_message))
+
+    return False
+
+
+class BlockRangeController:
+    """Chooses the number of blocks to fetch events for at once
+
+    The range grows geometrically as long as the fetched ranges are sparse
+    and gets bisected whenever the node failed to deliver the events of a
+    range. After a failure, the range does not grow to the failed size again
+    before a number of consecutive ranges have been fetched successfully, so
+    a dense region does not cause a failing request on every growth step.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_size: int,
+        max_size: int,
+        growth_factor: int = 2,
+        sparse_event_count: int = 100,
+        successes_until_retrying_failed_size: int = 10,
+    ) -> None:
+        if initial_size <= 0:
+            raise ValueError("Block range size must be positive!")
+
+        if max_size < initial_size:
+            raise ValueError(
+                "Maximum block range size must not be below the initial size!"
+            )
+
+        if growth_factor < 1:
+            raise ValueError("Block range growth factor must be at least one!")
+
+        self.size = initial_size
+        self.max_size = max_size
+        self.growth_factor = growth_factor
+        self.sparse_event_count = sparse_event_count
+        self.successes_until_retrying_failed_size = successes_until_retrying_failed_size
+
+        self.failed_size = max_size + 1
+        self.successes_since_failure = 0
+
+    def record_success(self, range_size: int, event_count: int) -> None:
+        """Grow the range after a full sized range yielded only few events"""
+        self.successes_since_failure += 1
+        if self.successes_since_failure >= self.successes_until_retrying_failed_size:
+            self.failed_size = self.max_size + 1
+
+        if range_size >= self.size and event_count < self.sparse_event_count:
+            self.size = max(
+                min(
+                    self.size * self.growth_factor, self.max_size, self.failed_size - 1
+                ),
+                self.size,
+            )
+
+    def record_failure(self, range_size: int) -> None:
+        """Bisect the range after the node failed to deliver a range"""
+        self.failed_size = min(self.failed_size, range_size)
+        self.successes_since_failure = 0
+        self.size = min(self.size, max(range_size // 2, 1))
@@ -0,0 +1,234 @@
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from eth_typing import Hash32
+from eth_utils import to_checksum_address
+
+from bridge.constants import TRANSFER_EVENT_NAME
+from bridge.events import ChainEvent
+from bridge.transfer_recorder import TransferState
+
+
+class CheckpointStore:
+    """Persists the block number up to which events of a contract have been processed
+
+    Checkpoints are stored per contract address in a SQLite database, so that
+    the event fetchers can resume from them after a restart instead of
+    fetching all events again from their start block. Together with the
+    checkpoints, a snapshot of the transfer recorder of every validator is
+    stored, so that their state does not have to be rebuilt from the events
+    before the checkpoints.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints "
+                "(contract_address TEXT PRIMARY KEY, block_number INTEGER NOT NULL)"
+            )
+            # The columns of the transfer event are NULL if it has not been
+            # seen yet. Values are stored as text, since they do not fit into
+            # SQLite's 64 bit integers.
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS transfer_states "
+                "(validator_address TEXT NOT NULL, "
+                "transfer_hash BLOB NOT NULL, "
+                "transaction_hash BLOB, "
+                "log_index INTEGER, "
+                "block_number INTEGER, "
+                "value TEXT, "
+                "sender TEXT, "
+                "confirmation_block_number INTEGER, "
+                "completion_block_number INTEGER, "
+                "PRIMARY KEY (validator_address, transfer_hash))"
+            )
+            # the validators a snapshot has been stored for, as a validator
+            # without transfer states is indistinguishable from a new one
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_validators "
+                "(validator_address TEXT PRIMARY KEY)"
+            )
+
+    def load(self, contract_address: bytes) -> Optional[int]:
+        row = self.connection.execute(
+            "SELECT block_number FROM checkpoints WHERE contract_address = ?",
+            (to_checksum_address(contract_address),),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _store(self, contract_address: bytes, block_number: int) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO checkpoints (contract_address, block_number) "
+            "VALUES (?, ?)",
+            (to_checksum_address(contract_address), block_number),
+        )
+
+    def store(self, contract_address: bytes, block_number: int) -> None:
+        with self.connection:
+            self._store(contract_address, block_number)
+
+    def load_transfer_states(
+        self, validator_address: bytes
+    ) -> Dict[Hash32, TransferState]:
+        transfer_states = {}
+        for (
+            transfer_hash,
+            transaction_hash,
+            log_index,
+            block_number,
+            value,
+            sender,
+            confirmation_block_number,
+            completion_block_number,
+        ) in self.connection.execute(
+            "SELECT transfer_hash, transaction_hash, log_index, block_number, value, "
+            "sender, confirmation_block_number, completion_block_number "
+            "FROM transfer_states WHERE validator_address = ?",
+            (to_checksum_address(validator_address),),
+        ):
+            transfer_state = TransferState()
+            if transaction_hash is not None:
+                transfer_state.transfer_event = ChainEvent(
+                    event=TRANSFER_EVENT_NAME,
+                    transactionHash=Hash32(transaction_hash),
+                    logIndex=log_index,
+                    blockNumber=block_number,
+                    value=int(value),
+                    sender=sender,
+                    transferHash=Hash32(transfer_hash),
+                )
+            transfer_state.confirmation_block_number = confirmation_block_number
+            transfer_state.completion_block_number = completion_block_number
+            transfer_states[Hash32(transfer_hash)] = transfer_state
+
+        return transfer_states
+
+    def store_snapshot(
+        self,
+        checkpoints: Dict[bytes, int],
+        transfer_states: Dict[bytes, Dict[Hash32, Optional[TransferState]]],
+    ) -> None:
+        """store the checkpoints and the changed transfer states in a single transaction
+
+        The transfer states changed since the last snapshot are given per
+        validator address, None for transfers which are not tracked anymore.
+        Together with the stored ones, they have to reflect all events up to
+        the checkpoints. Only writing the changes keeps the transaction short
+        even if many transfers are tracked.
+        """
+        rows = []
+        deleted_keys: List[Tuple[str, Hash32]] = []
+        for validator_address, validator_transfer_states in transfer_states.items():
+            validator_checksum_address = to_checksum_address(validator_address)
+            rows.extend(
+                get_transfer_state_rows(
+                    validator_checksum_address,
+                    {
+                        transfer_hash: transfer_state
+                        for transfer_hash, transfer_state in validator_transfer_states.items()
+                        if transfer_state is not None
+                    },
+                )
+            )
+            deleted_keys.extend(
+                (validator_checksum_address, transfer_hash)
+                for transfer_hash, transfer_state in validator_transfer_states.items()
+                if transfer_state is None
+            )
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO snapshot_validators (validator_address) "
+                "VALUES (?)",
+                [
+                    (to_checksum_address(validator_address),)
+                    for validator_address in transfer_states.keys()
+                ],
+            )
+            self.connection.executemany(
+                "DELETE FROM transfer_states "
+                "WHERE validator_address = ? AND transfer_hash = ?",
+                deleted_keys,
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO transfer_states (validator_address, "
+                "transfer_hash, transaction_hash, log_index, block_number, value, "
+                "sender, confirmation_block_number, completion_block_number) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            for contract_address, block_number in checkpoints.items():
+                self._store(contract_address, block_number)
+
+    def forget_unrestorable_snapshots(
+        self, validator_addresses: Iterable[bytes]
+    ) -> bool:
+        """forget the snapshots which can not be restored for the given validators
+
+        The checkpoints are shared by all validators, so they are only valid
+        if there is a snapshot for every validator. Otherwise, the
+        checkpoints and all snapshots are forgotten, so all events are fetched
+        again from the start blocks. The snapshots of validators not given
+        are forgotten in any case. Returns whether stored checkpoints have
+        been forgotten.
+        """
+        checksum_addresses = {
+            to_checksum_address(validator_address)
+            for validator_address in validator_addresses
+        }
+        snapshot_addresses = {
+            validator_address
+            for (validator_address,) in self.connection.execute(
+                "SELECT validator_address FROM snapshot_validators"
+            )
+        }
+        with self.connection:
+            if not checksum_addresses <= snapshot_addresses:
+                number_of_checkpoints = self.connection.execute(
+                    "DELETE FROM checkpoints"
+                ).rowcount
+                self.connection.execute("DELETE FROM transfer_states")
+                self.connection.execute("DELETE FROM snapshot_validators")
+                return number_of_checkpoints > 0
+
+            for validator_address in snapshot_addresses - checksum_addresses:
+                self.connection.execute(
+                    "DELETE FROM transfer_states WHERE validator_address = ?",
+                    (validator_address,),
+                )
+                self.connection.execute(
+                    "DELETE FROM snapshot_validators WHERE validator_address = ?",
+                    (validator_address,),
+                )
+            return False
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_transfer_state_rows(
+    validator_address: str, transfer_states: Dict[Hash32, TransferState]
+) -> List[tuple]:
+    rows = []
+    for transfer_hash, transfer_state in transfer_states.items():
+        transfer_event = transfer_state.transfer_event
+        if transfer_event is None:
+            transfer_event_columns: tuple = (None, None, None, None, None)
+        else:
+            transfer_event_columns = (
+                transfer_event.transactionHash,
+                transfer_event.logIndex,
+                transfer_event.blockNumber,
+                str(transfer_event.value),
+                transfer_event.sender,
+            )
+        rows.append(
+            (validator_address, transfer_hash)
+            + transfer_event_columns
+            + (
+                transfer_state.confirmation_block_number,
+                transfer_state.completion_block_number,
+            )
+        )
+    return rows
@@ -0,0 +1,78 @@
+import logging
+from typing import Dict
+
+import gevent
+
+from bridge.checkpoint_store import CheckpointStore
+from bridge.confirmation_task_planner import ConfirmationTaskPlanner
+from bridge.event_fetcher import EventFetcher
+
+
+class CheckpointWriter:
+    """Periodically stores the checkpoints all planners consider to be safe
+
+    The planners of all validators share the event fetchers, so the stored
+    checkpoints are the lowest ones of all planners. They are stored together
+    with the transfer states the recorders of all planners changed since the
+    last snapshot in a single transaction. As the store does not yield to
+    other greenlets, the recorders can not change while being stored.
+    """
+
+    def __init__(
+        self,
+        *,
+        confirmation_task_planners: Dict[bytes, ConfirmationTaskPlanner],
+        transfer_event_fetcher: EventFetcher,
+        home_bridge_event_fetcher: EventFetcher,
+        checkpoint_store: CheckpointStore,
+        interval: float,
+    ) -> None:
+        self.logger = logging.getLogger("bridge.checkpoint_writer.CheckpointWriter")
+
+        self.confirmation_task_planners = confirmation_task_planners
+        self.transfer_event_fetcher = transfer_event_fetcher
+        self.home_bridge_event_fetcher = home_bridge_event_fetcher
+        self.checkpoint_store = checkpoint_store
+        self.interval = interval
+
+    def store_checkpoints(self) -> None:
+        transfer_checkpoints, home_bridge_checkpoints = zip(
+            *(
+                confirmation_task_planner.get_checkpoint_block_numbers()
+                for confirmation_task_planner in self.confirmation_task_planners.values()
+            )
+        )
+
+        if None in transfer_checkpoints or None in home_bridge_checkpoints:
+            self.logger.debug("Events of both chains have not been processed yet")
+            return
+
+        transfer_checkpoint = min(transfer_checkpoints)
+        home_bridge_checkpoint = min(home_bridge_checkpoints)
+
+        self.checkpoint_store.store_snapshot(
+            checkpoints={
+                self.transfer_event_fetcher.contract.address: transfer_checkpoint,
+                self.home_bridge_event_fetcher.contract.address: home_bridge_checkpoint,
+            },
+            transfer_states={
+                validator_address: (
+                    confirmation_task_planner.recorder.pop_changed_transfer_states()
+                )
+                for (
+                    validator_address,
+                    confirmation_task_planner,
+                ) in self.confirmation_task_planners.items()
+            },
+        )
+
+        self.logger.debug(
+            f"Stored checkpoints at foreign block {transfer_checkpoint} and home "
+            f"block {home_bridge_checkpoint}"
+        )
+
+    def run(self) -> None:
+        self.logger.info("Starting")
+        while True:
+            gevent.sleep(self.interval)
+            self.store_checkpoints()
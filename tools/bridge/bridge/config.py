@@ -1,5 +1,5 @@
 import os
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 import toml
 import validators
@@ -24,6 +24,18 @@ def validate_rpc_url(url: Any) -> str:
     return url
 
 
+def validate_optional_subscription_url(url: Any) -> Optional[str]:
+    if url is None:
+        return None
+    if not isinstance(url, str) or not (
+        url.startswith(("ws://", "wss://")) or os.path.isabs(url)
+    ):
+        raise ValueError(
+            f"{url} is neither a WebSocket url nor an absolute path to an IPC socket"
+        )
+    return url
+
+
 def validate_non_negative_integer(number: Any) -> int:
     if str(number) != str(int(number)):
         raise ValueError(f"{number} is not a valid integer")
@@ -34,6 +46,13 @@ def validate_non_negative_integer(number: Any) -> int:
     return number
 
 
+def validate_positive_integer(number: Any) -> int:
+    number = validate_non_negative_integer(number)
+    if number == 0:
+        raise ValueError(f"{number} must be positive")
+    return number
+
+
 def validate_positive_float(number: Any) -> float:
     if str(number) != str(float(number)) and str(number) != str(int(number)):
         raise ValueError(f"{number} is not a valid float")
@@ -44,6 +63,38 @@ def validate_positive_float(number: Any) -> float:
     return number
 
 
+def validate_boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError(f"{value} is not a valid boolean")
+
+
+def validate_optional_positive_integer(number: Any) -> Optional[int]:
+    if number is None:
+        return None
+    return validate_positive_integer(number)
+
+
+def validate_optional_port(port: Any) -> Optional[int]:
+    if port is None:
+        return None
+    port = validate_positive_integer(port)
+    if port > 65535:
+        raise ValueError(f"{port} is not a valid port")
+    return port
+
+
+def validate_confirmation_task_order(order: Any) -> str:
+    if order not in ("oldest", "largest_value"):
+        raise ValueError(
+            f"{order} is not a valid confirmation task order, "
+            f"use 'oldest' or 'largest_value'"
+        )
+    return order
+
+
 def validate_checksum_address(address: Any) -> bytes:
     if not is_checksum_address(address):
         raise ValueError(f"{address} is not a valid Ethereum checksum address")
@@ -67,6 +118,32 @@ def validate_private_key(private_key: Any) -> bytes:
     return private_key_bytes
 
 
+def validate_private_keys(private_keys: Any) -> List[bytes]:
+    """validate one or several private keys
+
+    Several keys can be given as a list or as a comma separated string.
+    """
+    if isinstance(private_keys, str):
+        private_keys = [private_key.strip() for private_key in private_keys.split(",")]
+    if not isinstance(private_keys, list) or not private_keys:
+        raise ValueError(f"Expected one or several private keys, got {private_keys}")
+
+    private_keys_bytes = [
+        validate_private_key(private_key) for private_key in private_keys
+    ]
+    if len(set(private_keys_bytes)) != len(private_keys_bytes):
+        raise ValueError("Private keys must not be given twice")
+    return private_keys_bytes
+
+
+def validate_optional_file_path(path: Any) -> Optional[str]:
+    if path is None:
+        return None
+    if not isinstance(path, str) or not path:
+        raise ValueError(f"{path} is not a valid file path")
+    return path
+
+
 def validate_logging(logging_dict: Dict) -> Dict:
     """validate the logging dictionary
 
@@ -89,34 +166,59 @@ REQUIRED_CONFIG_ENTRIES = [
 
 OPTIONAL_CONFIG_ENTRIES_WITH_DEFAULTS: Dict[str, Any] = {
     "logging": {},
+    "checkpoint_database_path": None,
     "home_rpc_timeout": 180,
+    "home_rpc_subscription_url": None,
     "home_chain_gas_price": 10 * 1000000000,  # Gas price is in GWei
     "home_chain_max_reorg_depth": 1,
+    "home_chain_max_concurrent_sends": 10,
     "home_chain_event_poll_interval": 5,
     "home_chain_event_fetch_start_block_number": 0,
+    "home_chain_event_fetch_prefetch_depth": 1,
+    "home_chain_event_fetch_follow_head": False,
+    # about a week of home chain blocks
+    "home_chain_orphan_event_max_age": 120_960,
     "foreign_rpc_timeout": 180,
+    "foreign_rpc_subscription_url": None,
     "foreign_chain_max_reorg_depth": 10,
     "foreign_chain_event_poll_interval": 5,
     "foreign_chain_event_fetch_start_block_number": 0,
+    "foreign_chain_event_fetch_prefetch_depth": 1,
+    "foreign_chain_event_fetch_follow_head": False,
+    "confirmation_task_order": "oldest",
+    "max_confirmation_tasks_per_tick": 100,
+    "metrics_port": None,
 }
 
 CONFIG_ENTRY_VALIDATORS = {
     "logging": validate_logging,
+    "checkpoint_database_path": validate_optional_file_path,
     "home_rpc_url": validate_rpc_url,
     "home_rpc_timeout": validate_non_negative_integer,
+    "home_rpc_subscription_url": validate_optional_subscription_url,
     "home_chain_gas_price": validate_non_negative_integer,
     "home_chain_max_reorg_depth": validate_non_negative_integer,
+    "home_chain_max_concurrent_sends": validate_positive_integer,
     "home_bridge_contract_address": validate_checksum_address,
     "home_chain_event_poll_interval": validate_non_negative_integer,
     "home_chain_event_fetch_start_block_number": validate_non_negative_integer,
+    "home_chain_event_fetch_prefetch_depth": validate_positive_integer,
+    "home_chain_event_fetch_follow_head": validate_boolean,
+    "home_chain_orphan_event_max_age": validate_non_negative_integer,
     "foreign_rpc_url": validate_rpc_url,
     "foreign_rpc_timeout": validate_non_negative_integer,
+    "foreign_rpc_subscription_url": validate_optional_subscription_url,
     "foreign_chain_max_reorg_depth": validate_non_negative_integer,
     "foreign_chain_event_poll_interval": validate_non_negative_integer,
     "foreign_chain_token_contract_address": validate_checksum_address,
     "foreign_bridge_contract_address": validate_checksum_address,
     "foreign_chain_event_fetch_start_block_number": validate_non_negative_integer,
-    "validator_private_key": validate_private_key,
+    "foreign_chain_event_fetch_prefetch_depth": validate_positive_integer,
+    "foreign_chain_event_fetch_follow_head": validate_boolean,
+    "confirmation_task_order": validate_confirmation_task_order,
+    "max_confirmation_tasks_per_tick": validate_optional_positive_integer,
+    "metrics_port": validate_optional_port,
+    "validator_private_key": validate_private_keys,
 }
 
 assert all(key in CONFIG_ENTRY_VALIDATORS for key in REQUIRED_CONFIG_ENTRIES)
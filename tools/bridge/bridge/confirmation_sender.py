@@ -1,24 +1,47 @@
 import logging
-from typing import Any, Dict
+from typing import Dict, List, NamedTuple, Optional
 
 import gevent
 from eth_keys.datatypes import PrivateKey
-from eth_utils import to_checksum_address
+from eth_utils import to_canonical_address, to_checksum_address
+from gevent.pool import Pool
 from gevent.queue import Queue
 from web3.contract import Contract
 from web3.exceptions import TransactionNotFound
 
+from bridge.confirmation_transaction import (
+    SignedTransaction,
+    encode_confirm_transfer_call,
+    sign_transaction,
+)
 from bridge.constants import (
     CONFIRMATION_TRANSACTION_GAS_LIMIT,
     HOME_CHAIN_STEP_DURATION,
+    VALIDATOR_STATUS_MAX_AGE,
 )
-from bridge.contract_validation import is_bridge_validator
 from bridge.event_fetcher import FetcherReachedHeadEvent
+from bridge.events import ChainEvent
+from bridge.head_tracker import HeadTracker
+from bridge.nonce_manager import NonceManager, is_nonce_error
 from bridge.utils import compute_transfer_hash
+from bridge.validator_status import ValidatorStatus
+
+
+class PendingTransaction(NamedTuple):
+    transaction: SignedTransaction
+    transfer_event: ChainEvent
 
 
 class ConfirmationSender:
-    """Sends confirmTransfer transactions to the home bridge contract."""
+    """Sends confirmTransfer transactions to the home bridge contract.
+
+    Transactions are signed one after another with locally allocated nonces
+    and then sent in the background, with up to `max_concurrent_sends`
+    transactions in flight. They are started in the order of their nonces.
+
+    Sent transactions are tracked by their nonce until they are confirmed
+    deep enough. Transactions the node does not know anymore are sent again.
+    """
 
     def __init__(
         self,
@@ -27,12 +50,25 @@ class ConfirmationSender:
         private_key: bytes,
         gas_price: int,
         max_reorg_depth: int,
+        head_tracker: Optional[HeadTracker] = None,
+        max_concurrent_sends: int = 10,
+        validator_status_max_age: float = VALIDATOR_STATUS_MAX_AGE,
     ):
         self.logger = logging.getLogger("bridge.confirmation_sender.ConfirmationSender")
+
+        if max_concurrent_sends <= 0:
+            raise ValueError(
+                "Can not send a zero or negative number of transactions at once!"
+            )
+
         self.private_key = private_key
-        self.address = PrivateKey(self.private_key).public_key.to_canonical_address()
+        self.signing_key = PrivateKey(self.private_key)
+        self.address = self.signing_key.public_key.to_canonical_address()
 
-        if not is_bridge_validator(home_bridge_contract, self.address):
+        self.validator_status = ValidatorStatus(
+            home_bridge_contract, self.address, max_age=validator_status_max_age
+        )
+        if not self.validator_status.check():
             self.logger.warning(
                 f"The address {self.address} is not a bridge validator to confirm "
                 f"transfers on the home bridge contract!"
@@ -40,13 +76,20 @@ class ConfirmationSender:
 
         self.transfer_event_queue = transfer_event_queue
         self.home_bridge_contract = home_bridge_contract
+        self.home_bridge_address = to_canonical_address(home_bridge_contract.address)
         self.gas_price = gas_price
         self.max_reorg_depth = max_reorg_depth
         self.w3 = self.home_bridge_contract.web3
-        self.pending_transaction_queue: Queue[Dict[str, Any]] = Queue()
-
-    def get_next_nonce(self):
-        return self.w3.eth.getTransactionCount(self.address, "pending")
+        self.head_tracker = head_tracker or HeadTracker(self.w3)
+        self.pending_transactions: Dict[int, PendingTransaction] = {}
+        self.nonce_manager = NonceManager(self.w3, self.address)
+        # set while a confirmation transaction is prepared and handed to the
+        # send pool, so that its nonce is not mistaken for a gap
+        self.is_confirming = False
+        self.send_pool = Pool(max_concurrent_sends)
+        # used to check on the pending transactions concurrently
+        self.request_pool = Pool(max_concurrent_sends)
+        self.chain_id: Optional[int] = None
 
     def run(self):
         self.logger.info("Starting")
@@ -59,6 +102,20 @@ class ConfirmationSender:
         finally:
             for greenlet in greenlets:
                 greenlet.kill()
+            self.send_pool.kill()
+            self.request_pool.kill()
+
+    def get_chain_id(self) -> int:
+        if self.chain_id is None:
+            self.chain_id = self.w3.eth.chainId
+        return self.chain_id
+
+    def has_transactions_in_flight(self) -> bool:
+        return (
+            self.is_confirming
+            or self.send_pool.free_count() < self.send_pool.size
+            or bool(self.pending_transactions)
+        )
 
     def send_confirmation_transactions(self):
         while True:
@@ -68,82 +125,211 @@ class ConfirmationSender:
                 # TODO: Needs to be handled
                 continue
 
-            if not is_bridge_validator(self.home_bridge_contract, self.address):
+            if not self.validator_status.check():
                 self.logger.warning(
                     f"Can not confirm transaction because {to_checksum_address(self.address)}"
                     f"is not a bridge validator!"
                 )
                 continue
 
+            self.confirm_transfer(transfer_event)
+
+    def confirm_transfer(self, transfer_event):
+        """sign a confirmation transaction and send it in the background"""
+        if self.nonce_manager.next_nonce is None:
+            # The nonce is synchronized with the node next, which has to know
+            # about all transactions sent before.
+            self.send_pool.join()
+
+        self.is_confirming = True
+        try:
             transaction = self.prepare_confirmation_transaction(transfer_event)
+            # blocks while max_concurrent_sends transactions are in flight
+            self.send_pool.spawn(
+                self.send_or_retry_confirmation_transaction, transaction, transfer_event
+            )
+        finally:
+            self.is_confirming = False
 
-            if transaction is not None:
-                self.send_confirmation_transaction(transaction)
+    def send_or_retry_confirmation_transaction(self, transaction, transfer_event):
+        """send a confirmation transaction, the transfer is confirmed again on failure
+
+        The nonce manager has been reset on failure, so the transfer gets
+        confirmed with a new nonce.
+        """
+        try:
+            self.send_confirmation_transaction(transaction, transfer_event)
+        except Exception as error:
+            if isinstance(error, ValueError) and is_nonce_error(error):
+                self.logger.warning(
+                    f"Nonce of confirmation transaction has been used already: {error}"
+                )
+                self.transfer_event_queue.put(transfer_event)
+                return
+
+            self.logger.exception(
+                f"Failed to send confirmation transaction {transaction.hash.hex()}, "
+                f"retrying later"
+            )
+            # the address might not be a validator anymore
+            self.validator_status.invalidate()
+            gevent.spawn_later(
+                HOME_CHAIN_STEP_DURATION, self.transfer_event_queue.put, transfer_event
+            )
 
     def prepare_confirmation_transaction(self, transfer_event):
-        nonce = self.get_next_nonce()
+        nonce = self.nonce_manager.allocate()
         self.logger.debug(
             f"Preparing confirmation transaction for address "
-            f"{transfer_event.args['from']} for {transfer_event.args.value} "
-            f"coins (nonce {nonce}, chain {self.w3.eth.chainId})"
+            f"{transfer_event.sender} for {transfer_event.value} "
+            f"coins (nonce {nonce}, chain {self.get_chain_id()})"
         )
 
         # hard code gas limit to avoid executing the transaction (which would fail as the sender
         # address is not defined before signing the transaction, but the contract asserts that
-        # it's a validator)
-        transaction = self.home_bridge_contract.functions.confirmTransfer(
-            compute_transfer_hash(transfer_event),
-            transfer_event.transactionHash,
-            transfer_event.args.value,
-            transfer_event.args["from"],
-        ).buildTransaction(
-            {
-                "gasPrice": self.gas_price,
-                "nonce": nonce,
-                "gas": CONFIRMATION_TRANSACTION_GAS_LIMIT,
-            }
-        )
-
-        # The signing step should not fail, but we want to exit this execution path early,
-        # therefore it's inside the try block
-        signed_transaction = self.w3.eth.account.sign_transaction(
-            transaction, self.private_key
+        # it's a validator). The transaction is built and signed without web3 and
+        # without any RPC call, as this happens for every single transfer.
+        return sign_transaction(
+            private_key=self.signing_key,
+            nonce=nonce,
+            gas_price=self.gas_price,
+            gas=CONFIRMATION_TRANSACTION_GAS_LIMIT,
+            to=self.home_bridge_address,
+            value=0,
+            data=encode_confirm_transfer_call(
+                compute_transfer_hash(transfer_event),
+                transfer_event.transactionHash,
+                transfer_event.value,
+                transfer_event.sender,
+            ),
+            chain_id=self.get_chain_id(),
         )
 
-        return signed_transaction
+    def send_confirmation_transaction(
+        self, transaction: SignedTransaction, transfer_event: ChainEvent
+    ):
+        try:
+            tx_hash = self.w3.eth.sendRawTransaction(transaction.rawTransaction)
+        except Exception:
+            # It is unknown whether the nonce has been used now.
+            self.nonce_manager.reset()
+            raise
 
-    def send_confirmation_transaction(self, transaction):
-        self.pending_transaction_queue.put(transaction)
-        tx_hash = self.w3.eth.sendRawTransaction(transaction.rawTransaction)
+        self.track_transaction(PendingTransaction(transaction, transfer_event))
         self.logger.info(f"Sent confirmation transaction {tx_hash.hex()}")
         return tx_hash
 
+    def track_transaction(self, pending_transaction: PendingTransaction) -> None:
+        nonce = pending_transaction.transaction.nonce
+        replaced_transaction = self.pending_transactions.get(nonce)
+        self.pending_transactions[nonce] = pending_transaction
+
+        # The node only hands out the nonce again if it does not know the
+        # transaction using it before, so its transfer has to be confirmed again.
+        if (
+            replaced_transaction is not None
+            and replaced_transaction.transaction.hash
+            != pending_transaction.transaction.hash
+        ):
+            self.logger.warning(
+                f"Confirmation transaction {replaced_transaction.transaction.hash.hex()} "
+                f"has been replaced by a transaction with the same nonce {nonce}"
+            )
+            self.transfer_event_queue.put(replaced_transaction.transfer_event)
+
     def watch_pending_transactions(self):
         while True:
             self.clear_confirmed_transactions()
+            if not self.has_transactions_in_flight():
+                self.nonce_manager.check_for_gap()
             gevent.sleep(HOME_CHAIN_STEP_DURATION)
 
-    def clear_confirmed_transactions(self):
-        block_number = self.w3.eth.blockNumber
+    def get_receipt(self, transaction: SignedTransaction):
+        try:
+            return self.w3.eth.getTransactionReceipt(transaction.hash)
+        except TransactionNotFound:
+            return None
+
+    def is_known_by_node(self, transaction: SignedTransaction) -> bool:
+        try:
+            self.w3.eth.getTransaction(transaction.hash)
+        except TransactionNotFound:
+            return False
+        return True
+
+    def clear_confirmed_transactions(self) -> None:
+        """stop tracking transactions which are confirmed deep enough
+
+        The receipts of all pending transactions are requested concurrently.
+        Transactions without a receipt which the node does not know anymore
+        have been dropped from its transaction pool and are sent again.
+        """
+        if not self.pending_transactions:
+            return
+
+        block_number = self.head_tracker.get_block_number()
         confirmation_threshold = block_number - self.max_reorg_depth
 
-        while not self.pending_transaction_queue.empty():
-            oldest_pending_transaction = self.pending_transaction_queue.peek()
-            try:
-                receipt = self.w3.eth.getTransactionReceipt(
-                    oldest_pending_transaction.hash
-                )
-            except TransactionNotFound:
-                gevent.sleep(HOME_CHAIN_STEP_DURATION)  # wait roughly for next block
-                continue
+        pending_transactions = sorted(self.pending_transactions.items())
+        receipts = self.request_pool.map(
+            self.get_receipt,
+            [
+                pending_transaction.transaction
+                for _, pending_transaction in pending_transactions
+            ],
+        )
 
-            if receipt and receipt.blockNumber <= confirmation_threshold:
+        unmined_transactions: List[PendingTransaction] = []
+        for (_, pending_transaction), receipt in zip(pending_transactions, receipts):
+            if receipt is None:
+                unmined_transactions.append(pending_transaction)
+            elif receipt.blockNumber <= confirmation_threshold:
                 self.logger.info(
-                    f"Transaction has been confirmed: {oldest_pending_transaction.hash.hex()}"
+                    f"Transaction has been confirmed: "
+                    f"{pending_transaction.transaction.hash.hex()}"
                 )
-                confirmed_transaction = (
-                    self.pending_transaction_queue.get()
-                )  # remove from queue
-                assert confirmed_transaction == oldest_pending_transaction
-            else:
-                break  # no need to look at transactions that are even newer
+                self.stop_tracking(pending_transaction)
+
+        are_known_by_node = self.request_pool.map(
+            self.is_known_by_node,
+            [
+                pending_transaction.transaction
+                for pending_transaction in unmined_transactions
+            ],
+        )
+        for pending_transaction, is_known_by_node in zip(
+            unmined_transactions, are_known_by_node
+        ):
+            if not is_known_by_node:
+                self.resend_transaction(pending_transaction)
+
+    def stop_tracking(self, pending_transaction: PendingTransaction) -> None:
+        nonce = pending_transaction.transaction.nonce
+        # the transaction might have been replaced in the meantime
+        if self.pending_transactions.get(nonce) == pending_transaction:
+            del self.pending_transactions[nonce]
+
+    def resend_transaction(self, pending_transaction: PendingTransaction) -> None:
+        """send a transaction again which has been dropped by the node"""
+        transaction = pending_transaction.transaction
+        self.logger.warning(
+            f"Confirmation transaction {transaction.hash.hex()} with nonce "
+            f"{transaction.nonce} has been dropped, sending it again"
+        )
+        try:
+            self.w3.eth.sendRawTransaction(transaction.rawTransaction)
+        except Exception as error:
+            if isinstance(error, ValueError) and is_nonce_error(error):
+                # the nonce has been used by another transaction
+                self.logger.warning(
+                    f"Nonce of dropped confirmation transaction has been used "
+                    f"already: {error}"
+                )
+                self.stop_tracking(pending_transaction)
+                self.transfer_event_queue.put(pending_transaction.transfer_event)
+                return
+
+            # the transaction is still tracked and sent again on the next check
+            self.logger.exception(
+                f"Failed to send dropped confirmation transaction {transaction.hash.hex()}"
+            )
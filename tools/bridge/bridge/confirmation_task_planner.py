@@ -1,11 +1,66 @@
+import heapq
 import logging
 import time
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import gevent
+from eth_typing import Hash32
 from gevent.queue import Queue
+from prometheus_client import Gauge, Histogram
 
-from bridge.event_fetcher import FetcherReachedHeadEvent
-from bridge.transfer_recorder import TransferRecorder
+from bridge.event_fetcher import (
+    FetcherProgressEvent,
+    FetcherReachedHeadEvent,
+    FetcherReorgEvent,
+)
+from bridge.events import ChainEvent
+from bridge.head_tracker import HeadTracker
+from bridge.transfer_recorder import LATENCY_BUCKETS, TransferRecorder, TransferState
+from bridge.utils import compute_transfer_hash
+
+PENDING_CONFIRMATION_TASKS = Gauge(
+    "bridge_pending_confirmation_tasks",
+    "Number of planned confirmation tasks waiting to be released to the sender",
+    labelnames=["validator"],
+)
+TRANSFER_SCHEDULING_LATENCY = Histogram(
+    "bridge_transfer_scheduling_latency_seconds",
+    "Time from seeing a transfer event to releasing its confirmation task",
+    labelnames=["validator"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def get_available_events(event_queue: Queue) -> List:
+    """wait for an event and take it together with all others already queued"""
+    events = [event_queue.get()]
+    events.extend(event_queue.get_nowait() for _ in range(event_queue.qsize()))
+    return events
+
+
+def get_age_priority(transfer_event: ChainEvent) -> Tuple:
+    return (transfer_event.blockNumber, transfer_event.logIndex)
+
+
+def get_value_priority(transfer_event: ChainEvent) -> Tuple:
+    return (-(transfer_event.value or 0),) + get_age_priority(transfer_event)
+
+
+# how to order the confirmation tasks waiting to be released, lowest first
+CONFIRMATION_TASK_PRIORITIES: Dict[str, Callable[[ChainEvent], Tuple]] = {
+    "oldest": get_age_priority,
+    "largest_value": get_value_priority,
+}
+
+
+def get_final_block_number(
+    processed_until: Optional[int], final_until: Optional[int]
+) -> Optional[int]:
+    """get the block number up to which events are processed and final"""
+    if processed_until is None or final_until is None:
+        return None
+    return min(processed_until, final_until)
 
 
 class ConfirmationTaskPlanner:
@@ -15,12 +70,30 @@ class ConfirmationTaskPlanner:
         transfer_event_queue: Queue,
         home_bridge_event_queue: Queue,
         confirmation_task_queue: Queue,
+        orphan_max_age: Optional[int] = None,
+        home_head_tracker: Optional[HeadTracker] = None,
+        foreign_head_tracker: Optional[HeadTracker] = None,
+        confirmation_task_order: str = "oldest",
+        max_confirmation_tasks_per_tick: Optional[int] = None,
     ) -> None:
         self.logger = logging.getLogger(
             "bridge.confirmation_task_planner.ConfirmationTaskPlanner"
         )
 
-        self.recorder = TransferRecorder()
+        if confirmation_task_order not in CONFIRMATION_TASK_PRIORITIES:
+            raise ValueError(
+                f"Unknown confirmation task order {confirmation_task_order}"
+            )
+        if (
+            max_confirmation_tasks_per_tick is not None
+            and max_confirmation_tasks_per_tick <= 0
+        ):
+            raise ValueError(
+                "Can not release a zero or negative number of confirmation tasks "
+                "per tick!"
+            )
+
+        self.recorder = TransferRecorder(orphan_max_age=orphan_max_age)
         self.sync_persistence_time = sync_persistence_time
 
         self.transfer_event_queue = transfer_event_queue
@@ -28,6 +101,39 @@ class ConfirmationTaskPlanner:
 
         self.confirmation_task_queue = confirmation_task_queue
 
+        # Confirmation tasks wait in a heap until they are released to the
+        # sender. Each time the planner checks for confirmation tasks, at
+        # most max_confirmation_tasks_per_tick tasks are released in the
+        # order of their priority. The counter keeps tasks with the same
+        # priority in the order they have been planned.
+        self.get_confirmation_task_priority = CONFIRMATION_TASK_PRIORITIES[
+            confirmation_task_order
+        ]
+        self.max_confirmation_tasks_per_tick = max_confirmation_tasks_per_tick
+        self.pending_confirmation_tasks: List[Tuple[Tuple, int, ChainEvent]] = []
+        self.confirmation_task_counter = count()
+
+        # The head of the home chain is used to decide per transfer how far
+        # the home bridge events have to be processed before it can be
+        # confirmed. Without it, transfers are only confirmed once the home
+        # bridge events are in sync.
+        self.home_head_tracker = home_head_tracker
+        # The head of the foreign chain is used to decide how far the transfer
+        # events have to be processed before transfers seen on the home chain
+        # only can be evicted. Without it, they are never evicted.
+        self.foreign_head_tracker = foreign_head_tracker
+
+        # block numbers up to which the events of both chains have been applied
+        self.transfer_events_processed_until: Optional[int] = None
+        self.home_bridge_events_processed_until: Optional[int] = None
+        # block numbers up to which the events of both chains can not be
+        # reverted anymore
+        self.transfer_events_final_until: Optional[int] = None
+        self.home_bridge_events_final_until: Optional[int] = None
+
+        # set once the metrics are exposed
+        self.scheduling_latency: Optional[Histogram] = None
+
     def run(self):
         self.logger.info("Starting")
         try:
@@ -41,31 +147,281 @@ class ConfirmationTaskPlanner:
             for greenlet in greenlets:
                 greenlet.kill()
 
-    def process_transfer_events(self) -> None:
+    def _process_events(
+        self,
+        event_queue: Queue,
+        apply_events: Callable[[List[ChainEvent]], None],
+        process_fetcher_event: Callable[[Any], None],
+    ) -> None:
+        """process the events of a queue in batches
+
+        All events available in the queue are taken at once. Consecutive
+        proper events are applied as a single batch, events of the fetcher
+        are processed in between in order.
+        """
         while True:
-            event = self.transfer_event_queue.get()
+            events: List[ChainEvent] = []
+            for event in get_available_events(event_queue):
+                if isinstance(
+                    event,
+                    (FetcherReachedHeadEvent, FetcherProgressEvent, FetcherReorgEvent),
+                ):
+                    apply_events(events)
+                    events = []
+                    process_fetcher_event(event)
+                else:
+                    events.append(event)
+            apply_events(events)
+
+    def process_transfer_events(self) -> None:
+        self._process_events(
+            self.transfer_event_queue,
+            self.apply_transfer_events,
+            self.process_transfer_fetcher_event,
+        )
+
+    def apply_transfer_events(self, events: List[ChainEvent]) -> None:
+        if not events:
+            return
+
+        self.logger.info(f"Received {len(events)} transfers to confirm")
+        # The cached head has been requested during the current run, so all
+        # confirmations sent by earlier runs are in blocks up to there.
+        if self.home_head_tracker is not None:
+            home_chain_check_block_number = self.home_head_tracker.block_number
+        else:
+            home_chain_check_block_number = None
+        self.recorder.apply_events(events, home_chain_check_block_number)
+        # there might be more events in the same block
+        self.transfer_events_processed_until = events[-1].blockNumber - 1
+
+    def process_transfer_fetcher_event(self, event: Any) -> None:
+        if isinstance(event, (FetcherReachedHeadEvent, FetcherProgressEvent)):
             if isinstance(event, FetcherReachedHeadEvent):
                 self.logger.info("Transfer events are in sync now")
-            else:
-                self.logger.info("Received transfer to confirm")
-                self.recorder.apply_proper_event(event)
+            self.transfer_events_processed_until = event.block_number
+            self.transfer_events_final_until = event.finalized_block_number
+            self.check_for_checked_confirmation_tasks()
+        elif isinstance(event, FetcherReorgEvent):
+            self.logger.warning(
+                f"Revert transfer events from block {event.block_number}"
+            )
+            self.recorder.revert_transfer_events(event.block_number)
+            self.transfer_events_processed_until = event.block_number - 1
+        else:
+            raise ValueError(f"Got unknown fetcher event {event}")
 
     def process_home_bridge_events(self) -> None:
-        while True:
-            event = self.home_bridge_event_queue.get()
-            if isinstance(event, FetcherReachedHeadEvent):
-                self.logger.info("Home bridge is in sync now")
-                # Let's check that this has not been for too long in the queue
-                if time.time() - event.timestamp < self.sync_persistence_time:
-                    self.check_for_confirmation_tasks()
-            else:
-                self.logger.info("Received home bridge event")
-                self.recorder.apply_proper_event(event)
+        self._process_events(
+            self.home_bridge_event_queue,
+            self.apply_home_bridge_events,
+            self.process_home_bridge_fetcher_event,
+        )
 
-    def check_for_confirmation_tasks(self) -> None:
-        confirmation_tasks = self.recorder.pull_transfers_to_confirm()
-        self.logger.info(
-            f"Scheduling {len(confirmation_tasks)} confirmation transactions"
+    def apply_home_bridge_events(self, events: List[ChainEvent]) -> None:
+        if not events:
+            return
+
+        self.logger.info(f"Received {len(events)} home bridge events")
+        self.recorder.apply_events(
+            events,
+            foreign_chain_check_block_number=self.get_foreign_chain_check_block_number(),
+        )
+        # there might be more events in the same block
+        self.home_bridge_events_processed_until = events[-1].blockNumber - 1
+        self.check_for_checked_confirmation_tasks()
+
+    def get_foreign_chain_check_block_number(self) -> Optional[int]:
+        """get the foreign head the transfers of home bridge events happened before
+
+        Validators only confirm transfers whose event is final, so the head
+        cached by the foreign chain event fetcher is recent enough and the
+        node is only asked if there is none yet. If that fails, None is
+        returned, so the transfers are not evicted instead of stopping the
+        planner.
+        """
+        if self.foreign_head_tracker is None:
+            return None
+        if self.foreign_head_tracker.block_number is not None:
+            return self.foreign_head_tracker.block_number
+
+        try:
+            return self.foreign_head_tracker.refresh()
+        except Exception as exception:
+            self.logger.warning(
+                f"Could not get the head of the foreign chain: {exception}"
+            )
+            return None
+
+    def process_home_bridge_fetcher_event(self, event: Any) -> None:
+        if isinstance(event, FetcherReachedHeadEvent):
+            self.logger.info("Home bridge is in sync now")
+            self.home_bridge_events_processed_until = event.block_number
+            self.home_bridge_events_final_until = event.finalized_block_number
+            # Let's check that this has not been for too long in the queue
+            if time.time() - event.timestamp < self.sync_persistence_time:
+                self.check_for_confirmation_tasks()
+        elif isinstance(event, FetcherProgressEvent):
+            self.home_bridge_events_processed_until = event.block_number
+            self.home_bridge_events_final_until = event.finalized_block_number
+            self.check_for_checked_confirmation_tasks()
+        elif isinstance(event, FetcherReorgEvent):
+            self.logger.warning(
+                f"Revert home bridge events from block {event.block_number}"
+            )
+            self.recorder.revert_home_bridge_events(event.block_number)
+            self.home_bridge_events_processed_until = event.block_number - 1
+        else:
+            raise ValueError(f"Got unknown fetcher event {event}")
+
+    def _schedule_confirmation_tasks(
+        self, home_bridge_events_checked_until: Optional[int]
+    ) -> int:
+        confirmation_tasks = self.recorder.pull_transfers_to_confirm(
+            self.transfer_events_final_until,
+            self.home_bridge_events_final_until,
+            home_bridge_events_checked_until,
         )
         for confirmation_task in confirmation_tasks:
+            heapq.heappush(
+                self.pending_confirmation_tasks,
+                (
+                    self.get_confirmation_task_priority(confirmation_task),
+                    next(self.confirmation_task_counter),
+                    confirmation_task,
+                ),
+            )
+        return self.release_confirmation_tasks()
+
+    def release_confirmation_tasks(self) -> int:
+        """pass the confirmation tasks with the highest priority on to the sender
+
+        Tasks may wait for several ticks, so the transfers might have been
+        confirmed, completed or reverted in the meantime. Those tasks are
+        dropped. Returns the number of released tasks.
+        """
+        number_of_released_tasks = 0
+        while self.pending_confirmation_tasks and (
+            self.max_confirmation_tasks_per_tick is None
+            or number_of_released_tasks < self.max_confirmation_tasks_per_tick
+        ):
+            _, _, confirmation_task = heapq.heappop(self.pending_confirmation_tasks)
+            transfer_state = self.recorder.transfer_states.get(
+                compute_transfer_hash(confirmation_task)
+            )
+            if transfer_state is None:
+                continue
+            if transfer_state.transfer_event is None:
+                # schedule the transfer again if its transfer event reappears
+                transfer_state.is_scheduled = False
+                continue
+            if (
+                transfer_state.confirmation_block_number is not None
+                or transfer_state.completion_block_number is not None
+            ):
+                continue
+
             self.confirmation_task_queue.put(confirmation_task)
+            number_of_released_tasks += 1
+
+            if (
+                self.scheduling_latency is not None
+                and transfer_state.transfer_seen_at is not None
+            ):
+                self.scheduling_latency.observe(
+                    time.monotonic() - transfer_state.transfer_seen_at
+                )
+        return number_of_released_tasks
+
+    def expose_metrics(self, validator: str) -> None:
+        """report the state of this planner whenever the metrics are collected
+
+        The metrics are labelled with the address of the validator the
+        planner plans confirmations for.
+        """
+        PENDING_CONFIRMATION_TASKS.labels(validator).set_function(
+            lambda: len(self.pending_confirmation_tasks)
+        )
+        self.scheduling_latency = TRANSFER_SCHEDULING_LATENCY.labels(validator)
+        self.recorder.expose_metrics(validator)
+
+    def check_for_checked_confirmation_tasks(self) -> None:
+        """schedule the transfers whose home bridge events are known already
+
+        This does not wait for the home bridge events to be in sync, so
+        transfers get confirmed during a long catch up of the home chain as
+        well.
+        """
+        if (
+            self.transfer_events_final_until is None
+            or self.home_bridge_events_processed_until is None
+        ):
+            return
+
+        number_of_confirmation_tasks = self._schedule_confirmation_tasks(
+            self.home_bridge_events_processed_until
+        )
+        if number_of_confirmation_tasks > 0:
+            self.logger.info(
+                f"Scheduling {number_of_confirmation_tasks} confirmation "
+                f"transactions of checked transfers, "
+                f"{len(self.pending_confirmation_tasks)} are waiting"
+            )
+
+    def check_for_confirmation_tasks(self) -> None:
+        if self.transfer_events_final_until is None:
+            self.logger.info("Transfer events are not in sync yet")
+            return
+
+        number_of_confirmation_tasks = self._schedule_confirmation_tasks(None)
+        self.logger.info(
+            f"Scheduling {number_of_confirmation_tasks} confirmation transactions, "
+            f"{len(self.pending_confirmation_tasks)} are waiting"
+        )
+
+        assert self.home_bridge_events_processed_until is not None
+        number_of_evicted_transfers = self.recorder.evict_orphans(
+            self.home_bridge_events_processed_until,
+            self.transfer_events_processed_until,
+        )
+        if number_of_evicted_transfers > 0:
+            self.logger.info(
+                f"Evicted {number_of_evicted_transfers} transfers which have only "
+                f"been seen on the home chain"
+            )
+
+    def get_checkpoint_block_numbers(self) -> Tuple[Optional[int], Optional[int]]:
+        """get the block numbers of both chains up to which events are safely processed
+
+        The state of the recorder reflects all events up to these block
+        numbers, and none of them can be reverted anymore.
+        """
+        return (
+            get_final_block_number(
+                self.transfer_events_processed_until, self.transfer_events_final_until
+            ),
+            get_final_block_number(
+                self.home_bridge_events_processed_until,
+                self.home_bridge_events_final_until,
+            ),
+        )
+
+    def restore_recorder(
+        self,
+        transfer_states: Dict[Hash32, TransferState],
+        transfer_checkpoint: Optional[int],
+        home_bridge_checkpoint: Optional[int],
+    ) -> None:
+        """restore the recorder from a snapshot taken at the given checkpoints
+
+        The snapshot might contain events after the checkpoints, which are
+        not final. They are reverted, as they are going to be fetched again.
+        """
+        self.recorder.restore(
+            transfer_states, self.get_foreign_chain_check_block_number()
+        )
+        if transfer_checkpoint is not None:
+            self.recorder.revert_transfer_events(transfer_checkpoint + 1)
+        if home_bridge_checkpoint is not None:
+            self.recorder.revert_home_bridge_events(home_bridge_checkpoint + 1)
+        self.logger.info(f"Restored {len(transfer_states)} transfers from snapshot")
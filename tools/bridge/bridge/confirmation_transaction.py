@@ -0,0 +1,65 @@
+"""Build and sign confirmTransfer transactions without web3
+
+Building a transaction with web3 looks up the function in the ABI and
+normalizes and validates its arguments on every call. As the confirmation
+transactions of the bridge always call the same function, its selector is
+computed once and the arguments are packed directly. The transaction is then
+signed according to EIP-155 with eth_keys.
+"""
+from typing import NamedTuple
+
+import rlp
+from eth_keys.datatypes import PrivateKey
+from eth_utils import keccak, to_canonical_address
+from hexbytes import HexBytes
+
+CONFIRM_TRANSFER_SIGNATURE = "confirmTransfer(bytes32,bytes32,uint256,address)"
+CONFIRM_TRANSFER_SELECTOR = keccak(text=CONFIRM_TRANSFER_SIGNATURE)[:4]
+
+
+class SignedTransaction(NamedTuple):
+    rawTransaction: HexBytes
+    hash: HexBytes
+    nonce: int
+
+
+def encode_confirm_transfer_call(
+    transfer_hash: bytes, transaction_hash: bytes, amount: int, recipient: str
+) -> bytes:
+    """encode the call data of confirmTransfer"""
+    if len(transfer_hash) != 32 or len(transaction_hash) != 32:
+        raise ValueError("Transfer and transaction hash have to be 32 bytes long!")
+    if not 0 <= amount < 2 ** 256:
+        raise ValueError(f"Amount {amount} does not fit into an uint256!")
+
+    return b"".join(
+        (
+            CONFIRM_TRANSFER_SELECTOR,
+            transfer_hash,
+            transaction_hash,
+            amount.to_bytes(32, "big"),
+            to_canonical_address(recipient).rjust(32, b"\x00"),
+        )
+    )
+
+
+def sign_transaction(
+    *,
+    private_key: PrivateKey,
+    nonce: int,
+    gas_price: int,
+    gas: int,
+    to: bytes,
+    value: int,
+    data: bytes,
+    chain_id: int,
+) -> SignedTransaction:
+    """sign a transaction replay protected by the chain id (EIP-155)"""
+    fields = [nonce, gas_price, gas, to, value, data]
+    signature = private_key.sign_msg_hash(keccak(rlp.encode(fields + [chain_id, 0, 0])))
+    raw_transaction = rlp.encode(
+        fields + [signature.v + 35 + 2 * chain_id, signature.r, signature.s]
+    )
+    return SignedTransaction(
+        HexBytes(raw_transaction), HexBytes(keccak(raw_transaction)), nonce
+    )
@@ -1,5 +1,11 @@
 HOME_CHAIN_STEP_DURATION = 5
 
+# Number of seconds between storing the checkpoints of the event fetchers
+CHECKPOINT_INTERVAL = 60
+
+# Number of seconds the validator status of a confirmation sender is cached
+VALIDATOR_STATUS_MAX_AGE = 60
+
 TRANSFER_EVENT_NAME = "Transfer"
 CONFIRMATION_EVENT_NAME = "Confirmation"
 COMPLETION_EVENT_NAME = "TransferCompleted"
@@ -0,0 +1,44 @@
+import logging
+from typing import Dict
+
+from eth_utils import to_canonical_address
+from gevent.queue import Queue
+
+from bridge.events import ChainEvent
+
+
+class EventDistributor:
+    """Distributes the events of a single event fetcher to several validators
+
+    Events concerning a single validator, i.e. Confirmation events, are only
+    passed on to the queue of that validator. All other events, including
+    the events of the fetcher itself, are passed on to all queues. The
+    events are shared between the queues, not copied.
+    """
+
+    def __init__(self, event_queue: Queue, validator_queues: Dict[bytes, Queue]):
+        self.logger = logging.getLogger("bridge.event_distributor.EventDistributor")
+
+        if not validator_queues:
+            raise ValueError("Can not distribute events to zero validators!")
+
+        self.event_queue = event_queue
+        self.validator_queues = validator_queues
+
+    def distribute_event(self, event) -> None:
+        if isinstance(event, ChainEvent) and event.validator is not None:
+            validator_queue = self.validator_queues.get(
+                to_canonical_address(event.validator)
+            )
+            if validator_queue is None:
+                self.logger.warning(f"Got event of unknown validator {event}")
+            else:
+                validator_queue.put(event)
+        else:
+            for validator_queue in self.validator_queues.values():
+                validator_queue.put(event)
+
+    def run(self) -> None:
+        self.logger.info("Starting")
+        while True:
+            self.distribute_event(self.event_queue.get())
@@ -1,16 +1,105 @@
 import logging
-from time import sleep, time
-from typing import Any, Dict, List
+from collections import Counter, deque
+from time import monotonic, time
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
 
-from eth_utils import is_same_address, to_checksum_address
+from eth_utils import (
+    encode_hex,
+    event_abi_to_log_topic,
+    is_list_like,
+    is_same_address,
+    to_checksum_address,
+)
+from gevent import Greenlet
+from gevent.pool import Pool
+from hexbytes import HexBytes
+from lru import LRU
+from prometheus_client import Counter as PrometheusCounter, Gauge
 from web3 import Web3
+from web3._utils.events import construct_event_topic_set, get_event_data
 from web3.contract import Contract
 from web3.datastructures import AttributeDict
 
+from bridge.block_range_controller import BlockRangeController, is_range_too_large_error
+from bridge.checkpoint_store import CheckpointStore
+from bridge.events import ChainEvent
+from bridge.head_tracker import HeadTracker
+from bridge.utils import add_transfer_hashes
+
+EVENT_FETCH_BLOCK_RANGE_SIZE = Gauge(
+    "bridge_event_fetch_block_range_size",
+    "Number of blocks the event fetcher queries events for at once",
+    ["contract_address"],
+)
+DECODED_EVENT_CACHE_HITS = PrometheusCounter(
+    "bridge_decoded_event_cache_hits",
+    "Number of fetched logs whose decoded event was found in the cache",
+    ["contract_address"],
+)
+DECODED_EVENT_CACHE_MISSES = PrometheusCounter(
+    "bridge_decoded_event_cache_misses",
+    "Number of fetched logs which had to be decoded",
+    ["contract_address"],
+)
+
 
 class FetcherReachedHeadEvent:
-    def __init__(self):
+    def __init__(self, block_number: int, finalized_block_number: Optional[int] = None):
+        self.timestamp = time()
+        # all events up to this block number have been fetched
+        self.block_number = block_number
+        # events up to this block number will not be reverted anymore
+        self.finalized_block_number = (
+            block_number if finalized_block_number is None else finalized_block_number
+        )
+
+
+class FetcherProgressEvent:
+    """Reports how far the fetcher got while it has not reached the head yet"""
+
+    def __init__(self, block_number: int, finalized_block_number: int):
         self.timestamp = time()
+        # all events up to this block number have been fetched
+        self.block_number = block_number
+        # events up to this block number will not be reverted anymore
+        self.finalized_block_number = finalized_block_number
+
+
+class FetcherReorgEvent:
+    def __init__(self, block_number: int):
+        self.timestamp = time()
+        # all events from this block number on have been reverted
+        self.block_number = block_number
+
+
+def get_log_id(log: Dict) -> Tuple[bytes, bytes, int]:
+    """get a key identifying a log, which differs for logs of reorged blocks"""
+    return (bytes(log["blockHash"]), bytes(log["transactionHash"]), log["logIndex"])
+
+
+class LogQuery(NamedTuple):
+    """A single eth_getLogs query and how to decode the logs it returns
+
+    `event_abis` maps the topic of every requested event to its ABI. All
+    argument filters that can not be expressed as topics are collected in
+    `client_side_filters` and have to be applied after decoding.
+    """
+
+    topics: List
+    event_abis: Dict[bytes, Dict[str, Any]]
+    client_side_filters: Dict[str, Dict[str, Any]]
+
+
+def argument_matches(argument_type: str, value: Any, expected_value: Any) -> bool:
+    if is_list_like(expected_value):
+        return any(
+            argument_matches(argument_type, value, option) for option in expected_value
+        )
+
+    if argument_type == "address":
+        return is_same_address(value, expected_value)
+
+    return value == expected_value
 
 
 class EventFetcher:
@@ -21,9 +110,16 @@ class EventFetcher:
         contract: Contract,
         filter_definition: Dict[str, Dict[str, Any]],
         event_fetch_limit: int = 950,
+        max_event_fetch_limit: int = 100_000,
         event_queue: Any,
         max_reorg_depth: int,
         start_block_number: int,
+        combine_event_filters: bool = True,
+        prefetch_depth: int = 1,
+        head_tracker: Optional[HeadTracker] = None,
+        checkpoint_store: Optional[CheckpointStore] = None,
+        follow_head: bool = False,
+        decoded_event_cache_size: int = 10_000,
     ):
         if event_fetch_limit <= 0:
             raise ValueError("Can not fetch events with zero or negative limit!")
@@ -36,25 +132,185 @@ class EventFetcher:
                 "Can not fetch events starting from a negative block number!"
             )
 
+        if prefetch_depth <= 0:
+            raise ValueError("Can not prefetch a zero or negative number of ranges!")
+
+        if decoded_event_cache_size <= 0:
+            raise ValueError("Can not cache a zero or negative number of events!")
+
         self.logger = logging.getLogger(
             f"bridge.event_fetcher.{to_checksum_address(contract.address)}"
         )
 
         self.web3 = web3
+        self.head_tracker = head_tracker or HeadTracker(web3)
         self.contract = contract
         self.filter_definition = filter_definition
-        self.event_fetch_limit = event_fetch_limit
+        self.block_range_controller = BlockRangeController(
+            initial_size=event_fetch_limit, max_size=max_event_fetch_limit
+        )
+        self.block_range_size_gauge = EVENT_FETCH_BLOCK_RANGE_SIZE.labels(
+            contract_address=to_checksum_address(contract.address)
+        )
+        self.block_range_size_gauge.set(self.block_range_controller.size)
+        # Logs of re-scanned ranges are not decoded again. The block hash in
+        # the key makes sure logs of reorged blocks are never confused. The
+        # cached events are converted and hashed already, logs filtered out
+        # on the client side are cached as None.
+        self.decoded_events = LRU(decoded_event_cache_size)
+        self.decoded_event_cache_hits = DECODED_EVENT_CACHE_HITS.labels(
+            contract_address=to_checksum_address(contract.address)
+        )
+        self.decoded_event_cache_misses = DECODED_EVENT_CACHE_MISSES.labels(
+            contract_address=to_checksum_address(contract.address)
+        )
         self.event_queue = event_queue
         self.max_reorg_depth = max_reorg_depth
         self.last_fetched_block_number = start_block_number - 1
 
+        self.checkpoint_store = checkpoint_store
+        if self.checkpoint_store is not None:
+            checkpoint = self.checkpoint_store.load(contract.address)
+            if checkpoint is not None and checkpoint > self.last_fetched_block_number:
+                self.logger.info(f"Resume fetching events after block {checkpoint}.")
+                self.last_fetched_block_number = checkpoint
+        self.log_queries = self._build_log_queries(combine_event_filters)
+
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_pool = Pool(prefetch_depth)
+        self.prefetched_ranges: Deque[Tuple[int, int, Greenlet]] = deque()
+
+        # When following the head, events of blocks which might still get
+        # reorged are fetched block by block. The hashes of these blocks are
+        # kept to detect reorgs by the parent hash of the next block.
+        self.follow_head = follow_head
+        self.block_hashes: Deque[Tuple[int, HexBytes]] = deque(
+            maxlen=max_reorg_depth + 1
+        )
+
+    def _build_log_queries(self, combine_event_filters: bool) -> List[LogQuery]:
+        """build the eth_getLogs queries required to fetch all filtered events
+
+        Filters on indexed arguments are sent to the node as topics. Since
+        topics are positional, events which filter on indexed arguments need
+        a query of their own. All other events are combined into a single
+        query with an OR list of their event topics, unless
+        `combine_event_filters` is disabled. Filters on non-indexed arguments
+        are always applied client side.
+        """
+        log_queries: List[LogQuery] = []
+        combined_event_abis: Dict[bytes, Dict[str, Any]] = {}
+        combined_client_side_filters: Dict[str, Dict[str, Any]] = {}
+
+        for event_name, argument_filters in self.filter_definition.items():
+            event_abi = self.contract.events[event_name]().abi
+            event_topic = event_abi_to_log_topic(event_abi)
+            indexed_argument_names = {
+                argument["name"]
+                for argument in event_abi["inputs"]
+                if argument["indexed"]
+            }
+            indexed_argument_filters = {
+                name: value
+                for name, value in argument_filters.items()
+                if name in indexed_argument_names
+            }
+            client_side_filters = {
+                name: value
+                for name, value in argument_filters.items()
+                if name not in indexed_argument_names
+            }
+
+            if combine_event_filters and not indexed_argument_filters:
+                combined_event_abis[event_topic] = event_abi
+                combined_client_side_filters[event_name] = client_side_filters
+            else:
+                log_queries.append(
+                    LogQuery(
+                        topics=construct_event_topic_set(
+                            event_abi, indexed_argument_filters
+                        ),
+                        event_abis={event_topic: event_abi},
+                        client_side_filters={event_name: client_side_filters},
+                    )
+                )
+
+        if combined_event_abis:
+            log_queries.append(
+                LogQuery(
+                    topics=[[encode_hex(topic) for topic in combined_event_abis]],
+                    event_abis=combined_event_abis,
+                    client_side_filters=combined_client_side_filters,
+                )
+            )
+
+        return log_queries
+
+    def _fetch_logs(
+        self, log_query: LogQuery, from_block_number: int, to_block_number: int
+    ) -> List[ChainEvent]:
+        logs = self.web3.eth.getLogs(
+            {
+                "address": self.contract.address,
+                "fromBlock": from_block_number,
+                "toBlock": to_block_number,
+                "topics": log_query.topics,
+            }
+        )
+
+        events: List[Optional[ChainEvent]] = []
+        new_event_indices: List[int] = []
+        new_events: List[ChainEvent] = []
+        for log in logs:
+            log_id = get_log_id(log)
+            if log_id in self.decoded_events:
+                self.decoded_event_cache_hits.inc()
+                events.append(self.decoded_events[log_id])
+                continue
+
+            self.decoded_event_cache_misses.inc()
+            event = self._decode_log(log_query, log)
+            if event is None:
+                self.decoded_events[log_id] = None
+            else:
+                new_event_indices.append(len(events))
+                new_events.append(event)
+            events.append(event)
+
+        # the transfer hashes of the new events are computed in one batch
+        for index, event in zip(new_event_indices, add_transfer_hashes(new_events)):
+            events[index] = event
+            self.decoded_events[get_log_id(logs[index])] = event
+
+        return [event for event in events if event is not None]
+
+    def _decode_log(self, log_query: LogQuery, log: Dict) -> Optional[ChainEvent]:
+        """decode a log, unless its event is filtered out on the client side"""
+        event_abi = log_query.event_abis[bytes(log["topics"][0])]
+        event = get_event_data(event_abi, log)
+        argument_types = {
+            argument["name"]: argument["type"] for argument in event_abi["inputs"]
+        }
+        client_side_filters = log_query.client_side_filters[event.event]
+        if not all(
+            argument_matches(argument_types[name], event.args[name], value)
+            for name, value in client_side_filters.items()
+        ):
+            return None
+
+        return ChainEvent.from_web3_event(event)
+
     def fetch_events_in_range(
         self, from_block_number: int, to_block_number: int
     ) -> List:
         if from_block_number < 0:
             raise ValueError("Can not fetch events from a negative block number!")
 
-        if to_block_number > self.web3.eth.blockNumber:
+        # The cached head is sufficient as long as the range is below it.
+        if (
+            to_block_number > self.head_tracker.get_block_number()
+            and to_block_number > self.head_tracker.refresh()
+        ):
             raise ValueError("Can not fetch events for blocks past the current head!")
 
         if from_block_number > to_block_number:
@@ -64,62 +320,205 @@ class EventFetcher:
             f"Fetch events from block {from_block_number} to {to_block_number}."
         )
 
-        events: List[AttributeDict] = []
-        for event_name, argument_filters in self.filter_definition.items():
-            fetched_events = self.contract.events[event_name].getLogs(
-                fromBlock=from_block_number,
-                toBlock=to_block_number,
-                argument_filters=argument_filters,
-            )
-            # hack until validator event argument is indexed
-            if "validator" in argument_filters:
-                fetched_events = [
-                    event
-                    for event in fetched_events
-                    if is_same_address(
-                        event.args.validator, argument_filters["validator"]
-                    )
-                ]
-            events += fetched_events
+        events: List[ChainEvent] = []
+        for log_query in self.log_queries:
+            events += self._fetch_logs(log_query, from_block_number, to_block_number)
 
-            if len(fetched_events) > 0:
-                self.logger.info(f"Found {len(fetched_events)} {event_name} events.")
+        event_counts = Counter(event.event for event in events)
+        for event_name in self.filter_definition:
+            number_of_events = event_counts[event_name]
+            if number_of_events > 0:
+                self.logger.info(f"Found {number_of_events} {event_name} events.")
             else:
-                self.logger.debug(f"Found {len(fetched_events)} {event_name} events.")
+                self.logger.debug(f"Found {number_of_events} {event_name} events.")
+
+        # the log index is unique within a block
+        events.sort(key=lambda event: (event.blockNumber, event.logIndex))
+
+        return events
+
+    def fetch_events_in_range_adaptively(
+        self, from_block_number: int, to_block_number: int
+    ) -> List:
+        """fetch the events in a range of blocks and adapt the range size
+
+        If the node fails to deliver the events because the range is too
+        large, the range gets split into halves which are fetched one after
+        another.
+        """
+        try:
+            events = self.fetch_events_in_range(from_block_number, to_block_number)
+        except Exception as error:
+            if (
+                not is_range_too_large_error(error)
+                or to_block_number == from_block_number
+            ):
+                raise
 
-        events.sort(
-            key=lambda event: (
-                event.blockNumber,
-                event.transactionIndex,
-                event.logIndex,
+            self.block_range_controller.record_failure(
+                to_block_number - from_block_number + 1
+            )
+            self.block_range_size_gauge.set(self.block_range_controller.size)
+            self.logger.warning(
+                f"Failed to fetch events from block {from_block_number} to "
+                f"{to_block_number} ({error}), fetch it in two halves."
+            )
+
+            middle_block_number = (from_block_number + to_block_number) // 2
+            return self.fetch_events_in_range_adaptively(
+                from_block_number, middle_block_number
+            ) + self.fetch_events_in_range_adaptively(
+                middle_block_number + 1, to_block_number
             )
-        )
 
+        self.block_range_controller.record_success(
+            to_block_number - from_block_number + 1, len(events)
+        )
+        self.block_range_size_gauge.set(self.block_range_controller.size)
         return events
 
+    def fetch_events_in_range_with_block(
+        self, from_block_number: int, to_block_number: int, with_block: bool
+    ) -> Tuple[List, Optional[AttributeDict]]:
+        """fetch the events in a range of blocks and optionally its last block
+
+        The block is fetched before the events. If it gets reorged before the
+        events are fetched, the parent hash of the next block reveals it.
+        """
+        block = self.web3.eth.getBlock(to_block_number) if with_block else None
+        events = self.fetch_events_in_range_adaptively(
+            from_block_number, to_block_number
+        )
+        return events, block
+
+    def _schedule_prefetches(self) -> None:
+        """keep up to prefetch_depth consecutive ranges in flight"""
+        if len(self.prefetched_ranges) >= self.prefetch_depth:
+            return
+
+        head_block_number = self.head_tracker.get_block_number()
+        reorg_safe_block_number = head_block_number - self.max_reorg_depth
+
+        while len(self.prefetched_ranges) < self.prefetch_depth:
+            if self.prefetched_ranges:
+                from_block_number = self.prefetched_ranges[-1][1] + 1
+            else:
+                from_block_number = self.last_fetched_block_number + 1
+
+            is_reorg_safe = from_block_number <= reorg_safe_block_number
+            if is_reorg_safe:
+                to_block_number = min(
+                    from_block_number + self.block_range_controller.size - 1,
+                    reorg_safe_block_number,
+                )
+            elif self.follow_head and from_block_number <= head_block_number:
+                to_block_number = from_block_number
+            else:
+                return
+
+            greenlet = self.prefetch_pool.spawn(
+                self.fetch_events_in_range_with_block,
+                from_block_number,
+                to_block_number,
+                not is_reorg_safe,
+            )
+            self.prefetched_ranges.append(
+                (from_block_number, to_block_number, greenlet)
+            )
+
+    def _cancel_prefetches(self) -> None:
+        while self.prefetched_ranges:
+            _, _, greenlet = self.prefetched_ranges.popleft()
+            greenlet.kill()
+
+    def _revert_to_common_ancestor(self) -> FetcherReorgEvent:
+        """revert to the last fetched block which is still part of the chain"""
+        common_ancestor_block_number = self.block_hashes[0][0] - 1
+        while self.block_hashes:
+            block_number, block_hash = self.block_hashes[-1]
+            block = self.web3.eth.getBlock(block_number)
+            if block is not None and block.hash == block_hash:
+                common_ancestor_block_number = block_number
+                break
+            self.block_hashes.pop()
+
+        self.logger.warning(
+            f"Detected a reorg, revert events after block "
+            f"{common_ancestor_block_number}."
+        )
+        self.last_fetched_block_number = common_ancestor_block_number
+        return FetcherReorgEvent(common_ancestor_block_number + 1)
+
     def fetch_some_events(self) -> List:
         """fetch some events starting from the last_fetched_block_number
 
         This method tries to fetch from consecutive ranges of blocks
         until it has found some events in a range of blocks or it has
-        reached the head of the chain.
+        reached the head of the chain. Up to prefetch_depth ranges are
+        fetched concurrently, but their events are returned in order.
+
+        When following the head, a reorg of already fetched blocks is
+        returned as a single FetcherReorgEvent instead.
 
         This method returns an empty list if the caller should wait
         for new blocks to come in.
         """
         while True:
-            from_block_number = self.last_fetched_block_number + 1
-            reorg_safe_block_number = self.web3.eth.blockNumber - self.max_reorg_depth
-            to_block_number = min(
-                from_block_number + self.event_fetch_limit - 1, reorg_safe_block_number
-            )
-            if to_block_number < from_block_number:
+            self._schedule_prefetches()
+            if not self.prefetched_ranges:
                 return []
-            events = self.fetch_events_in_range(from_block_number, to_block_number)
+
+            _, to_block_number, greenlet = self.prefetched_ranges.popleft()
+            try:
+                events, block = greenlet.get()
+            except BaseException:
+                self._cancel_prefetches()
+                raise
+
+            if block is None:
+                # all blocks up to here are safe from reorgs
+                self.block_hashes.clear()
+            elif (
+                self.block_hashes
+                and self.block_hashes[-1][0] == block.number - 1
+                and self.block_hashes[-1][1] != block.parentHash
+            ):
+                self._cancel_prefetches()
+                return [self._revert_to_common_ancestor()]
+            else:
+                self.block_hashes.append((block.number, block.hash))
+
             self.last_fetched_block_number = to_block_number
             if events:
                 return events
 
+    def wait_for_new_blocks(self, poll_interval: float) -> None:
+        """wait until the fetchable head advances or the poll interval has passed
+
+        Without a subscription pushing new heads to the head tracker, this
+        simply waits for the poll interval.
+        """
+        deadline = monotonic() + poll_interval
+        while True:
+            remaining_time = deadline - monotonic()
+            if remaining_time <= 0 or not self.head_tracker.wait_for_update(
+                remaining_time
+            ):
+                return
+
+            assert self.head_tracker.block_number is not None
+            fetchable_block_number = self.head_tracker.block_number
+            if not self.follow_head:
+                fetchable_block_number -= self.max_reorg_depth
+            if fetchable_block_number > self.last_fetched_block_number:
+                return
+
+    def get_finalized_block_number(self) -> int:
+        """get the block number up to which fetched events can not be reverted"""
+        if self.follow_head:
+            return self.last_fetched_block_number - self.max_reorg_depth
+        return self.last_fetched_block_number
+
     def fetch_events(self, poll_interval: int) -> None:
         if poll_interval <= 0:
             raise ValueError(
@@ -134,5 +533,19 @@ class EventFetcher:
                 self.event_queue.put(event)
 
             if not events:
-                self.event_queue.put(FetcherReachedHeadEvent())
-                sleep(poll_interval)
+                self.event_queue.put(
+                    FetcherReachedHeadEvent(
+                        self.last_fetched_block_number,
+                        self.get_finalized_block_number(),
+                    )
+                )
+                self.wait_for_new_blocks(poll_interval)
+            elif not isinstance(events[-1], FetcherReorgEvent):
+                # A catch up can take long, so the progress is reported with
+                # every batch to let the events fetched so far be processed.
+                self.event_queue.put(
+                    FetcherProgressEvent(
+                        self.last_fetched_block_number,
+                        self.get_finalized_block_number(),
+                    )
+                )
@@ -0,0 +1,44 @@
+from typing import NamedTuple, Optional
+
+from eth_typing import Hash32
+from web3.datastructures import AttributeDict
+
+
+class ChainEvent(NamedTuple):
+    """The parts of a fetched event the bridge relies on
+
+    Fetched events are converted to this record at the boundary of the event
+    fetcher. Other than web3's nested attribute dictionaries, it does not
+    need an instance dictionary and drops all fields the bridge never reads.
+    The field names follow the ones of web3 events.
+    """
+
+    event: str
+    transactionHash: Hash32
+    logIndex: int
+    blockNumber: int
+    # arguments of Transfer events
+    value: Optional[int] = None
+    sender: Optional[str] = None
+    # argument of Confirmation and TransferCompleted events, for Transfer
+    # events the hash of the transfer itself, computed once by the fetcher
+    transferHash: Optional[Hash32] = None
+    # argument of Confirmation events
+    validator: Optional[str] = None
+
+    @classmethod
+    def from_web3_event(cls, event: AttributeDict) -> "ChainEvent":
+        transfer_hash = event.args.get("transferHash")
+        if transfer_hash is not None:
+            transfer_hash = Hash32(bytes(transfer_hash))
+
+        return cls(
+            event=event.event,
+            transactionHash=Hash32(bytes(event.transactionHash)),
+            logIndex=event.logIndex,
+            blockNumber=event.blockNumber,
+            value=event.args.get("value"),
+            sender=event.args.get("from"),
+            transferHash=transfer_hash,
+            validator=event.args.get("validator"),
+        )
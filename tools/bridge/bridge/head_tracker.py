@@ -0,0 +1,67 @@
+from time import monotonic
+from typing import Optional, Tuple
+
+from gevent.event import Event
+from web3 import Web3
+
+
+class HeadTracker:
+    """Keeps track of the head of a chain
+
+    The block number of the head is cached and only requested again from the
+    node once the cached value is older than `max_age` seconds. The tracker is
+    meant to be shared by all components working on the same chain. If the
+    head gets pushed by a new heads subscription, waiting components can be
+    woken up immediately.
+    """
+
+    def __init__(self, web3: Web3, max_age: float = 0.0) -> None:
+        if max_age < 0:
+            raise ValueError("Can not track the head with a negative maximum age!")
+
+        self.web3 = web3
+        self.max_age = max_age
+        self.block_number: Optional[int] = None
+        self.updated_at = 0.0
+        self.update_event = Event()
+
+    @property
+    def age(self) -> float:
+        """Number of seconds since the cached head has been updated"""
+        if self.block_number is None:
+            return float("inf")
+
+        return monotonic() - self.updated_at
+
+    def update(self, block_number: int) -> None:
+        """Set the head to a block number learned by other means than polling"""
+        self.block_number = block_number
+        self.updated_at = monotonic()
+
+        # wake up everyone waiting for the current event and start a new one
+        update_event, self.update_event = self.update_event, Event()
+        update_event.set()
+
+    def wait_for_update(self, timeout: float) -> bool:
+        """Wait until the head gets updated
+
+        Returns False if the head has not been updated within the timeout.
+        """
+        return self.update_event.wait(timeout)
+
+    def refresh(self) -> int:
+        """Request the current head from the node"""
+        self.update(self.web3.eth.blockNumber)
+        assert self.block_number is not None
+        return self.block_number
+
+    def get_block_number(self) -> int:
+        """Get the block number of the head, refreshed if the cache is too old"""
+        if self.block_number is None or self.age > self.max_age:
+            return self.refresh()
+
+        return self.block_number
+
+    def get_block_number_with_age(self) -> Tuple[int, float]:
+        block_number = self.get_block_number()
+        return block_number, self.age
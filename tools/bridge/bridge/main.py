@@ -5,19 +5,26 @@ monkey.patch_all()  # noqa: E402 isort:skip
 import logging
 import logging.config
 import os
+from typing import List, Optional
 
 import click
 import gevent
 from eth_keys.datatypes import PrivateKey
+from eth_utils import to_checksum_address
 from gevent import Greenlet
+from gevent.pywsgi import WSGIServer
 from gevent.queue import Queue
+from prometheus_client import make_wsgi_app
 from toml.decoder import TomlDecodeError
 from web3 import HTTPProvider, Web3
 
+from bridge.checkpoint_store import CheckpointStore
+from bridge.checkpoint_writer import CheckpointWriter
 from bridge.config import load_config
 from bridge.confirmation_sender import ConfirmationSender
 from bridge.confirmation_task_planner import ConfirmationTaskPlanner
 from bridge.constants import (
+    CHECKPOINT_INTERVAL,
     COMPLETION_EVENT_NAME,
     CONFIRMATION_EVENT_NAME,
     HOME_CHAIN_STEP_DURATION,
@@ -28,7 +35,10 @@ from bridge.contract_validation import (
     get_validator_proxy_contract,
     validate_contract_existence,
 )
+from bridge.event_distributor import EventDistributor
 from bridge.event_fetcher import EventFetcher
+from bridge.head_tracker import HeadTracker
+from bridge.new_heads_subscription import NewHeadsSubscription
 
 logger = logging.getLogger(__name__)
 
@@ -113,14 +123,34 @@ def main(config_path: str) -> None:
     )
     validate_contract_existence(token_contract)
 
-    validator_private_key = config["validator_private_key"]
-    validator_address = PrivateKey(
-        validator_private_key
-    ).public_key.to_canonical_address()
+    # several validators share the event fetchers, but have their own
+    # planner and sender
+    validator_private_keys = {
+        PrivateKey(private_key).public_key.to_canonical_address(): private_key
+        for private_key in config["validator_private_key"]
+    }
+    validator_addresses = list(validator_private_keys.keys())
+
+    foreign_head_tracker = HeadTracker(
+        w3_foreign, max_age=config["foreign_chain_event_poll_interval"]
+    )
+    home_head_tracker = HeadTracker(
+        w3_home, max_age=config["home_chain_event_poll_interval"]
+    )
+
+    checkpoint_store: Optional[CheckpointStore]
+    if config["checkpoint_database_path"] is not None:
+        checkpoint_store = CheckpointStore(config["checkpoint_database_path"])
+        if checkpoint_store.forget_unrestorable_snapshots(validator_addresses):
+            logger.warning(
+                "Not all validators have a stored snapshot, fetching all events "
+                "again from the start block numbers"
+            )
+    else:
+        checkpoint_store = None
 
     transfer_event_queue = Queue()
     home_bridge_event_queue = Queue()
-    confirmation_task_queue = Queue()
 
     transfer_event_fetcher = EventFetcher(
         web3=w3_foreign,
@@ -131,34 +161,78 @@ def main(config_path: str) -> None:
         event_queue=transfer_event_queue,
         max_reorg_depth=config["foreign_chain_max_reorg_depth"],
         start_block_number=config["foreign_chain_event_fetch_start_block_number"],
+        prefetch_depth=config["foreign_chain_event_fetch_prefetch_depth"],
+        follow_head=config["foreign_chain_event_fetch_follow_head"],
+        head_tracker=foreign_head_tracker,
+        checkpoint_store=checkpoint_store,
     )
     home_bridge_event_fetcher = EventFetcher(
         web3=w3_home,
         contract=home_bridge_contract,
         filter_definition={
-            CONFIRMATION_EVENT_NAME: {"validator": validator_address},
+            CONFIRMATION_EVENT_NAME: {"validator": validator_addresses},
             COMPLETION_EVENT_NAME: {},
         },
         event_queue=home_bridge_event_queue,
         max_reorg_depth=config["home_chain_max_reorg_depth"],
         start_block_number=config["home_chain_event_fetch_start_block_number"],
+        prefetch_depth=config["home_chain_event_fetch_prefetch_depth"],
+        follow_head=config["home_chain_event_fetch_follow_head"],
+        head_tracker=home_head_tracker,
+        checkpoint_store=checkpoint_store,
     )
-    confirmation_task_planner = ConfirmationTaskPlanner(
-        sync_persistence_time=HOME_CHAIN_STEP_DURATION,
-        transfer_event_queue=transfer_event_queue,
-        home_bridge_event_queue=home_bridge_event_queue,
-        confirmation_task_queue=confirmation_task_queue,
-    )
-    confirmation_sender = ConfirmationSender(
-        transfer_event_queue=confirmation_task_queue,
-        home_bridge_contract=home_bridge_contract,
-        private_key=config["validator_private_key"],
-        gas_price=config["home_chain_gas_price"],
-        max_reorg_depth=config["home_chain_max_reorg_depth"],
-    )
+
+    validator_transfer_event_queues = {}
+    validator_home_bridge_event_queues = {}
+    confirmation_task_planners = {}
+    confirmation_senders = []
+    for validator_address, validator_private_key in validator_private_keys.items():
+        validator_transfer_event_queues[validator_address] = Queue()
+        validator_home_bridge_event_queues[validator_address] = Queue()
+        confirmation_task_queue = Queue()
+
+        confirmation_task_planner = ConfirmationTaskPlanner(
+            sync_persistence_time=HOME_CHAIN_STEP_DURATION,
+            transfer_event_queue=validator_transfer_event_queues[validator_address],
+            home_bridge_event_queue=validator_home_bridge_event_queues[
+                validator_address
+            ],
+            confirmation_task_queue=confirmation_task_queue,
+            orphan_max_age=config["home_chain_orphan_event_max_age"],
+            home_head_tracker=home_head_tracker,
+            foreign_head_tracker=foreign_head_tracker,
+            confirmation_task_order=config["confirmation_task_order"],
+            max_confirmation_tasks_per_tick=config["max_confirmation_tasks_per_tick"],
+        )
+        if checkpoint_store is not None:
+            confirmation_task_planner.restore_recorder(
+                checkpoint_store.load_transfer_states(validator_address),
+                transfer_checkpoint=checkpoint_store.load(token_contract.address),
+                home_bridge_checkpoint=checkpoint_store.load(
+                    home_bridge_contract.address
+                ),
+            )
+        confirmation_task_planners[validator_address] = confirmation_task_planner
+
+        confirmation_senders.append(
+            ConfirmationSender(
+                transfer_event_queue=confirmation_task_queue,
+                home_bridge_contract=home_bridge_contract,
+                private_key=validator_private_key,
+                gas_price=config["home_chain_gas_price"],
+                max_reorg_depth=config["home_chain_max_reorg_depth"],
+                head_tracker=home_head_tracker,
+                max_concurrent_sends=config["home_chain_max_concurrent_sends"],
+            )
+        )
+
+    event_distributors = [
+        EventDistributor(transfer_event_queue, validator_transfer_event_queues),
+        EventDistributor(home_bridge_event_queue, validator_home_bridge_event_queues),
+    ]
 
     try:
-        coroutines_and_args = [
+        coroutines_and_args: List[tuple] = [
             (
                 transfer_event_fetcher.fetch_events,
                 config["foreign_chain_event_poll_interval"],
@@ -167,9 +241,51 @@ def main(config_path: str) -> None:
                 home_bridge_event_fetcher.fetch_events,
                 config["home_chain_event_poll_interval"],
             ),
-            (confirmation_task_planner.run,),
-            (confirmation_sender.run,),
         ]
+        coroutines_and_args.extend(
+            (event_distributor.run,) for event_distributor in event_distributors
+        )
+        coroutines_and_args.extend(
+            (confirmation_task_planner.run,)
+            for confirmation_task_planner in confirmation_task_planners.values()
+        )
+        coroutines_and_args.extend(
+            (confirmation_sender.run,) for confirmation_sender in confirmation_senders
+        )
+        if checkpoint_store is not None:
+            checkpoint_writer = CheckpointWriter(
+                confirmation_task_planners=confirmation_task_planners,
+                transfer_event_fetcher=transfer_event_fetcher,
+                home_bridge_event_fetcher=home_bridge_event_fetcher,
+                checkpoint_store=checkpoint_store,
+                interval=CHECKPOINT_INTERVAL,
+            )
+            coroutines_and_args.append((checkpoint_writer.run,))
+
+        if config["metrics_port"] is not None:
+            for (
+                validator_address,
+                confirmation_task_planner,
+            ) in confirmation_task_planners.items():
+                confirmation_task_planner.expose_metrics(
+                    to_checksum_address(validator_address)
+                )
+            metrics_server = WSGIServer(
+                ("", config["metrics_port"]), make_wsgi_app(), log=None
+            )
+            logger.info(f"Serving metrics on port {config['metrics_port']}")
+            coroutines_and_args.append((metrics_server.serve_forever,))
+
+        for subscription_url, head_tracker in (
+            (config["foreign_rpc_subscription_url"], foreign_head_tracker),
+            (config["home_rpc_subscription_url"], home_head_tracker),
+        ):
+            if subscription_url is not None:
+                new_heads_subscription = NewHeadsSubscription(
+                    url=subscription_url, head_tracker=head_tracker
+                )
+                coroutines_and_args.append((new_heads_subscription.run,))
+
         greenlets = [
             Greenlet.spawn(*coroutine_and_args)
             for coroutine_and_args in coroutines_and_args
@@ -0,0 +1,143 @@
+import json
+import logging
+import socket
+from typing import Any, Dict
+
+import gevent
+from websocket import WebSocketException, create_connection
+
+from bridge.head_tracker import HeadTracker
+
+SUBSCRIPTION_REQUEST = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "eth_subscribe",
+    "params": ["newHeads"],
+}
+
+
+class WebSocketConnection:
+    def __init__(self, url: str, timeout: float) -> None:
+        self.websocket = create_connection(url, timeout=timeout)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self.websocket.send(json.dumps(message))
+
+    def receive(self) -> Dict[str, Any]:
+        return json.loads(self.websocket.recv())
+
+    def close(self) -> None:
+        self.websocket.close()
+
+
+class IPCConnection:
+    """JSON-RPC connection via a Unix domain socket
+
+    Nodes write JSON objects to the socket without any framing, so received
+    data is buffered until it contains a complete object.
+    """
+
+    def __init__(self, path: str, timeout: float) -> None:
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self.socket.sendall(json.dumps(message).encode())
+
+    def receive(self) -> Dict[str, Any]:
+        while True:
+            self.buffer = self.buffer.lstrip()
+            if self.buffer:
+                try:
+                    message, end = self.decoder.raw_decode(self.buffer)
+                except json.JSONDecodeError:
+                    pass
+                else:
+                    self.buffer = self.buffer[end:]
+                    return message
+
+            data = self.socket.recv(4096)
+            if not data:
+                raise ConnectionError("IPC connection closed by the node")
+            self.buffer += data.decode()
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+def is_websocket_url(url: str) -> bool:
+    return url.startswith(("ws://", "wss://"))
+
+
+class NewHeadsSubscription:
+    """Pushes new heads of a chain into a head tracker
+
+    Subscribes to `newHeads` via a WebSocket or IPC endpoint of a node. If the
+    subscription drops, the head tracker falls back to polling until the
+    subscription could be established again.
+    """
+
+    def __init__(
+        self,
+        *,
+        url: str,
+        head_tracker: HeadTracker,
+        timeout: float = 60,
+        reconnect_delay: float = 5,
+    ) -> None:
+        self.logger = logging.getLogger(
+            "bridge.new_heads_subscription.NewHeadsSubscription"
+        )
+
+        self.url = url
+        self.head_tracker = head_tracker
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+
+    def connect(self):
+        if is_websocket_url(self.url):
+            return WebSocketConnection(self.url, self.timeout)
+        else:
+            return IPCConnection(self.url, self.timeout)
+
+    def subscribe(self) -> None:
+        connection = self.connect()
+        try:
+            connection.send(SUBSCRIPTION_REQUEST)
+            response = connection.receive()
+            if "error" in response:
+                raise ValueError(f"Subscription rejected: {response['error']}")
+
+            subscription_id = response["result"]
+            self.logger.info(f"Subscribed to new heads at {self.url}")
+
+            while True:
+                message = connection.receive()
+                if (
+                    message.get("method") == "eth_subscription"
+                    and message["params"]["subscription"] == subscription_id
+                ):
+                    block_number = int(message["params"]["result"]["number"], 16)
+                    self.logger.debug(f"Received new head {block_number}")
+                    self.head_tracker.update(block_number)
+        finally:
+            connection.close()
+
+    def run(self) -> None:
+        self.logger.info("Starting")
+        while True:
+            try:
+                self.subscribe()
+            except (OSError, ValueError, KeyError, WebSocketException) as error:
+                self.logger.warning(
+                    f"New heads subscription at {self.url} dropped ({error}), fall "
+                    f"back to polling"
+                )
+            gevent.sleep(self.reconnect_delay)
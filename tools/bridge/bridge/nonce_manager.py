@@ -0,0 +1,81 @@
+import logging
+from typing import Optional
+
+from eth_utils import to_checksum_address
+from web3 import Web3
+
+# parts of the error messages of geth and parity which signal that a nonce
+# has been used already
+NONCE_ERROR_MESSAGES = (
+    "nonce too low",
+    "nonce is too low",
+    "replacement transaction underpriced",
+    "another transaction with same nonce",
+)
+
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(nonce_message in message for nonce_message in NONCE_ERROR_MESSAGES)
+
+
+class NonceManager:
+    """Allocates the nonces of the transactions sent from a single account
+
+    The next nonce is requested from the node once, after that nonces are
+    allocated locally. This assumes that no one else sends transactions from
+    the account. If a nonce turns out to be used already, or might not have
+    been used at all because sending the transaction failed, the manager has
+    to be reset. It synchronizes with the node again on the next allocation.
+    """
+
+    def __init__(self, web3: Web3, address: bytes) -> None:
+        self.logger = logging.getLogger("bridge.nonce_manager.NonceManager")
+
+        self.web3 = web3
+        self.address = address
+        self.next_nonce: Optional[int] = None
+
+    def get_chain_nonce(self) -> int:
+        """get the next nonce of the account including pending transactions"""
+        return self.web3.eth.getTransactionCount(self.address, "pending")
+
+    def synchronize(self) -> None:
+        self.next_nonce = self.get_chain_nonce()
+        self.logger.info(
+            f"Synchronized nonce of {to_checksum_address(self.address)} at "
+            f"{self.next_nonce}"
+        )
+
+    def allocate(self) -> int:
+        if self.next_nonce is None:
+            self.synchronize()
+        assert self.next_nonce is not None
+
+        nonce = self.next_nonce
+        self.next_nonce += 1
+        return nonce
+
+    def reset(self) -> None:
+        """forget the next nonce, so that it is synchronized again on allocation"""
+        self.next_nonce = None
+
+    def check_for_gap(self) -> bool:
+        """check the next nonce against the node while no transaction is in flight
+
+        Returns True and resets the manager if they differ, e.g. because a
+        transaction has been dropped from the pool of the node.
+        """
+        if self.next_nonce is None:
+            return False
+
+        chain_nonce = self.get_chain_nonce()
+        if chain_nonce == self.next_nonce:
+            return False
+
+        self.logger.warning(
+            f"Next nonce {self.next_nonce} differs from the one of the node "
+            f"{chain_nonce}"
+        )
+        self.reset()
+        return True
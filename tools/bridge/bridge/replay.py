@@ -0,0 +1,736 @@
+"""Record the event streams of the bridge and replay them through the planner
+
+Traces are files with one JSON encoded event per line. Every event is
+annotated with the chain it has been emitted on and the timestamp of its
+block. Replaying a trace feeds its events through a real confirmation task
+planner, emulating event fetchers which are in sync, and hands the planned
+confirmation tasks to a stubbed sender. Traces can be recorded from the
+nodes the bridge is configured for, or generated synthetically.
+
+The time spent in the stages of the pipeline is reported separately. The
+fetch stage covers the work the event fetcher does on decoded events, as
+traces hold decoded events already.
+"""
+import json
+import logging
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import click
+import gevent
+from eth_keys.datatypes import PrivateKey
+from eth_typing import Hash32
+from eth_utils import decode_hex, encode_hex, to_canonical_address, to_checksum_address
+from gevent.queue import Queue
+from web3 import HTTPProvider, Web3
+
+from bridge.config import load_config
+from bridge.confirmation_task_planner import ConfirmationTaskPlanner
+from bridge.confirmation_transaction import (
+    encode_confirm_transfer_call,
+    sign_transaction,
+)
+from bridge.constants import (
+    COMPLETION_EVENT_NAME,
+    CONFIRMATION_EVENT_NAME,
+    CONFIRMATION_TRANSACTION_GAS_LIMIT,
+    HOME_CHAIN_STEP_DURATION,
+    TRANSFER_EVENT_NAME,
+)
+from bridge.contract_abis import HOME_BRIDGE_ABI, MINIMAL_ERC20_TOKEN_ABI
+from bridge.event_fetcher import EventFetcher, FetcherReachedHeadEvent
+from bridge.events import ChainEvent
+from bridge.head_tracker import HeadTracker
+from bridge.transfer_recorder import TransferRecorder
+from bridge.utils import add_transfer_hashes, compute_transfer_hash
+
+FOREIGN_CHAIN = "foreign"
+HOME_CHAIN = "home"
+
+HASH_FIELDS = ("transactionHash", "transferHash")
+
+
+class TraceEvent(NamedTuple):
+    chain: str
+    timestamp: int
+    event: ChainEvent
+
+
+def encode_trace_event(trace_event: TraceEvent) -> str:
+    fields = trace_event.event._asdict()
+    for field in HASH_FIELDS:
+        if fields[field] is not None:
+            fields[field] = encode_hex(fields[field])
+    return json.dumps(
+        {"chain": trace_event.chain, "timestamp": trace_event.timestamp, **fields}
+    )
+
+
+def decode_trace_event(line: str) -> TraceEvent:
+    fields = json.loads(line)
+    chain = fields.pop("chain")
+    timestamp = fields.pop("timestamp")
+    for field in HASH_FIELDS:
+        if fields[field] is not None:
+            fields[field] = Hash32(decode_hex(fields[field]))
+    return TraceEvent(chain, timestamp, ChainEvent(**fields))
+
+
+def write_trace(path: str, trace_events: Iterable[TraceEvent]) -> int:
+    """write the events to a trace file and return their number"""
+    number_of_events = 0
+    with open(path, "w") as trace_file:
+        for trace_event in trace_events:
+            trace_file.write(encode_trace_event(trace_event) + "\n")
+            number_of_events += 1
+    return number_of_events
+
+
+def read_trace(path: str) -> List[TraceEvent]:
+    with open(path) as trace_file:
+        return [decode_trace_event(line) for line in trace_file if line.strip()]
+
+
+def record_events(
+    event_fetcher: EventFetcher, chain: str, to_block_number: int
+) -> Iterable[TraceEvent]:
+    """fetch all events of the fetcher up to the given block number"""
+    block_timestamps: Dict[int, int] = {}
+    from_block_number = event_fetcher.last_fetched_block_number + 1
+    while from_block_number <= to_block_number:
+        range_to_block_number = min(
+            from_block_number + event_fetcher.block_range_controller.size - 1,
+            to_block_number,
+        )
+        events = event_fetcher.fetch_events_in_range_adaptively(
+            from_block_number, range_to_block_number
+        )
+        for event in events:
+            if event.blockNumber not in block_timestamps:
+                block_timestamps[event.blockNumber] = event_fetcher.web3.eth.getBlock(
+                    event.blockNumber
+                ).timestamp
+            yield TraceEvent(chain, block_timestamps[event.blockNumber], event)
+        from_block_number = range_to_block_number + 1
+
+
+def record_trace(
+    config: Dict, path: str, validator_address: Optional[bytes] = None
+) -> int:
+    """record the reorg safe events the bridge would fetch with the given config
+
+    A replay emulates the planner of a single validator, so only the
+    confirmation events of the given validator are recorded, by default of the
+    first one configured.
+    """
+    w3_foreign = Web3(
+        HTTPProvider(
+            config["foreign_rpc_url"],
+            request_kwargs={"timeout": config["foreign_rpc_timeout"]},
+        )
+    )
+    w3_home = Web3(
+        HTTPProvider(
+            config["home_rpc_url"],
+            request_kwargs={"timeout": config["home_rpc_timeout"]},
+        )
+    )
+    if validator_address is None:
+        validator_address = PrivateKey(
+            config["validator_private_key"][0]
+        ).public_key.to_canonical_address()
+
+    transfer_event_fetcher = EventFetcher(
+        web3=w3_foreign,
+        contract=w3_foreign.eth.contract(
+            address=config["foreign_chain_token_contract_address"],
+            abi=MINIMAL_ERC20_TOKEN_ABI,
+        ),
+        filter_definition={
+            TRANSFER_EVENT_NAME: {"to": config["foreign_bridge_contract_address"]}
+        },
+        event_queue=Queue(),
+        max_reorg_depth=config["foreign_chain_max_reorg_depth"],
+        start_block_number=config["foreign_chain_event_fetch_start_block_number"],
+    )
+    home_bridge_event_fetcher = EventFetcher(
+        web3=w3_home,
+        contract=w3_home.eth.contract(
+            address=config["home_bridge_contract_address"], abi=HOME_BRIDGE_ABI
+        ),
+        filter_definition={
+            CONFIRMATION_EVENT_NAME: {"validator": [validator_address]},
+            COMPLETION_EVENT_NAME: {},
+        },
+        event_queue=Queue(),
+        max_reorg_depth=config["home_chain_max_reorg_depth"],
+        start_block_number=config["home_chain_event_fetch_start_block_number"],
+    )
+
+    def record_all_events() -> Iterable[TraceEvent]:
+        for event_fetcher, chain in (
+            (transfer_event_fetcher, FOREIGN_CHAIN),
+            (home_bridge_event_fetcher, HOME_CHAIN),
+        ):
+            yield from record_events(
+                event_fetcher,
+                chain,
+                event_fetcher.web3.eth.blockNumber - event_fetcher.max_reorg_depth,
+            )
+
+    return write_trace(path, record_all_events())
+
+
+def generate_trace(
+    number_of_transfers: int,
+    completed_share: float = 0.0,
+    transfers_per_block: int = 10,
+    block_time: int = 5,
+    seed: int = 0,
+) -> List[TraceEvent]:
+    """generate a trace of transfers, a share of which is completed already
+
+    The home bridge events of completed transfers follow shortly after the
+    transfer on the foreign chain. Both chains start at the same time.
+    """
+    random_generator = random.Random(seed)
+
+    def get_random_hash() -> Hash32:
+        return Hash32(random_generator.getrandbits(256).to_bytes(32, "big"))
+
+    transfer_events = add_transfer_hashes(
+        [
+            ChainEvent(
+                event=TRANSFER_EVENT_NAME,
+                transactionHash=get_random_hash(),
+                logIndex=index % transfers_per_block,
+                blockNumber=index // transfers_per_block,
+                value=random_generator.randrange(1, 10 ** 21),
+                sender=to_checksum_address(
+                    random_generator.getrandbits(160).to_bytes(20, "big")
+                ),
+            )
+            for index in range(number_of_transfers)
+        ]
+    )
+
+    trace_events = []
+    for transfer_event in transfer_events:
+        timestamp = transfer_event.blockNumber * block_time
+        trace_events.append(TraceEvent(FOREIGN_CHAIN, timestamp, transfer_event))
+        if random_generator.random() >= completed_share:
+            continue
+
+        home_block_number = transfer_event.blockNumber + 2
+        for log_index, event_name in enumerate(
+            (CONFIRMATION_EVENT_NAME, COMPLETION_EVENT_NAME)
+        ):
+            trace_events.append(
+                TraceEvent(
+                    HOME_CHAIN,
+                    home_block_number * block_time,
+                    ChainEvent(
+                        event=event_name,
+                        transactionHash=get_random_hash(),
+                        logIndex=log_index,
+                        blockNumber=home_block_number,
+                        transferHash=compute_transfer_hash(transfer_event),
+                    ),
+                )
+            )
+
+    return trace_events
+
+
+def benchmark_confirmation_transactions(
+    number_of_transactions: int, seed: int = 0
+) -> Dict[str, float]:
+    """measure the seconds it takes to build and sign confirmation transactions
+
+    The transactions are built once with web3 and once with the encoder of
+    the confirmation sender, for the transfers of a generated trace.
+    """
+    confirm_transfer_arguments = [
+        (
+            trace_event.event.transferHash,
+            trace_event.event.transactionHash,
+            trace_event.event.value,
+            trace_event.event.sender,
+        )
+        for trace_event in generate_trace(number_of_transactions, seed=seed)
+    ]
+    private_key = PrivateKey(b"\x01" * 32)
+    home_bridge_contract = Web3().eth.contract(
+        address=to_checksum_address(b"\x02" * 20), abi=HOME_BRIDGE_ABI
+    )
+    chain_id = 1
+
+    def build_with_web3(nonce: int, arguments: tuple) -> None:
+        transaction = home_bridge_contract.functions.confirmTransfer(
+            *arguments
+        ).buildTransaction(
+            {
+                "gasPrice": 1,
+                "nonce": nonce,
+                "gas": CONFIRMATION_TRANSACTION_GAS_LIMIT,
+                "chainId": chain_id,
+            }
+        )
+        home_bridge_contract.web3.eth.account.sign_transaction(
+            transaction, private_key.to_bytes()
+        )
+
+    def build_offline(nonce: int, arguments: tuple) -> None:
+        sign_transaction(
+            private_key=private_key,
+            nonce=nonce,
+            gas_price=1,
+            gas=CONFIRMATION_TRANSACTION_GAS_LIMIT,
+            to=b"\x02" * 20,
+            value=0,
+            data=encode_confirm_transfer_call(*arguments),
+            chain_id=chain_id,
+        )
+
+    durations = {}
+    for name, build in (("web3", build_with_web3), ("offline", build_offline)):
+        start_time = time.perf_counter()
+        for nonce, arguments in enumerate(confirm_transfer_arguments):
+            build(nonce, arguments)
+        durations[name] = time.perf_counter() - start_time
+    return durations
+
+
+def get_percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    return sorted(values)[min(int(len(values) * percentile), len(values) - 1)]
+
+
+class ReplayReport(NamedTuple):
+    number_of_events: int
+    number_of_confirmation_tasks: int
+    duration: float
+    max_queue_depths: Dict[str, int]
+    # seconds from feeding a transfer event to the planner until the sender
+    # gets its confirmation task
+    planning_latencies: List[float]
+    # seconds spent in each stage of the pipeline
+    stage_durations: Dict[str, float]
+
+    @property
+    def events_per_second(self) -> float:
+        return self.number_of_events / self.duration if self.duration else 0.0
+
+    def format(self) -> str:
+        lines = [
+            f"Replayed {self.number_of_events} events in {self.duration:.2f}s "
+            f"({self.events_per_second:.0f} events/s)",
+            f"Sent {self.number_of_confirmation_tasks} confirmation tasks",
+            "Maximum queue depths: "
+            + ", ".join(
+                f"{name} {depth}" for name, depth in self.max_queue_depths.items()
+            ),
+        ]
+        if self.planning_latencies:
+            lines.append(
+                f"Planning latency: "
+                f"median {statistics.median(self.planning_latencies):.3f}s, "
+                f"p95 {get_percentile(self.planning_latencies, 0.95):.3f}s, "
+                f"max {max(self.planning_latencies):.3f}s"
+            )
+        if self.number_of_events:
+            lines.append(
+                "Stage durations: "
+                + ", ".join(
+                    f"{stage} {duration:.3f}s "
+                    f"({duration * 1e6 / self.number_of_events:.1f} us/event)"
+                    for stage, duration in self.stage_durations.items()
+                )
+            )
+        return "\n".join(lines)
+
+
+class StageTimer:
+    """Sums up the time spent in the stages of the pipeline
+
+    The stages do not yield to other greenlets, so the measured time is
+    spent in the stage only.
+    """
+
+    STAGES = ("fetch", "record", "plan")
+
+    def __init__(self) -> None:
+        self.durations = {stage: 0.0 for stage in self.STAGES}
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage] += time.perf_counter() - start_time
+
+
+class TimedTransferRecorder(TransferRecorder):
+    """Transfer recorder measuring the time spent applying events"""
+
+    def __init__(self, stage_timer: StageTimer, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.stage_timer = stage_timer
+
+    def apply_events(self, *args, **kwargs) -> None:
+        with self.stage_timer.measure("record"):
+            super().apply_events(*args, **kwargs)
+
+
+class TimedConfirmationTaskPlanner(ConfirmationTaskPlanner):
+    """Confirmation task planner measuring the time spent planning"""
+
+    def __init__(self, stage_timer: StageTimer, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.stage_timer = stage_timer
+        self.recorder = TimedTransferRecorder(
+            stage_timer, orphan_max_age=self.recorder.orphan_max_age
+        )
+
+    def _schedule_confirmation_tasks(self, *args, **kwargs) -> int:
+        with self.stage_timer.measure("plan"):
+            return super()._schedule_confirmation_tasks(*args, **kwargs)
+
+
+class TraceHeadTracker(HeadTracker):
+    """Head tracker following the blocks of a trace instead of a node"""
+
+    def __init__(self) -> None:
+        super().__init__(Web3(), max_age=float("inf"))
+
+    def refresh(self) -> int:
+        return self.block_number or 0
+
+
+class Replayer:
+    """Replays a trace through a confirmation task planner
+
+    The events of both chains are fed block by block, each block followed by
+    a FetcherReachedHeadEvent, as an event fetcher in sync would do. With a
+    speed of None, the events are fed as fast as the planner takes them,
+    otherwise the time between blocks is shortened by the given factor. The
+    sender is replaced by a stub which takes `sender_delay` seconds per
+    confirmation task. If a validator address is given, the confirmation
+    events of other validators are dropped, as the event distributor does.
+    """
+
+    def __init__(
+        self,
+        trace_events: List[TraceEvent],
+        *,
+        speed: Optional[float] = None,
+        sender_delay: float = 0.0,
+        sample_interval: float = 0.01,
+        confirmation_task_order: str = "oldest",
+        max_confirmation_tasks_per_tick: Optional[int] = None,
+        validator_address: Optional[bytes] = None,
+    ) -> None:
+        if speed is not None and speed <= 0:
+            raise ValueError("Can not replay a trace with zero or negative speed!")
+
+        self.trace_events = trace_events
+        self.validator_address = validator_address
+        self.speed = speed
+        self.sender_delay = sender_delay
+        self.sample_interval = sample_interval
+
+        self.transfer_event_queue = Queue()
+        self.home_bridge_event_queue = Queue()
+        self.confirmation_task_queue = Queue()
+        self.home_head_tracker = TraceHeadTracker()
+        self.stage_timer = StageTimer()
+        self.planner = TimedConfirmationTaskPlanner(
+            self.stage_timer,
+            sync_persistence_time=HOME_CHAIN_STEP_DURATION,
+            transfer_event_queue=self.transfer_event_queue,
+            home_bridge_event_queue=self.home_bridge_event_queue,
+            confirmation_task_queue=self.confirmation_task_queue,
+            home_head_tracker=self.home_head_tracker,
+            confirmation_task_order=confirmation_task_order,
+            max_confirmation_tasks_per_tick=max_confirmation_tasks_per_tick,
+        )
+
+        self.fed_at: Dict[Hash32, float] = {}
+        self.planning_latencies: List[float] = []
+        self.max_queue_depths = {
+            "transfer events": 0,
+            "home bridge events": 0,
+            "pending confirmation tasks": 0,
+            "confirmation tasks": 0,
+        }
+
+    def feed_events(self, chain: str, event_queue: Queue, start_time: float) -> None:
+        events = sorted(
+            (
+                trace_event
+                for trace_event in self.trace_events
+                if trace_event.chain == chain
+            ),
+            key=lambda trace_event: (
+                trace_event.event.blockNumber,
+                trace_event.event.logIndex,
+            ),
+        )
+        first_timestamp = min(
+            (trace_event.timestamp for trace_event in self.trace_events), default=0
+        )
+
+        block_number = 0
+        for block_number, block_events in groupby(
+            events, key=lambda trace_event: trace_event.event.blockNumber
+        ):
+            block_trace_events = list(block_events)
+            if self.speed is not None:
+                feed_time = (
+                    start_time
+                    + (block_trace_events[0].timestamp - first_timestamp) / self.speed
+                )
+                gevent.sleep(max(feed_time - time.monotonic(), 0))
+
+            if chain == HOME_CHAIN:
+                self.home_head_tracker.update(block_number)
+
+            # the fetcher hashes the transfers of every batch it has decoded
+            fetched_events = [
+                trace_event.event._replace(transferHash=None)
+                if trace_event.event.event == TRANSFER_EVENT_NAME
+                else trace_event.event
+                for trace_event in block_trace_events
+            ]
+            with self.stage_timer.measure("fetch"):
+                fetched_events = add_transfer_hashes(fetched_events)
+
+            for event in fetched_events:
+                if not self.is_relevant(event):
+                    continue
+                if event.event == TRANSFER_EVENT_NAME:
+                    self.fed_at[compute_transfer_hash(event)] = time.monotonic()
+                event_queue.put(event)
+            event_queue.put(FetcherReachedHeadEvent(block_number))
+            gevent.sleep(0)
+
+        # keep reporting the head, as fetchers do on every poll, until the
+        # planner has released all confirmation tasks
+        while not self.is_drained():
+            event_queue.put(FetcherReachedHeadEvent(block_number))
+            gevent.sleep(self.sample_interval)
+
+    def is_relevant(self, event: ChainEvent) -> bool:
+        return (
+            self.validator_address is None
+            or event.validator is None
+            or to_canonical_address(event.validator) == self.validator_address
+        )
+
+    def is_drained(self) -> bool:
+        return (
+            self.transfer_event_queue.empty()
+            and self.home_bridge_event_queue.empty()
+            and not self.planner.pending_confirmation_tasks
+            and self.confirmation_task_queue.empty()
+        )
+
+    def send_confirmations(self) -> None:
+        while True:
+            transfer_event = self.confirmation_task_queue.get()
+            self.planning_latencies.append(
+                time.monotonic() - self.fed_at[compute_transfer_hash(transfer_event)]
+            )
+            gevent.sleep(self.sender_delay)
+
+    def sample_queue_depths(self) -> None:
+        while True:
+            for name, depth in (
+                ("transfer events", self.transfer_event_queue.qsize()),
+                ("home bridge events", self.home_bridge_event_queue.qsize()),
+                (
+                    "pending confirmation tasks",
+                    len(self.planner.pending_confirmation_tasks),
+                ),
+                ("confirmation tasks", self.confirmation_task_queue.qsize()),
+            ):
+                self.max_queue_depths[name] = max(self.max_queue_depths[name], depth)
+            gevent.sleep(self.sample_interval)
+
+    def run(self) -> ReplayReport:
+        start_time = time.monotonic()
+        background_greenlets = [
+            gevent.spawn(self.planner.run),
+            gevent.spawn(self.send_confirmations),
+            gevent.spawn(self.sample_queue_depths),
+        ]
+        try:
+            feeding_greenlets = [
+                gevent.spawn(
+                    self.feed_events,
+                    FOREIGN_CHAIN,
+                    self.transfer_event_queue,
+                    start_time,
+                ),
+                gevent.spawn(
+                    self.feed_events,
+                    HOME_CHAIN,
+                    self.home_bridge_event_queue,
+                    start_time,
+                ),
+            ]
+            gevent.joinall(
+                feeding_greenlets + background_greenlets,
+                raise_error=True,
+                count=len(feeding_greenlets),
+            )
+            # wait until the sender is done with the last task
+            gevent.sleep(self.sender_delay)
+        finally:
+            gevent.killall(background_greenlets)
+
+        return ReplayReport(
+            number_of_events=len(self.trace_events),
+            number_of_confirmation_tasks=len(self.planning_latencies),
+            duration=time.monotonic() - start_time,
+            max_queue_depths=self.max_queue_depths,
+            planning_latencies=self.planning_latencies,
+            stage_durations=self.stage_timer.durations,
+        )
+
+
+@click.group()
+def main() -> None:
+    """Record and replay event traces of the bridge"""
+    logging.basicConfig(level=logging.WARNING)
+
+
+@main.command()
+@click.option(
+    "-c",
+    "--config",
+    "config_path",
+    type=click.Path(exists=True),
+    required=False,
+    help="Path to a config file",
+)
+@click.option(
+    "--validator",
+    "validator_address",
+    default=None,
+    help="Validator to record the confirmations of, the first configured if not given",
+)
+@click.argument("trace_path", type=click.Path())
+def record(config_path: str, validator_address: Optional[str], trace_path: str) -> None:
+    """Record the events the bridge would fetch into a trace"""
+    try:
+        config = load_config(config_path)
+    except ValueError as value_error:
+        raise click.UsageError(f"Invalid config file: {value_error}") from value_error
+
+    number_of_events = record_trace(
+        config,
+        trace_path,
+        validator_address=None
+        if validator_address is None
+        else to_canonical_address(validator_address),
+    )
+    click.echo(f"Recorded {number_of_events} events")
+
+
+@main.command()
+@click.option("--transfers", "number_of_transfers", type=int, default=100_000)
+@click.option(
+    "--completed-share",
+    type=float,
+    default=0.0,
+    help="Share of transfers which are completed on the home chain",
+)
+@click.option("--transfers-per-block", type=int, default=10)
+@click.option("--seed", type=int, default=0)
+@click.argument("trace_path", type=click.Path())
+def generate(
+    number_of_transfers: int,
+    completed_share: float,
+    transfers_per_block: int,
+    seed: int,
+    trace_path: str,
+) -> None:
+    """Generate a synthetic trace of transfers"""
+    number_of_events = write_trace(
+        trace_path,
+        generate_trace(
+            number_of_transfers,
+            completed_share=completed_share,
+            transfers_per_block=transfers_per_block,
+            seed=seed,
+        ),
+    )
+    click.echo(f"Generated {number_of_events} events")
+
+
+@main.command()
+@click.option(
+    "--speed",
+    type=float,
+    default=None,
+    help="Factor to speed up the trace by, as fast as possible if not given",
+)
+@click.option(
+    "--sender-delay",
+    type=float,
+    default=0.0,
+    help="Seconds the stubbed sender takes per confirmation task",
+)
+@click.option(
+    "--order",
+    "confirmation_task_order",
+    type=click.Choice(["oldest", "largest_value"]),
+    default="oldest",
+)
+@click.option("--max-tasks-per-tick", type=int, default=None)
+@click.option(
+    "--validator",
+    "validator_address",
+    default=None,
+    help="Validator to replay the confirmations of, all in the trace if not given",
+)
+@click.argument("trace_path", type=click.Path(exists=True))
+def replay(
+    speed: Optional[float],
+    sender_delay: float,
+    confirmation_task_order: str,
+    max_tasks_per_tick: Optional[int],
+    validator_address: Optional[str],
+    trace_path: str,
+) -> None:
+    """Replay a trace through the confirmation task planner"""
+    replayer = Replayer(
+        read_trace(trace_path),
+        speed=speed,
+        sender_delay=sender_delay,
+        confirmation_task_order=confirmation_task_order,
+        max_confirmation_tasks_per_tick=max_tasks_per_tick,
+        validator_address=None
+        if validator_address is None
+        else to_canonical_address(validator_address),
+    )
+    click.echo(replayer.run().format())
+
+
+@main.command("benchmark-signing")
+@click.option("--transactions", "number_of_transactions", type=int, default=1000)
+def benchmark_signing(number_of_transactions: int) -> None:
+    """Compare building confirmation transactions with web3 and offline"""
+    durations = benchmark_confirmation_transactions(number_of_transactions)
+    for name, duration in durations.items():
+        click.echo(
+            f"{name}: {duration * 1e6 / number_of_transactions:.1f} us per transaction"
+        )
+    click.echo(f"speedup: {durations['web3'] / durations['offline']:.1f}x")
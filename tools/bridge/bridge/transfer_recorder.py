@@ -1,71 +1,609 @@
-from typing import Dict, List, Set
+import heapq
+from collections import OrderedDict
+from itertools import count
+from math import inf
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from eth_typing import Hash32
-from web3.datastructures import AttributeDict
+from prometheus_client import Counter, Gauge, Histogram
 
 from bridge.constants import (
     COMPLETION_EVENT_NAME,
     CONFIRMATION_EVENT_NAME,
     TRANSFER_EVENT_NAME,
 )
+from bridge.events import ChainEvent
 from bridge.utils import compute_transfer_hash
 
+EVICTED_ORPHAN_TRANSFERS = Counter(
+    "bridge_evicted_orphan_transfers",
+    "Number of transfers with home chain events only which have been forgotten",
+)
+TRANSFERS = Gauge(
+    "bridge_transfers",
+    "Number of transfers tracked by the recorder, and of those queued or scheduled",
+    labelnames=["validator", "state"],
+)
+OLDEST_UNCONFIRMED_TRANSFER_AGE = Gauge(
+    "bridge_oldest_unconfirmed_transfer_age_seconds",
+    "Time since the oldest transfer without confirmation or completion has been seen",
+    labelnames=["validator"],
+)
+# confirming and completing a transfer can take anything from seconds to hours
+LATENCY_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 3 * 3600, 86400)
+TRANSFER_COMPLETION_LATENCY = Histogram(
+    "bridge_transfer_completion_latency_seconds",
+    "Time from seeing a transfer event to seeing its completion event",
+    labelnames=["validator"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def get_max_block_number(*block_numbers: Optional[int]) -> Optional[int]:
+    return max(
+        (block_number for block_number in block_numbers if block_number is not None),
+        default=None,
+    )
+
+
+class TransferState:
+    """The events seen for a single transfer hash"""
+
+    __slots__ = (
+        "transfer_event",
+        "confirmation_block_number",
+        "completion_block_number",
+        "is_scheduled",
+        "home_chain_check_block_number",
+        "foreign_chain_check_block_number",
+        "transfer_seen_at",
+    )
 
-class TransferRecorder:
     def __init__(self) -> None:
-        self.transfer_events: Dict[Hash32, AttributeDict] = {}
+        self.transfer_event: Optional[ChainEvent] = None
+        # block numbers of the first confirmation and completion event
+        self.confirmation_block_number: Optional[int] = None
+        self.completion_block_number: Optional[int] = None
+        self.is_scheduled = False
+        # Home chain block number up to which the home bridge events have to
+        # be processed to know that the transfer has not been confirmed yet.
+        # It is not part of snapshots, as it is only valid within a single
+        # run of the bridge.
+        self.home_chain_check_block_number: Optional[int] = None
+        # Foreign chain block number up to which the transfer events have to
+        # be processed to know that a transfer seen on the home chain has no
+        # transfer event, e.g. the foreign head when a home bridge event has
+        # been applied. It is not part of snapshots either.
+        self.foreign_chain_check_block_number: Optional[int] = None
+        # monotonic time at which the transfer event has been seen first
+        # during the current run, used for latency metrics only
+        self.transfer_seen_at: Optional[float] = None
 
-        self.transfer_hashes: Set[Hash32] = set()
-        self.confirmation_hashes: Set[Hash32] = set()
-        self.completion_hashes: Set[Hash32] = set()
+    def is_empty(self) -> bool:
+        return (
+            self.transfer_event is None
+            and self.confirmation_block_number is None
+            and self.completion_block_number is None
+        )
 
-        self.scheduled_hashes: Set[Hash32] = set()
+    def get_first_home_chain_block_number(self) -> Optional[int]:
+        home_chain_block_numbers = [
+            block_number
+            for block_number in (
+                self.confirmation_block_number,
+                self.completion_block_number,
+            )
+            if block_number is not None
+        ]
+        return min(home_chain_block_numbers, default=None)
+
+    def is_ready_to_confirm(self) -> bool:
+        return (
+            self.transfer_event is not None
+            and self.confirmation_block_number is None
+            and self.completion_block_number is None
+            and not self.is_scheduled
+        )
+
+    def is_checked(self, home_bridge_events_checked_until: Optional[int]) -> bool:
+        """check whether the home bridge events relevant to the transfer are known
+
+        A block number of None means that the home bridge events are in sync.
+        """
+        return home_bridge_events_checked_until is None or (
+            self.home_chain_check_block_number is not None
+            and self.home_chain_check_block_number <= home_bridge_events_checked_until
+        )
+
+    def is_transfer_event_missing(
+        self, transfer_events_processed_until: Optional[int]
+    ) -> bool:
+        """check whether the transfer event would have been seen if it existed"""
+        return (
+            self.transfer_event is None
+            and self.foreign_chain_check_block_number is not None
+            and transfer_events_processed_until is not None
+            and self.foreign_chain_check_block_number <= transfer_events_processed_until
+        )
+
+    def is_resolved(self) -> bool:
+        """check whether the transfer does not need to be tracked anymore
+
+        Once a transfer is completed, it does not matter whether this
+        validator has confirmed it, as other validators might have completed
+        it first.
+        """
+        return (
+            self.transfer_event is not None and self.completion_block_number is not None
+        )
+
+    def revert_transfer_event(self, from_block_number: int) -> bool:
+        """forget the transfer event if it is in a reverted block"""
+        if (
+            self.transfer_event is None
+            or self.transfer_event.blockNumber < from_block_number
+        ):
+            return False
+
+        self.transfer_event = None
+        return True
+
+    def revert_home_bridge_events(self, from_block_number: int) -> bool:
+        """forget the home bridge events which are in reverted blocks"""
+        is_reverted = False
+        if (
+            self.confirmation_block_number is not None
+            and self.confirmation_block_number >= from_block_number
+        ):
+            self.confirmation_block_number = None
+            is_reverted = True
+        if (
+            self.completion_block_number is not None
+            and self.completion_block_number >= from_block_number
+        ):
+            self.completion_block_number = None
+            is_reverted = True
+        return is_reverted
+
+    def is_final(
+        self,
+        transfer_events_final_until: Optional[int],
+        home_bridge_events_final_until: Optional[int],
+    ) -> bool:
+        """check whether the seen events can not be reverted anymore
+
+        A final block number of None means that all applied events are final.
+        """
+        if (
+            transfer_events_final_until is not None
+            and self.transfer_event is not None
+            and self.transfer_event.blockNumber > transfer_events_final_until
+        ):
+            return False
+
+        if home_bridge_events_final_until is not None:
+            for block_number in (
+                self.confirmation_block_number,
+                self.completion_block_number,
+            ):
+                if (
+                    block_number is not None
+                    and block_number > home_bridge_events_final_until
+                ):
+                    return False
+
+        return True
+
+
+class TransferRecorder:
+    """Keeps track of the state of all transfers still relevant to the bridge
+
+    Applying an event updates the state of a single transfer. Transfers
+    which become ready to confirm or resolved by this are queued, so pulling
+    and clearing transfers only has to look at the queued ones instead of
+    all tracked transfers. Transfers ready to confirm which still wait for
+    their event to be final or checked are kept in heaps ordered by the block
+    number this happens at, so a pull only looks at the ones which became
+    eligible.
+    """
+
+    def __init__(self, orphan_max_age: Optional[int] = None) -> None:
+        self.transfer_states: Dict[Hash32, TransferState] = {}
+
+        # Transfers with home chain events only, in the order of the block
+        # number of their first home chain event. If a transfer event does
+        # not turn up for too long, it never will, e.g. because it happened
+        # before the start block of the foreign chain event fetcher.
+        self.orphan_max_age = orphan_max_age
+        self.orphan_block_numbers: "OrderedDict[Hash32, int]" = OrderedDict()
+
+        # transfer hashes which became ready to confirm since the last pull,
+        # and which became resolved since the last clear or are waiting for
+        # their events to be final
+        self.ready_hashes: List[Hash32] = []
+        self.resolved_hashes: List[Hash32] = []
+
+        # Transfers ready to confirm which wait for their transfer event to be
+        # final, by its block number, and then for the home bridge events to
+        # be checked, by their home chain check block number. The sequence
+        # number keeps the order in which transfers became ready for equal
+        # block numbers.
+        self.unfinal_transfers: List[Tuple[int, int, Hash32]] = []
+        self.unchecked_transfers: List[Tuple[float, int, Hash32]] = []
+        self.waiting_sequence = count()
+
+        # transfer hashes whose state changed since the last snapshot, so
+        # only those have to be stored
+        self.changed_hashes: Set[Hash32] = set()
 
         self.home_chain_synced_until = 0.0
 
-    def apply_proper_event(self, event: AttributeDict) -> None:
+        # set once the metrics are exposed
+        self.completion_latency: Optional[Histogram] = None
+
+    def count_scheduled_transfers(self) -> int:
+        """count the transfers scheduled for confirmation but not completed yet"""
+        return sum(
+            transfer_state.is_scheduled
+            and transfer_state.completion_block_number is None
+            for transfer_state in self.transfer_states.values()
+        )
+
+    def get_oldest_unconfirmed_transfer_age(self) -> float:
+        """get the seconds since the oldest transfer still to confirm has been seen"""
+        now = monotonic()
+        return max(
+            (
+                now - transfer_state.transfer_seen_at
+                for transfer_state in self.transfer_states.values()
+                if transfer_state.transfer_seen_at is not None
+                and transfer_state.confirmation_block_number is None
+                and transfer_state.completion_block_number is None
+            ),
+            default=0.0,
+        )
+
+    def expose_metrics(self, validator: str) -> None:
+        """report the state of this recorder whenever the metrics are collected"""
+        for state, get_number_of_transfers in (
+            ("tracked", lambda: len(self.transfer_states)),
+            (
+                "ready",
+                lambda: len(self.ready_hashes)
+                + len(self.unfinal_transfers)
+                + len(self.unchecked_transfers),
+            ),
+            ("resolved", lambda: len(self.resolved_hashes)),
+            ("orphaned", lambda: len(self.orphan_block_numbers)),
+            ("scheduled", self.count_scheduled_transfers),
+        ):
+            TRANSFERS.labels(validator, state).set_function(get_number_of_transfers)
+        OLDEST_UNCONFIRMED_TRANSFER_AGE.labels(validator).set_function(
+            self.get_oldest_unconfirmed_transfer_age
+        )
+        self.completion_latency = TRANSFER_COMPLETION_LATENCY.labels(validator)
+
+    def _get_transfer_state(self, transfer_hash: Hash32) -> TransferState:
+        transfer_state = self.transfer_states.get(transfer_hash)
+        if transfer_state is None:
+            transfer_state = TransferState()
+            self.transfer_states[transfer_hash] = transfer_state
+        return transfer_state
+
+    def _queue_transfer(
+        self, transfer_hash: Hash32, transfer_state: TransferState
+    ) -> None:
+        if transfer_state.is_ready_to_confirm():
+            self.ready_hashes.append(transfer_hash)
+        if transfer_state.is_resolved():
+            self.resolved_hashes.append(transfer_hash)
+
+    def _wait_until_final(
+        self, transfer_hash: Hash32, transfer_state: TransferState
+    ) -> None:
+        assert transfer_state.transfer_event is not None
+        heapq.heappush(
+            self.unfinal_transfers,
+            (
+                transfer_state.transfer_event.blockNumber,
+                next(self.waiting_sequence),
+                transfer_hash,
+            ),
+        )
+
+    def _wait_until_checked(
+        self, transfer_hash: Hash32, transfer_state: TransferState
+    ) -> None:
+        # without a check block number, a transfer waits for the home chain sync
+        check_block_number = transfer_state.home_chain_check_block_number
+        heapq.heappush(
+            self.unchecked_transfers,
+            (
+                inf if check_block_number is None else check_block_number,
+                next(self.waiting_sequence),
+                transfer_hash,
+            ),
+        )
+
+    def _get_transfer_state_ready_to_confirm(
+        self, transfer_hash: Hash32
+    ) -> Optional[TransferState]:
+        transfer_state = self.transfer_states.get(transfer_hash)
+        if transfer_state is None or not transfer_state.is_ready_to_confirm():
+            return None
+        return transfer_state
+
+    def apply_proper_event(
+        self,
+        event: ChainEvent,
+        home_chain_check_block_number: Optional[int] = None,
+        foreign_chain_check_block_number: Optional[int] = None,
+    ) -> None:
+        """apply an event to the state of its transfer
+
+        The home chain check block number of transfer events is the height of
+        the home chain when the event has been seen. Once the home bridge
+        events are processed up to there, all previously sent confirmations
+        are known. The foreign chain check block number of home bridge events
+        is the height of the foreign chain when the event has been seen. The
+        transfer event precedes any home bridge event of its transfer, so it
+        is known once the transfer events are processed up to there.
+        """
         event_name = event.event
 
         if event_name == TRANSFER_EVENT_NAME:
             transfer_hash = compute_transfer_hash(event)
-            self.transfer_hashes.add(transfer_hash)
-            self.transfer_events[transfer_hash] = event
+            transfer_state = self._get_transfer_state(transfer_hash)
+            transfer_state.transfer_event = event
+            if transfer_state.transfer_seen_at is None:
+                transfer_state.transfer_seen_at = monotonic()
+            if home_chain_check_block_number is not None:
+                transfer_state.home_chain_check_block_number = max(
+                    home_chain_check_block_number,
+                    transfer_state.home_chain_check_block_number or 0,
+                )
+            self.orphan_block_numbers.pop(transfer_hash, None)
         elif event_name == CONFIRMATION_EVENT_NAME:
-            transfer_hash = Hash32(bytes(event.args.transferHash))
-            assert len(transfer_hash) == 32
-            self.confirmation_hashes.add(transfer_hash)
+            event_transfer_hash = event.transferHash
+            assert event_transfer_hash is not None and len(event_transfer_hash) == 32
+            transfer_hash = event_transfer_hash
+            transfer_state = self._get_transfer_state(transfer_hash)
+            if transfer_state.confirmation_block_number is None:
+                transfer_state.confirmation_block_number = event.blockNumber
+            transfer_state.foreign_chain_check_block_number = get_max_block_number(
+                foreign_chain_check_block_number,
+                transfer_state.foreign_chain_check_block_number,
+            )
         elif event_name == COMPLETION_EVENT_NAME:
-            transfer_hash = Hash32(bytes(event.args.transferHash))
-            assert len(transfer_hash) == 32
-            self.completion_hashes.add(transfer_hash)
+            event_transfer_hash = event.transferHash
+            assert event_transfer_hash is not None and len(event_transfer_hash) == 32
+            transfer_hash = event_transfer_hash
+            transfer_state = self._get_transfer_state(transfer_hash)
+            transfer_state.foreign_chain_check_block_number = get_max_block_number(
+                foreign_chain_check_block_number,
+                transfer_state.foreign_chain_check_block_number,
+            )
+            if transfer_state.completion_block_number is None:
+                transfer_state.completion_block_number = event.blockNumber
+                if (
+                    self.completion_latency is not None
+                    and transfer_state.transfer_seen_at is not None
+                ):
+                    self.completion_latency.observe(
+                        monotonic() - transfer_state.transfer_seen_at
+                    )
         else:
             raise ValueError(f"Got unknown event {event}")
 
-    def clear_transfers(self) -> None:
-        all_stages_seen = (
-            self.transfer_hashes & self.confirmation_hashes & self.completion_hashes
-        )
-        self.transfer_hashes -= all_stages_seen
-        self.confirmation_hashes -= all_stages_seen
-        self.completion_hashes -= all_stages_seen
+        if transfer_state.transfer_event is None:
+            self.orphan_block_numbers.setdefault(transfer_hash, event.blockNumber)
+
+        self.changed_hashes.add(transfer_hash)
+        self._queue_transfer(transfer_hash, transfer_state)
+
+    def apply_events(
+        self,
+        events: Iterable[ChainEvent],
+        home_chain_check_block_number: Optional[int] = None,
+        foreign_chain_check_block_number: Optional[int] = None,
+    ) -> None:
+        for event in events:
+            self.apply_proper_event(
+                event, home_chain_check_block_number, foreign_chain_check_block_number
+            )
 
-        self.scheduled_hashes -= all_stages_seen
+    def _requeue_reverted_transfer(
+        self, transfer_hash: Hash32, transfer_state: TransferState
+    ) -> None:
+        self.changed_hashes.add(transfer_hash)
+        if transfer_state.is_empty():
+            del self.transfer_states[transfer_hash]
+            self.orphan_block_numbers.pop(transfer_hash, None)
+            return
 
-        for transfer_hash in all_stages_seen:
-            self.transfer_events.pop(transfer_hash, None)
+        home_chain_block_number = transfer_state.get_first_home_chain_block_number()
+        if (
+            transfer_state.transfer_event is None
+            and home_chain_block_number is not None
+        ):
+            self.orphan_block_numbers.setdefault(transfer_hash, home_chain_block_number)
+        self._queue_transfer(transfer_hash, transfer_state)
 
-    def pull_transfers_to_confirm(self) -> List[AttributeDict]:
-        unconfirmed_transfer_hashes = (
-            self.transfer_hashes
-            - self.confirmation_hashes
-            - self.completion_hashes
-            - self.scheduled_hashes
+    def revert_transfer_events(self, from_block_number: int) -> None:
+        """forget the transfer events from the given block number on"""
+        for transfer_hash, transfer_state in list(self.transfer_states.items()):
+            if transfer_state.revert_transfer_event(from_block_number):
+                self._requeue_reverted_transfer(transfer_hash, transfer_state)
+
+    def revert_home_bridge_events(self, from_block_number: int) -> None:
+        """forget the home bridge events from the given block number on"""
+        for transfer_hash, transfer_state in list(self.transfer_states.items()):
+            if transfer_state.revert_home_bridge_events(from_block_number):
+                self._requeue_reverted_transfer(transfer_hash, transfer_state)
+
+    def evict_orphans(
+        self,
+        home_bridge_events_processed_until: int,
+        transfer_events_processed_until: Optional[int] = None,
+    ) -> int:
+        """forget the transfers with home chain events only which are too old
+
+        Only transfers whose transfer event would have been processed already
+        are evicted, so an event fetcher lagging behind on the foreign chain
+        does not make the bridge forget about confirmed transfers. Returns the
+        number of evicted transfers.
+        """
+        if self.orphan_max_age is None:
+            return 0
+
+        evict_before_block_number = (
+            home_bridge_events_processed_until - self.orphan_max_age
         )
-        self.scheduled_hashes |= unconfirmed_transfer_hashes
-        confirmation_tasks = [
-            self.transfer_events[transfer_hash]
-            for transfer_hash in unconfirmed_transfer_hashes
-        ]
+        number_of_evicted_transfers = 0
+        while self.orphan_block_numbers:
+            transfer_hash, block_number = next(iter(self.orphan_block_numbers.items()))
+            if block_number >= evict_before_block_number:
+                break
+            if not self.transfer_states[transfer_hash].is_transfer_event_missing(
+                transfer_events_processed_until
+            ):
+                break
 
-        self.clear_transfers()
+            del self.orphan_block_numbers[transfer_hash]
+            del self.transfer_states[transfer_hash]
+            self.changed_hashes.add(transfer_hash)
+            number_of_evicted_transfers += 1
+
+        EVICTED_ORPHAN_TRANSFERS.inc(number_of_evicted_transfers)
+        return number_of_evicted_transfers
+
+    def clear_transfers(
+        self,
+        transfer_events_final_until: Optional[int] = None,
+        home_bridge_events_final_until: Optional[int] = None,
+    ) -> None:
+        """forget the resolved transfers whose events are final"""
+        unfinalized_hashes = []
+        for transfer_hash in self.resolved_hashes:
+            transfer_state = self.transfer_states.get(transfer_hash)
+            if transfer_state is None or not transfer_state.is_resolved():
+                continue
+
+            if not transfer_state.is_final(
+                transfer_events_final_until, home_bridge_events_final_until
+            ):
+                unfinalized_hashes.append(transfer_hash)
+                continue
+
+            del self.transfer_states[transfer_hash]
+            self.changed_hashes.add(transfer_hash)
+
+        self.resolved_hashes = unfinalized_hashes
+
+    def pull_transfers_to_confirm(
+        self,
+        transfer_events_final_until: Optional[int] = None,
+        home_bridge_events_final_until: Optional[int] = None,
+        home_bridge_events_checked_until: Optional[int] = None,
+    ) -> List[ChainEvent]:
+        """get the transfers to confirm which have not been pulled before
+
+        Only transfers whose event is final are returned, so confirmations
+        are never sent for transfers which might get reverted. If the home
+        bridge events are only processed up to the given check block number,
+        only transfers whose home chain check block number has been reached
+        are returned.
+        """
+        for transfer_hash in self.ready_hashes:
+            transfer_state = self._get_transfer_state_ready_to_confirm(transfer_hash)
+            if transfer_state is not None:
+                self._wait_until_final(transfer_hash, transfer_state)
+        self.ready_hashes = []
+
+        # Entries of transfers which have been scheduled, confirmed or
+        # reverted since they have been pushed are skipped. If a transfer
+        # event has been reverted and seen again, the transfer waits again.
+        while self.unfinal_transfers and (
+            transfer_events_final_until is None
+            or self.unfinal_transfers[0][0] <= transfer_events_final_until
+        ):
+            _, _, transfer_hash = heapq.heappop(self.unfinal_transfers)
+            transfer_state = self._get_transfer_state_ready_to_confirm(transfer_hash)
+            if transfer_state is None:
+                continue
+
+            if transfer_state.is_final(transfer_events_final_until, None):
+                self._wait_until_checked(transfer_hash, transfer_state)
+            else:
+                self._wait_until_final(transfer_hash, transfer_state)
+
+        confirmation_tasks = []
+        while self.unchecked_transfers and (
+            home_bridge_events_checked_until is None
+            or self.unchecked_transfers[0][0] <= home_bridge_events_checked_until
+        ):
+            _, _, transfer_hash = heapq.heappop(self.unchecked_transfers)
+            transfer_state = self._get_transfer_state_ready_to_confirm(transfer_hash)
+            if transfer_state is None:
+                continue
+
+            if not transfer_state.is_final(transfer_events_final_until, None):
+                self._wait_until_final(transfer_hash, transfer_state)
+            elif not transfer_state.is_checked(home_bridge_events_checked_until):
+                self._wait_until_checked(transfer_hash, transfer_state)
+            else:
+                transfer_state.is_scheduled = True
+                assert transfer_state.transfer_event is not None
+                confirmation_tasks.append(transfer_state.transfer_event)
+
+        self.clear_transfers(
+            transfer_events_final_until, home_bridge_events_final_until
+        )
         return confirmation_tasks
+
+    def pop_changed_transfer_states(self) -> Dict[Hash32, Optional[TransferState]]:
+        """get the states of the transfers changed since the last call
+
+        Transfers which are not tracked anymore are mapped to None.
+        """
+        changed_transfer_states = {
+            transfer_hash: self.transfer_states.get(transfer_hash)
+            for transfer_hash in self.changed_hashes
+        }
+        self.changed_hashes = set()
+        return changed_transfer_states
+
+    def restore(
+        self,
+        transfer_states: Dict[Hash32, TransferState],
+        foreign_chain_check_block_number: Optional[int] = None,
+    ) -> None:
+        """restore the transfer states from a snapshot
+
+        The foreign chain check block number of the restored transfers is not
+        part of the snapshot, it should be the current foreign head. Transfers
+        which have not been confirmed are scheduled again, as the confirmation
+        tasks of the previous run are gone.
+        """
+        if self.transfer_states:
+            raise ValueError("Can only restore transfer states into an empty recorder!")
+
+        self.transfer_states = dict(transfer_states)
+
+        orphan_block_numbers = []
+        for transfer_hash, transfer_state in self.transfer_states.items():
+            home_chain_block_number = transfer_state.get_first_home_chain_block_number()
+            if (
+                transfer_state.transfer_event is None
+                and home_chain_block_number is not None
+            ):
+                orphan_block_numbers.append((home_chain_block_number, transfer_hash))
+                transfer_state.foreign_chain_check_block_number = (
+                    foreign_chain_check_block_number
+                )
+            transfer_state.is_scheduled = False
+            self._queue_transfer(transfer_hash, transfer_state)
+
+        for home_chain_block_number, transfer_hash in sorted(orphan_block_numbers):
+            self.orphan_block_numbers[transfer_hash] = home_chain_block_number
@@ -1,16 +1,48 @@
+from typing import Iterable, List, Tuple
+
+from eth_hash.auto import keccak
 from eth_typing import Hash32
-from eth_utils import int_to_big_endian, keccak
-from web3.datastructures import AttributeDict
-
-
-def compute_transfer_hash(transfer_event: AttributeDict) -> Hash32:
-    return Hash32(
-        keccak(
-            b"".join(
-                [
-                    bytes(transfer_event.transactionHash),
-                    int_to_big_endian(transfer_event.logIndex),
-                ]
-            )
-        )
+from eth_utils import int_to_big_endian
+
+from bridge.constants import TRANSFER_EVENT_NAME
+from bridge.events import ChainEvent
+
+
+def compute_transfer_hashes(transfer_ids: Iterable[Tuple[Hash32, int]]) -> List[Hash32]:
+    """compute the hashes of transfers given by their transaction hash and log index
+
+    This calls the keccak backend picked by eth-hash directly, skipping the
+    input conversions of eth-utils, which is noticeable when hashing all
+    transfers during the initial sync.
+    """
+    return [
+        Hash32(keccak(bytes(transaction_hash) + int_to_big_endian(log_index)))
+        for transaction_hash, log_index in transfer_ids
+    ]
+
+
+def compute_transfer_hash(transfer_event: ChainEvent) -> Hash32:
+    if transfer_event.transferHash is not None:
+        return transfer_event.transferHash
+
+    (transfer_hash,) = compute_transfer_hashes(
+        [(transfer_event.transactionHash, transfer_event.logIndex)]
+    )
+    return transfer_hash
+
+
+def add_transfer_hashes(events: List[ChainEvent]) -> List[ChainEvent]:
+    """set the transfer hash of all transfer events, hashing them in one batch"""
+    transfer_indices = [
+        index
+        for index, event in enumerate(events)
+        if event.event == TRANSFER_EVENT_NAME and event.transferHash is None
+    ]
+    transfer_hashes = compute_transfer_hashes(
+        (events[index].transactionHash, events[index].logIndex)
+        for index in transfer_indices
     )
+    events = list(events)
+    for index, transfer_hash in zip(transfer_indices, transfer_hashes):
+        events[index] = events[index]._replace(transferHash=transfer_hash)
+    return events
@@ -0,0 +1,65 @@
+from time import monotonic
+from typing import Optional
+
+from web3.contract import Contract
+
+from bridge.contract_validation import get_validator_proxy_contract
+
+
+class ValidatorStatus:
+    """Caches whether an address is a validator of the home bridge
+
+    The validator proxy contract only changes its validator set when a new
+    epoch gets finalized on the home chain. The status is therefore cached and
+    only requested again once it is older than `max_age` seconds, or after it
+    got invalidated. The validator proxy contract the home bridge points to can
+    not change and is looked up only once.
+    """
+
+    def __init__(
+        self, home_bridge_contract: Contract, address: bytes, max_age: float = 0.0
+    ) -> None:
+        if max_age < 0:
+            raise ValueError(
+                "Can not cache the validator status with a negative maximum age!"
+            )
+
+        self.home_bridge_contract = home_bridge_contract
+        self.address = address
+        self.max_age = max_age
+        self.validator_proxy_contract: Optional[Contract] = None
+        self.is_validator: Optional[bool] = None
+        self.updated_at = 0.0
+
+    @property
+    def age(self) -> float:
+        """Number of seconds since the cached status has been updated"""
+        if self.is_validator is None:
+            return float("inf")
+
+        return monotonic() - self.updated_at
+
+    def invalidate(self) -> None:
+        """Request the status again the next time it is needed"""
+        self.is_validator = None
+
+    def refresh(self) -> bool:
+        """Request the current status from the validator proxy contract"""
+        if self.validator_proxy_contract is None:
+            self.validator_proxy_contract = get_validator_proxy_contract(
+                self.home_bridge_contract
+            )
+
+        self.is_validator = self.validator_proxy_contract.functions.isValidator(
+            self.address
+        ).call()
+        self.updated_at = monotonic()
+        assert self.is_validator is not None
+        return self.is_validator
+
+    def check(self) -> bool:
+        """Check if the address is a validator, refreshed if the cache is too old"""
+        if self.is_validator is None or self.age > self.max_age:
+            return self.refresh()
+
+        return self.is_validator
@@ -3,5 +3,10 @@ from setuptools import find_packages, setup
 setup(
     name="tlbc-bridge",
     packages=find_packages(),
-    entry_points={"console_scripts": ["tlbc-bridge=bridge.main:main"]},
+    entry_points={
+        "console_scripts": [
+            "tlbc-bridge=bridge.main:main",
+            "tlbc-bridge-replay=bridge.replay:main",
+        ]
+    },
 )
@@ -0,0 +1,98 @@
+import pytest
+from requests.exceptions import ReadTimeout
+
+from bridge.block_range_controller import BlockRangeController, is_range_too_large_error
+
+
+@pytest.fixture
+def controller():
+    """A block range controller starting with a small range"""
+    return BlockRangeController(initial_size=10, max_size=100, sparse_event_count=5)
+
+
+def test_instantiate_controller_with_max_size_below_initial_size():
+    with pytest.raises(ValueError):
+        BlockRangeController(initial_size=10, max_size=5)
+
+
+def test_controller_grows_on_sparse_ranges(controller):
+    controller.record_success(10, 0)
+    assert controller.size == 20
+
+
+def test_controller_does_not_grow_beyond_max_size(controller):
+    for _ in range(10):
+        controller.record_success(controller.size, 0)
+    assert controller.size == 100
+
+
+def test_controller_does_not_grow_on_dense_ranges(controller):
+    controller.record_success(10, 5)
+    assert controller.size == 10
+
+
+def test_controller_does_not_grow_on_partial_ranges(controller):
+    controller.record_success(3, 0)
+    assert controller.size == 10
+
+
+def test_controller_bisects_on_failure(controller):
+    controller.record_failure(10)
+    assert controller.size == 5
+
+
+def test_controller_does_not_shrink_below_one_block(controller):
+    for _ in range(10):
+        controller.record_failure(controller.size)
+    assert controller.size == 1
+
+
+def test_controller_does_not_shrink_on_failure_of_small_range(controller):
+    controller.record_failure(30)
+    assert controller.size == 10
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ValueError(
+            {"code": -32005, "message": "query returned more than 10000 results"}
+        ),
+        ValueError({"code": -32000, "message": "Request timed out"}),
+        ValueError({"code": -32000, "message": "block range is too wide"}),
+        ValueError({"code": -32602, "message": "Log response size exceeded."}),
+        ReadTimeout(),
+    ],
+)
+def test_is_range_too_large_error(error):
+    assert is_range_too_large_error(error)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ValueError({"code": -32601, "message": "Method not found"}),
+        ValueError({"code": -32005, "message": "Too many requests"}),
+        ValueError({"code": -32005, "message": "daily request limit exceeded"}),
+        ValueError("Can not fetch events for blocks past the current head!"),
+        KeyError("foo"),
+    ],
+)
+def test_is_not_range_too_large_error(error):
+    assert not is_range_too_large_error(error)
+
+
+def test_controller_does_not_grow_to_failed_size_immediately(controller):
+    controller.record_failure(10)
+    controller.record_success(5, 0)
+    assert controller.size == 9
+
+
+def test_controller_retries_failed_size_after_successes():
+    controller = BlockRangeController(
+        initial_size=10, max_size=100, successes_until_retrying_failed_size=3
+    )
+    controller.record_failure(10)
+    for _ in range(3):
+        controller.record_success(controller.size, 0)
+    assert controller.size > 10
@@ -0,0 +1,232 @@
+import pytest
+
+from bridge.checkpoint_store import CheckpointStore
+from bridge.constants import TRANSFER_EVENT_NAME
+from bridge.events import ChainEvent
+from bridge.transfer_recorder import TransferRecorder, TransferState
+
+CONTRACT_ADDRESS = b"\x11" * 20
+OTHER_CONTRACT_ADDRESS = b"\x22" * 20
+VALIDATOR_ADDRESS = b"\x33" * 20
+OTHER_VALIDATOR_ADDRESS = b"\x44" * 20
+
+
+@pytest.fixture
+def checkpoint_database_path(tmp_path):
+    """Path to a fresh checkpoint database"""
+    return str(tmp_path / "checkpoints.db")
+
+
+@pytest.fixture
+def checkpoint_store(checkpoint_database_path):
+    """A checkpoint store using a fresh database"""
+    store = CheckpointStore(checkpoint_database_path)
+    yield store
+    store.close()
+
+
+def test_load_missing_checkpoint(checkpoint_store):
+    assert checkpoint_store.load(CONTRACT_ADDRESS) is None
+
+
+def test_store_and_load_checkpoint(checkpoint_store):
+    checkpoint_store.store(CONTRACT_ADDRESS, 10)
+    assert checkpoint_store.load(CONTRACT_ADDRESS) == 10
+    assert checkpoint_store.load(OTHER_CONTRACT_ADDRESS) is None
+
+
+def test_overwrite_checkpoint(checkpoint_store):
+    checkpoint_store.store(CONTRACT_ADDRESS, 10)
+    checkpoint_store.store(CONTRACT_ADDRESS, 20)
+    assert checkpoint_store.load(CONTRACT_ADDRESS) == 20
+
+
+def test_checkpoint_persists(checkpoint_database_path):
+    checkpoint_store = CheckpointStore(checkpoint_database_path)
+    checkpoint_store.store(CONTRACT_ADDRESS, 10)
+    checkpoint_store.close()
+
+    reopened_checkpoint_store = CheckpointStore(checkpoint_database_path)
+    assert reopened_checkpoint_store.load(CONTRACT_ADDRESS) == 10
+    reopened_checkpoint_store.close()
+
+
+def make_transfer_state(
+    transfer_hash, block_number=None, confirmation_block_number=None
+):
+    transfer_state = TransferState()
+    if block_number is not None:
+        transfer_state.transfer_event = ChainEvent(
+            event=TRANSFER_EVENT_NAME,
+            transactionHash=b"\x33" * 32,
+            logIndex=1,
+            blockNumber=block_number,
+            value=2 ** 200,
+            sender="0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf",
+            transferHash=transfer_hash,
+        )
+    transfer_state.confirmation_block_number = confirmation_block_number
+    return transfer_state
+
+
+def test_store_and_load_snapshot(checkpoint_store):
+    transfer_states = {
+        transfer_state.transfer_event.transferHash: transfer_state
+        for transfer_state in [
+            make_transfer_state(b"\x01" * 32, block_number=5),
+            make_transfer_state(b"\x02" * 32, block_number=6),
+        ]
+    }
+    transfer_states[b"\x03" * 32] = make_transfer_state(
+        b"\x03" * 32, confirmation_block_number=15
+    )
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10, OTHER_CONTRACT_ADDRESS: 20},
+        transfer_states={VALIDATOR_ADDRESS: transfer_states},
+    )
+
+    assert checkpoint_store.load(CONTRACT_ADDRESS) == 10
+    assert checkpoint_store.load(OTHER_CONTRACT_ADDRESS) == 20
+
+    loaded_transfer_states = checkpoint_store.load_transfer_states(VALIDATOR_ADDRESS)
+    assert loaded_transfer_states.keys() == transfer_states.keys()
+    for transfer_hash, transfer_state in transfer_states.items():
+        loaded_transfer_state = loaded_transfer_states[transfer_hash]
+        for attribute in TransferState.__slots__:
+            assert getattr(loaded_transfer_state, attribute) == getattr(
+                transfer_state, attribute
+            )
+
+
+def test_snapshot_updates_previous_snapshot(checkpoint_store):
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10},
+        transfer_states={
+            VALIDATOR_ADDRESS: {
+                b"\x01" * 32: make_transfer_state(b"\x01" * 32, block_number=5),
+                b"\x02" * 32: make_transfer_state(b"\x02" * 32, block_number=6),
+            }
+        },
+    )
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 20},
+        transfer_states={
+            VALIDATOR_ADDRESS: {
+                b"\x01" * 32: None,
+                b"\x02"
+                * 32: make_transfer_state(
+                    b"\x02" * 32, block_number=6, confirmation_block_number=15
+                ),
+            }
+        },
+    )
+
+    assert checkpoint_store.load(CONTRACT_ADDRESS) == 20
+    loaded_transfer_states = checkpoint_store.load_transfer_states(VALIDATOR_ADDRESS)
+    assert list(loaded_transfer_states.keys()) == [b"\x02" * 32]
+    assert loaded_transfer_states[b"\x02" * 32].confirmation_block_number == 15
+
+
+def test_snapshot_keeps_unchanged_transfer_states(checkpoint_store):
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10},
+        transfer_states={
+            VALIDATOR_ADDRESS: {
+                b"\x01" * 32: make_transfer_state(b"\x01" * 32, block_number=5)
+            }
+        },
+    )
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 20}, transfer_states={VALIDATOR_ADDRESS: {}}
+    )
+
+    assert len(checkpoint_store.load_transfer_states(VALIDATOR_ADDRESS)) == 1
+
+
+def test_snapshot_keeps_transfer_states_of_validators_apart(checkpoint_store):
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10},
+        transfer_states={
+            VALIDATOR_ADDRESS: {
+                b"\x01" * 32: make_transfer_state(b"\x01" * 32, block_number=5)
+            },
+            OTHER_VALIDATOR_ADDRESS: {
+                b"\x01" * 32: make_transfer_state(b"\x01" * 32, block_number=5),
+                b"\x02" * 32: make_transfer_state(b"\x02" * 32, block_number=6),
+            },
+        },
+    )
+
+    assert len(checkpoint_store.load_transfer_states(VALIDATOR_ADDRESS)) == 1
+    assert len(checkpoint_store.load_transfer_states(OTHER_VALIDATOR_ADDRESS)) == 2
+
+
+def test_forget_unrestorable_snapshots_keeps_complete_snapshots(checkpoint_store):
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10},
+        transfer_states={
+            VALIDATOR_ADDRESS: {
+                b"\x01" * 32: make_transfer_state(b"\x01" * 32, block_number=5)
+            },
+            OTHER_VALIDATOR_ADDRESS: {},
+        },
+    )
+
+    assert not checkpoint_store.forget_unrestorable_snapshots(
+        [VALIDATOR_ADDRESS, OTHER_VALIDATOR_ADDRESS]
+    )
+    assert checkpoint_store.load(CONTRACT_ADDRESS) == 10
+    assert len(checkpoint_store.load_transfer_states(VALIDATOR_ADDRESS)) == 1
+
+
+def test_forget_unrestorable_snapshots_of_new_validator(checkpoint_store):
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10},
+        transfer_states={
+            VALIDATOR_ADDRESS: {
+                b"\x01" * 32: make_transfer_state(b"\x01" * 32, block_number=5)
+            }
+        },
+    )
+
+    assert checkpoint_store.forget_unrestorable_snapshots(
+        [VALIDATOR_ADDRESS, OTHER_VALIDATOR_ADDRESS]
+    )
+    assert checkpoint_store.load(CONTRACT_ADDRESS) is None
+    assert checkpoint_store.load_transfer_states(VALIDATOR_ADDRESS) == {}
+    assert checkpoint_store.forget_unrestorable_snapshots([VALIDATOR_ADDRESS]) is False
+
+
+def test_forget_snapshots_of_removed_validator(checkpoint_store):
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10},
+        transfer_states={
+            VALIDATOR_ADDRESS: {},
+            OTHER_VALIDATOR_ADDRESS: {
+                b"\x01" * 32: make_transfer_state(b"\x01" * 32, block_number=5)
+            },
+        },
+    )
+
+    assert not checkpoint_store.forget_unrestorable_snapshots([VALIDATOR_ADDRESS])
+    assert checkpoint_store.load(CONTRACT_ADDRESS) == 10
+    assert checkpoint_store.load_transfer_states(OTHER_VALIDATOR_ADDRESS) == {}
+    assert checkpoint_store.forget_unrestorable_snapshots([OTHER_VALIDATOR_ADDRESS])
+
+
+def test_snapshot_schedules_unconfirmed_transfers_again(checkpoint_store):
+    recorder = TransferRecorder()
+    transfer_state = make_transfer_state(b"\x01" * 32, block_number=5)
+    recorder.apply_proper_event(transfer_state.transfer_event)
+    assert len(recorder.pull_transfers_to_confirm()) == 1
+
+    checkpoint_store.store_snapshot(
+        checkpoints={CONTRACT_ADDRESS: 10},
+        transfer_states={VALIDATOR_ADDRESS: recorder.pop_changed_transfer_states()},
+    )
+
+    restored_recorder = TransferRecorder()
+    restored_recorder.restore(checkpoint_store.load_transfer_states(VALIDATOR_ADDRESS))
+    assert restored_recorder.pull_transfers_to_confirm() == [
+        transfer_state.transfer_event
+    ]
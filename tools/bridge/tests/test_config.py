@@ -2,10 +2,15 @@ import pytest
 from toolz import dissoc
 
 from bridge.config import (
+    validate_boolean,
     validate_checksum_address,
     validate_config,
+    validate_confirmation_task_order,
     validate_non_negative_integer,
+    validate_optional_port,
     validate_positive_float,
+    validate_positive_integer,
+    validate_private_keys,
     validate_rpc_url,
 )
 
@@ -55,6 +60,15 @@ def test_validate_non_negative_integer_negative():
         validate_non_negative_integer(-1)
 
 
+def test_validate_positive_integer():
+    validate_positive_integer(1)
+
+
+def test_validate_positive_integer_zero():
+    with pytest.raises(ValueError):
+        validate_positive_integer(0)
+
+
 def test_validate_positive_float():
     validate_positive_float(1.1)
 
@@ -73,6 +87,47 @@ def test_validate_positive_float_negative():
         validate_positive_float(-1.1)
 
 
+@pytest.mark.parametrize(
+    "value, expected", [(True, True), (False, False), ("true", True), ("False", False)]
+)
+def test_validate_boolean(value, expected):
+    assert validate_boolean(value) is expected
+
+
+def test_validate_boolean_invalid():
+    with pytest.raises(ValueError):
+        validate_boolean("yes")
+
+
+def test_validate_confirmation_task_order():
+    assert validate_confirmation_task_order("largest_value") == "largest_value"
+    with pytest.raises(ValueError):
+        validate_confirmation_task_order("newest")
+
+
+def test_validate_optional_port():
+    assert validate_optional_port(None) is None
+    assert validate_optional_port("9100") == 9100
+    with pytest.raises(ValueError):
+        validate_optional_port(70000)
+
+
+def test_validate_private_keys():
+    private_keys = ["0x" + "01" * 32, "0x" + "02" * 32]
+    assert validate_private_keys(private_keys[0]) == [b"\x01" * 32]
+    assert validate_private_keys(", ".join(private_keys)) == [
+        b"\x01" * 32,
+        b"\x02" * 32,
+    ]
+    assert validate_private_keys(private_keys) == [b"\x01" * 32, b"\x02" * 32]
+
+
+@pytest.mark.parametrize("private_keys", [[], ["0x" + "01" * 32] * 2, "0x01"])
+def test_validate_private_keys_invalid(private_keys):
+    with pytest.raises(ValueError):
+        validate_private_keys(private_keys)
+
+
 def test_validate_address():
     validate_checksum_address("0x4B0b6E093a330c00fE614B804Ad59e9b0A4FE8A9")
 
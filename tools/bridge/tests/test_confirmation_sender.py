@@ -4,11 +4,10 @@ import rlp
 from eth.vm.forks.spurious_dragon.transactions import SpuriousDragonTransaction
 from eth_utils import decode_hex, keccak
 from gevent.queue import Queue
-from hexbytes import HexBytes
-from web3.datastructures import AttributeDict
 
-from bridge.confirmation_sender import ConfirmationSender
-from bridge.constants import HOME_CHAIN_STEP_DURATION
+from bridge.confirmation_sender import ConfirmationSender, PendingTransaction
+from bridge.constants import HOME_CHAIN_STEP_DURATION, TRANSFER_EVENT_NAME
+from bridge.events import ChainEvent
 from bridge.utils import compute_transfer_hash
 
 
@@ -71,27 +70,15 @@ def confirmation_sender_with_non_validator_account(
 @pytest.fixture
 def transfer_event():
     """An exemplary transfer event."""
-    return AttributeDict(
-        {
-            "args": AttributeDict(
-                {
-                    "from": "0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf",
-                    "to": "0x2946259E0334f33A064106302415aD3391BeD384",
-                    "value": 1,
-                }
-            ),
-            "event": "Transfer",
-            "logIndex": 5,
-            "transactionIndex": 10,
-            "transactionHash": HexBytes(
-                "0x66ba278660204ddd43f350e9110a8339fd32a227354429744456aac63ff9ef6f"
-            ),
-            "address": "0xF2E246BB76DF876Cef8b38ae84130F4F55De395b",
-            "blockHash": HexBytes(
-                "0x0e9226f0b8eb7b1c0b1652b8c8ce81b1790927bdaa692223ec2fb746e21063f8"
-            ),
-            "blockNumber": 3,
-        }
+    return ChainEvent(
+        event=TRANSFER_EVENT_NAME,
+        transactionHash=decode_hex(
+            "0x66ba278660204ddd43f350e9110a8339fd32a227354429744456aac63ff9ef6f"
+        ),
+        logIndex=5,
+        blockNumber=3,
+        value=1,
+        sender="0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf",
     )
 
 
@@ -106,6 +93,7 @@ def test_transfer_hash_computation(confirmation_sender, transfer_event):
 
 def test_transaction_preparation(
     confirmation_sender,
+    w3_home,
     validator_address,
     gas_price,
     home_bridge_contract,
@@ -121,7 +109,9 @@ def test_transaction_preparation(
     assert transaction.to == decode_hex(home_bridge_contract.address)
     assert transaction.gas_price == gas_price
     assert transaction.value == 0
-    assert transaction.nonce == confirmation_sender.get_next_nonce()
+    assert transaction.nonce == w3_home.eth.getTransactionCount(
+        validator_address, "pending"
+    )
 
 
 def test_transaction_sending(
@@ -133,8 +123,10 @@ def test_transaction_sending(
     validator_address,
 ):
     transaction = confirmation_sender.prepare_confirmation_transaction(transfer_event)
-    confirmation_sender.send_confirmation_transaction(transaction)
-    assert transaction == confirmation_sender.pending_transaction_queue.peek()
+    confirmation_sender.send_confirmation_transaction(transaction, transfer_event)
+    pending_transaction = confirmation_sender.pending_transactions[transaction.nonce]
+    assert pending_transaction.transaction == transaction
+    assert pending_transaction.transfer_event == transfer_event
     tester_home.mine_block()
     receipt = w3_home.eth.getTransactionReceipt(transaction.hash)
     assert receipt is not None
@@ -145,20 +137,35 @@ def test_transaction_sending(
     event_args = events[0].args
     assert event_args.transferHash == compute_transfer_hash(transfer_event)
     assert event_args.transactionHash == transfer_event.transactionHash
-    assert event_args.amount == transfer_event.args.value
-    assert event_args.recipient == transfer_event.args["from"]
+    assert event_args.amount == transfer_event.value
+    assert event_args.recipient == transfer_event.sender
     assert event_args.validator == validator_address
 
 
+def test_invalid_max_concurrent_sends(
+    transfer_queue, home_bridge_contract, validator_key, max_reorg_depth, gas_price
+):
+    with pytest.raises(ValueError):
+        ConfirmationSender(
+            transfer_event_queue=transfer_queue,
+            home_bridge_contract=home_bridge_contract,
+            private_key=validator_key.to_bytes(),
+            gas_price=gas_price,
+            max_reorg_depth=max_reorg_depth,
+            max_concurrent_sends=0,
+        )
+
+
 def test_transfers_are_handled(
     confirmation_sender, w3_home, tester_home, transfer_queue, transfer_event, spawn
 ):
     spawn(confirmation_sender.run)
-    assert confirmation_sender.pending_transaction_queue.empty()
+    assert not confirmation_sender.pending_transactions
     transfer_queue.put(transfer_event)
     gevent.sleep(0.1)
-    assert confirmation_sender.pending_transaction_queue.qsize() == 1
-    transaction = confirmation_sender.pending_transaction_queue.peek()
+    assert len(confirmation_sender.pending_transactions) == 1
+    (pending_transaction,) = confirmation_sender.pending_transactions.values()
+    transaction = pending_transaction.transaction
     tester_home.mine_block()
     assert w3_home.eth.getTransactionReceipt(transaction.hash) is not None
 
@@ -172,20 +179,20 @@ def test_pending_transfers_are_cleared(
     spawn,
 ):
     spawn(confirmation_sender.run)
-    assert confirmation_sender.pending_transaction_queue.empty()
+    assert not confirmation_sender.pending_transactions
     transfer_queue.put(transfer_event)
     gevent.sleep(0.1)
-    assert confirmation_sender.pending_transaction_queue.qsize() == 1
+    assert len(confirmation_sender.pending_transactions) == 1
     tester_home.mine_block()
     gevent.sleep(
         1.5 * HOME_CHAIN_STEP_DURATION
     )  # wait until they have a chance to check
     assert (
-        confirmation_sender.pending_transaction_queue.qsize() == 1
+        len(confirmation_sender.pending_transactions) == 1
     )  # not confirmed enough yet
     tester_home.mine_blocks(max_reorg_depth - 1)
     gevent.sleep(1.5 * HOME_CHAIN_STEP_DURATION)
-    assert confirmation_sender.pending_transaction_queue.qsize() == 0
+    assert len(confirmation_sender.pending_transactions) == 0
 
 
 def test_do_not_confirm_as_non_bridge_validator(
@@ -200,13 +207,74 @@ def test_do_not_confirm_as_non_bridge_validator(
 
     spawn(confirmation_sender_with_non_validator_account.run)
 
-    assert (
-        confirmation_sender_with_non_validator_account.pending_transaction_queue.empty()
-    )
+    assert not confirmation_sender_with_non_validator_account.pending_transactions
 
     transfer_queue.put(transfer_event)
     gevent.sleep(0.1)
 
-    assert (
-        confirmation_sender_with_non_validator_account.pending_transaction_queue.empty()
+    assert not confirmation_sender_with_non_validator_account.pending_transactions
+
+
+def test_concurrently_sent_transactions_have_consecutive_nonces(
+    confirmation_sender,
+    w3_home,
+    tester_home,
+    transfer_queue,
+    transfer_event,
+    validator_address,
+    spawn,
+):
+    start_nonce = w3_home.eth.getTransactionCount(validator_address, "pending")
+    spawn(confirmation_sender.run)
+    for log_index in range(25):
+        transfer_queue.put(transfer_event._replace(logIndex=log_index))
+    gevent.sleep(0.5)
+
+    assert len(confirmation_sender.pending_transactions) == 25
+    assert w3_home.eth.getTransactionCount(validator_address, "pending") == (
+        start_nonce + 25
+    )
+    tester_home.mine_block()
+    for pending_transaction in confirmation_sender.pending_transactions.values():
+        assert (
+            w3_home.eth.getTransactionReceipt(pending_transaction.transaction.hash)
+            is not None
+        )
+
+
+def test_dropped_transactions_are_sent_again(
+    confirmation_sender, w3_home, tester_home, transfer_event
+):
+    # never sent, so the node does not know the transaction like a dropped one
+    transaction = confirmation_sender.prepare_confirmation_transaction(transfer_event)
+    confirmation_sender.track_transaction(
+        PendingTransaction(transaction, transfer_event)
     )
+
+    confirmation_sender.clear_confirmed_transactions()
+    tester_home.mine_block()
+    assert w3_home.eth.getTransactionReceipt(transaction.hash) is not None
+    assert transaction.nonce in confirmation_sender.pending_transactions
+
+
+def test_replaced_transactions_are_confirmed_again(
+    confirmation_sender, transfer_queue, transfer_event
+):
+    transaction = confirmation_sender.prepare_confirmation_transaction(transfer_event)
+    confirmation_sender.track_transaction(
+        PendingTransaction(transaction, transfer_event)
+    )
+    confirmation_sender.nonce_manager.reset()
+
+    other_transfer_event = transfer_event._replace(logIndex=6)
+    other_transaction = confirmation_sender.prepare_confirmation_transaction(
+        other_transfer_event
+    )
+    assert other_transaction.nonce == transaction.nonce
+    confirmation_sender.send_confirmation_transaction(
+        other_transaction, other_transfer_event
+    )
+
+    pending_transaction = confirmation_sender.pending_transactions[transaction.nonce]
+    assert pending_transaction.transaction == other_transaction
+    assert transfer_queue.get_nowait() == transfer_event
@@ -3,15 +3,26 @@ from itertools import count
 import pytest
 from eth_typing import Hash32
 from eth_utils import int_to_big_endian
-from hexbytes import HexBytes
-from web3.datastructures import AttributeDict
+from gevent.queue import Queue
+from prometheus_client import REGISTRY
 
-from bridge.confirmation_task_planner import TransferRecorder
+from bridge.confirmation_task_planner import (
+    ConfirmationTaskPlanner,
+    TransferRecorder,
+    get_available_events,
+)
 from bridge.constants import (
     COMPLETION_EVENT_NAME,
     CONFIRMATION_EVENT_NAME,
     TRANSFER_EVENT_NAME,
 )
+from bridge.event_fetcher import (
+    FetcherProgressEvent,
+    FetcherReachedHeadEvent,
+    FetcherReorgEvent,
+)
+from bridge.events import ChainEvent
+from bridge.head_tracker import HeadTracker
 from bridge.utils import compute_transfer_hash
 
 
@@ -27,26 +38,27 @@ def transfer_hash(hashes):
     return next(hashes)
 
 
-def get_transfer_event(transaction_hash: Hash32) -> AttributeDict:
-    return AttributeDict(
-        {
-            "event": TRANSFER_EVENT_NAME,
-            "transactionHash": HexBytes(transaction_hash),
-            "logIndex": 0,
-        }
+def get_transfer_event(transaction_hash: Hash32, block_number: int = 0) -> ChainEvent:
+    return ChainEvent(
+        event=TRANSFER_EVENT_NAME,
+        transactionHash=transaction_hash,
+        logIndex=0,
+        blockNumber=block_number,
     )
 
 
 def get_transfer_hash_event(
-    event_name: str, transfer_hash: Hash32, transaction_hash: Hash32
-) -> AttributeDict:
-    return AttributeDict(
-        {
-            "event": event_name,
-            "transactionHash": HexBytes(transaction_hash),
-            "logIndex": 0,
-            "args": AttributeDict({"transferHash": HexBytes(transfer_hash)}),
-        }
+    event_name: str,
+    transfer_hash: Hash32,
+    transaction_hash: Hash32,
+    block_number: int = 0,
+) -> ChainEvent:
+    return ChainEvent(
+        event=event_name,
+        transactionHash=transaction_hash,
+        logIndex=0,
+        blockNumber=block_number,
+        transferHash=transfer_hash,
     )
 
 
@@ -105,6 +117,12 @@ def test_recorder_plans_transfers(recorder, transfer_event):
     assert recorder.pull_transfers_to_confirm() == [transfer_event]
 
 
+def test_recorder_applies_events_in_batch(recorder, transfer_events):
+    events = [next(transfer_events) for _ in range(3)]
+    recorder.apply_events(events)
+    assert recorder.pull_transfers_to_confirm() == events
+
+
 def test_recorder_does_not_plan_transfers_twice(recorder, transfer_event):
     recorder.apply_proper_event(transfer_event)
     assert recorder.pull_transfers_to_confirm() == [transfer_event]
@@ -133,3 +151,635 @@ def test_recorder_does_not_plan_completed_transfer(recorder, transfer_hash, hash
     recorder.apply_proper_event(transfer_event)
     recorder.apply_proper_event(completion_event)
     assert len(recorder.pull_transfers_to_confirm()) == 0
+
+
+def get_cleared_transfer_events(hashes, transfer_block_number, home_block_number):
+    transfer_event = get_transfer_event(
+        next(hashes), block_number=transfer_block_number
+    )
+    transfer_hash = compute_transfer_hash(transfer_event)
+    return [
+        transfer_event,
+        get_transfer_hash_event(
+            CONFIRMATION_EVENT_NAME,
+            transfer_hash,
+            next(hashes),
+            block_number=home_block_number,
+        ),
+        get_transfer_hash_event(
+            COMPLETION_EVENT_NAME,
+            transfer_hash,
+            next(hashes),
+            block_number=home_block_number,
+        ),
+    ]
+
+
+def test_recorder_does_not_plan_reverted_transfer(recorder, hashes):
+    recorder.apply_proper_event(get_transfer_event(next(hashes), block_number=5))
+    recorder.revert_transfer_events(5)
+    assert len(recorder.pull_transfers_to_confirm()) == 0
+
+
+def test_recorder_keeps_transfer_before_reverted_block(recorder, hashes):
+    transfer_event = get_transfer_event(next(hashes), block_number=5)
+    recorder.apply_proper_event(transfer_event)
+    recorder.revert_transfer_events(6)
+    assert recorder.pull_transfers_to_confirm() == [transfer_event]
+
+
+def test_recorder_plans_transfer_with_reverted_confirmation(recorder, hashes):
+    transfer_event = get_transfer_event(next(hashes))
+    recorder.apply_proper_event(transfer_event)
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            CONFIRMATION_EVENT_NAME,
+            compute_transfer_hash(transfer_event),
+            next(hashes),
+            block_number=15,
+        )
+    )
+    recorder.revert_home_bridge_events(15)
+    assert recorder.pull_transfers_to_confirm() == [transfer_event]
+
+
+def test_recorder_plans_transfers_once_final(recorder, hashes):
+    transfer_event = get_transfer_event(next(hashes), block_number=5)
+    recorder.apply_proper_event(transfer_event)
+    assert len(recorder.pull_transfers_to_confirm(4, None)) == 0
+    assert recorder.pull_transfers_to_confirm(5, None) == [transfer_event]
+
+
+def test_recorder_does_not_clear_transfers_before_final(recorder, hashes):
+    for event in get_cleared_transfer_events(hashes, 5, 15):
+        recorder.apply_proper_event(event)
+
+    recorder.clear_transfers(10, 14)
+    assert len(recorder.transfer_states) == 1
+
+    recorder.clear_transfers(10, 15)
+    assert len(recorder.transfer_states) == 0
+
+
+def test_recorder_plans_transfers_in_order(recorder, transfer_events):
+    events = [next(transfer_events) for _ in range(3)]
+    for event in events:
+        recorder.apply_proper_event(event)
+    assert recorder.pull_transfers_to_confirm() == events
+    assert len(recorder.ready_hashes) == 0
+
+
+def test_recorder_does_not_plan_transfer_applied_twice(recorder, transfer_event):
+    recorder.apply_proper_event(transfer_event)
+    recorder.apply_proper_event(transfer_event)
+    assert recorder.pull_transfers_to_confirm() == [transfer_event]
+
+
+def test_recorder_keeps_unfinalized_transfers_queued(recorder, hashes):
+    recorder.apply_proper_event(get_transfer_event(next(hashes), block_number=5))
+    recorder.pull_transfers_to_confirm(4, None)
+    assert len(recorder.unfinal_transfers) == 1
+
+
+def test_recorder_plans_waiting_transfers_once_final(recorder, hashes):
+    transfer_events = [
+        get_transfer_event(next(hashes), block_number=block_number)
+        for block_number in (7, 5, 6)
+    ]
+    for transfer_event in transfer_events:
+        recorder.apply_proper_event(transfer_event)
+
+    assert recorder.pull_transfers_to_confirm(4, None) == []
+    assert recorder.pull_transfers_to_confirm(5, None) == [transfer_events[1]]
+    assert recorder.pull_transfers_to_confirm(7, None) == [
+        transfer_events[2],
+        transfer_events[0],
+    ]
+    assert len(recorder.unfinal_transfers) == 0
+
+
+def test_recorder_plans_waiting_transfers_once_checked(recorder, hashes):
+    transfer_events = [
+        get_transfer_event(next(hashes), block_number=block_number)
+        for block_number in (7, 5, 6)
+    ]
+    for transfer_event in transfer_events:
+        recorder.apply_proper_event(
+            transfer_event, home_chain_check_block_number=transfer_event.blockNumber
+        )
+
+    assert recorder.pull_transfers_to_confirm(5, None, 4) == []
+    assert len(recorder.unchecked_transfers) == 1
+    assert recorder.pull_transfers_to_confirm(6, None, 5) == [transfer_events[1]]
+    assert recorder.pull_transfers_to_confirm(7, None, 7) == [
+        transfer_events[2],
+        transfer_events[0],
+    ]
+    assert len(recorder.unfinal_transfers) == 0
+    assert len(recorder.unchecked_transfers) == 0
+
+
+def test_recorder_lets_transfers_seen_again_wait_again(recorder, hashes):
+    transaction_hash = next(hashes)
+    recorder.apply_proper_event(get_transfer_event(transaction_hash, block_number=5))
+    recorder.pull_transfers_to_confirm(4, None)
+    recorder.revert_transfer_events(5)
+    transfer_event = get_transfer_event(transaction_hash, block_number=8)
+    recorder.apply_proper_event(transfer_event)
+
+    assert recorder.pull_transfers_to_confirm(7, None) == []
+    assert recorder.pull_transfers_to_confirm(8, None) == [transfer_event]
+
+
+def test_recorder_clears_resolved_transfers(recorder, hashes):
+    for event in get_cleared_transfer_events(hashes, 5, 15):
+        recorder.apply_proper_event(event)
+
+    recorder.clear_transfers()
+    assert len(recorder.transfer_states) == 0
+    assert len(recorder.resolved_hashes) == 0
+
+
+def test_recorder_clears_transfers_completed_without_own_confirmation(recorder, hashes):
+    transfer_event = get_transfer_event(next(hashes), block_number=5)
+    recorder.apply_proper_event(transfer_event)
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            COMPLETION_EVENT_NAME,
+            compute_transfer_hash(transfer_event),
+            next(hashes),
+            block_number=15,
+        )
+    )
+
+    recorder.clear_transfers(4, 20)
+    assert len(recorder.transfer_states) == 1
+    recorder.clear_transfers(5, 20)
+    assert len(recorder.transfer_states) == 0
+    assert len(recorder.resolved_hashes) == 0
+
+
+def test_recorder_evicts_old_orphans(hashes):
+    recorder = TransferRecorder(orphan_max_age=10)
+    for block_number in (5, 15):
+        recorder.apply_proper_event(
+            get_transfer_hash_event(
+                COMPLETION_EVENT_NAME,
+                next(hashes),
+                next(hashes),
+                block_number=block_number,
+            ),
+            foreign_chain_check_block_number=100,
+        )
+
+    assert recorder.evict_orphans(20, 100) == 1
+    assert len(recorder.transfer_states) == 1
+
+
+def test_recorder_does_not_evict_orphans_before_foreign_chain_is_checked(hashes):
+    recorder = TransferRecorder(orphan_max_age=10)
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            COMPLETION_EVENT_NAME, next(hashes), next(hashes), block_number=5
+        ),
+        foreign_chain_check_block_number=100,
+    )
+
+    # the foreign chain event fetcher lags behind, the transfer event may come
+    assert recorder.evict_orphans(1_000, 99) == 0
+    assert recorder.evict_orphans(1_000, None) == 0
+    assert recorder.evict_orphans(1_000, 100) == 1
+
+
+def test_recorder_does_not_evict_orphans_without_foreign_chain_check(hashes):
+    recorder = TransferRecorder(orphan_max_age=10)
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            COMPLETION_EVENT_NAME, next(hashes), next(hashes), block_number=5
+        )
+    )
+    assert recorder.evict_orphans(1_000, 1_000) == 0
+
+
+def test_recorder_does_not_evict_transfers_seen_on_both_chains(hashes):
+    recorder = TransferRecorder(orphan_max_age=10)
+    transfer_event = get_transfer_event(next(hashes))
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            CONFIRMATION_EVENT_NAME,
+            compute_transfer_hash(transfer_event),
+            next(hashes),
+            block_number=5,
+        )
+    )
+    recorder.apply_proper_event(transfer_event)
+
+    assert recorder.evict_orphans(20, 1_000) == 0
+    assert len(recorder.transfer_states) == 1
+
+
+def test_recorder_without_orphan_max_age_does_not_evict(recorder, hashes):
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            COMPLETION_EVENT_NAME, next(hashes), next(hashes), block_number=5
+        )
+    )
+    assert recorder.evict_orphans(1_000_000, 1_000_000) == 0
+
+
+def test_recorder_restores_transfer_states(recorder, transfer_event):
+    recorder.apply_proper_event(transfer_event)
+
+    restored_recorder = TransferRecorder()
+    restored_recorder.restore(recorder.transfer_states)
+    assert restored_recorder.pull_transfers_to_confirm() == [transfer_event]
+
+
+def test_recorder_schedules_restored_unconfirmed_transfers_again(
+    recorder, transfer_event
+):
+    recorder.apply_proper_event(transfer_event)
+    recorder.pull_transfers_to_confirm()
+
+    restored_recorder = TransferRecorder()
+    restored_recorder.restore(recorder.transfer_states)
+    assert restored_recorder.pull_transfers_to_confirm() == [transfer_event]
+
+
+def test_recorder_does_not_schedule_restored_confirmed_transfers(
+    recorder, transfer_event, hashes
+):
+    recorder.apply_proper_event(transfer_event)
+    recorder.pull_transfers_to_confirm()
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            CONFIRMATION_EVENT_NAME, compute_transfer_hash(transfer_event), next(hashes)
+        )
+    )
+
+    restored_recorder = TransferRecorder()
+    restored_recorder.restore(recorder.transfer_states)
+    assert len(restored_recorder.pull_transfers_to_confirm()) == 0
+
+
+def test_recorder_pops_changed_transfer_states(recorder, transfer_event):
+    recorder.apply_proper_event(transfer_event)
+    transfer_hash = compute_transfer_hash(transfer_event)
+    assert recorder.pop_changed_transfer_states() == {
+        transfer_hash: recorder.transfer_states[transfer_hash]
+    }
+    assert recorder.pop_changed_transfer_states() == {}
+
+    recorder.revert_transfer_events(transfer_event.blockNumber)
+    assert recorder.pop_changed_transfer_states() == {transfer_hash: None}
+
+
+def test_recorder_restores_orphans(hashes):
+    recorder = TransferRecorder(orphan_max_age=10)
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            COMPLETION_EVENT_NAME, next(hashes), next(hashes), block_number=5
+        )
+    )
+
+    restored_recorder = TransferRecorder(orphan_max_age=10)
+    restored_recorder.restore(
+        recorder.transfer_states, foreign_chain_check_block_number=100
+    )
+    assert restored_recorder.evict_orphans(20, 99) == 0
+    assert restored_recorder.evict_orphans(20, 100) == 1
+
+
+def test_recorder_restores_only_once(recorder, transfer_event):
+    recorder.apply_proper_event(transfer_event)
+    with pytest.raises(ValueError):
+        recorder.restore(recorder.transfer_states)
+
+
+@pytest.fixture
+def planner():
+    """A confirmation task planner with fresh queues."""
+    return ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+    )
+
+
+def test_planner_reverts_events_after_restored_checkpoints(planner, recorder, hashes):
+    transfer_event = get_transfer_event(next(hashes), block_number=5)
+    recorder.apply_proper_event(transfer_event)
+    recorder.apply_proper_event(get_transfer_event(next(hashes), block_number=11))
+
+    planner.restore_recorder(
+        recorder.transfer_states, transfer_checkpoint=10, home_bridge_checkpoint=20
+    )
+    assert planner.recorder.pull_transfers_to_confirm() == [transfer_event]
+
+
+def test_get_available_events_drains_queue():
+    queue = Queue()
+    for item in range(3):
+        queue.put(item)
+    assert get_available_events(queue) == [0, 1, 2]
+    assert queue.empty()
+
+
+def test_planner_applies_events_between_fetcher_events(planner, hashes):
+    planner.apply_transfer_events(
+        [get_transfer_event(next(hashes), block_number=5) for _ in range(2)]
+    )
+    assert planner.transfer_events_processed_until == 4
+
+    planner.process_transfer_fetcher_event(FetcherReorgEvent(5))
+    assert planner.transfer_events_processed_until == 4
+    assert len(planner.recorder.transfer_states) == 0
+
+    planner.process_transfer_fetcher_event(FetcherReachedHeadEvent(10, 8))
+    assert planner.transfer_events_processed_until == 10
+    assert planner.transfer_events_final_until == 8
+
+
+def test_recorder_plans_transfers_once_checked(recorder, hashes):
+    transfer_event = get_transfer_event(next(hashes))
+    recorder.apply_proper_event(transfer_event, home_chain_check_block_number=20)
+    assert len(recorder.pull_transfers_to_confirm(None, None, 19)) == 0
+    assert recorder.pull_transfers_to_confirm(None, None, 20) == [transfer_event]
+
+
+def test_recorder_does_not_plan_transfers_without_check_block_number(
+    recorder, transfer_event
+):
+    recorder.apply_proper_event(transfer_event)
+    assert len(recorder.pull_transfers_to_confirm(None, None, 1000)) == 0
+    assert recorder.pull_transfers_to_confirm() == [transfer_event]
+
+
+def test_planner_schedules_checked_transfers_before_home_sync(hashes):
+    home_head_tracker = HeadTracker(web3=None)
+    home_head_tracker.update(20)
+    planner = ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+        home_head_tracker=home_head_tracker,
+    )
+    transfer_event = get_transfer_event(next(hashes), block_number=5)
+    planner.apply_transfer_events([transfer_event])
+    planner.process_transfer_fetcher_event(FetcherReachedHeadEvent(10))
+
+    planner.apply_home_bridge_events(
+        [
+            get_transfer_hash_event(
+                COMPLETION_EVENT_NAME, next(hashes), next(hashes), block_number=15
+            )
+        ]
+    )
+    assert planner.confirmation_task_queue.empty()
+
+    planner.apply_home_bridge_events(
+        [
+            get_transfer_hash_event(
+                COMPLETION_EVENT_NAME, next(hashes), next(hashes), block_number=21
+            )
+        ]
+    )
+    assert get_available_events(planner.confirmation_task_queue) == [transfer_event]
+
+
+def test_planner_schedules_transfers_during_transfer_catch_up(planner, hashes):
+    transfer_event = get_transfer_event(next(hashes), block_number=5)
+    planner.apply_transfer_events([transfer_event])
+    planner.process_transfer_fetcher_event(FetcherProgressEvent(10, 10))
+    assert planner.transfer_events_final_until == 10
+
+    planner.process_home_bridge_fetcher_event(FetcherReachedHeadEvent(20))
+    assert get_available_events(planner.confirmation_task_queue) == [transfer_event]
+
+
+def test_planner_schedules_checked_transfers_during_home_catch_up(hashes):
+    home_head_tracker = HeadTracker(web3=None)
+    home_head_tracker.update(20)
+    planner = ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+        home_head_tracker=home_head_tracker,
+    )
+    transfer_event = get_transfer_event(next(hashes), block_number=5)
+    planner.apply_transfer_events([transfer_event])
+    planner.process_transfer_fetcher_event(FetcherProgressEvent(10, 10))
+
+    planner.process_home_bridge_fetcher_event(FetcherProgressEvent(19, 19))
+    assert planner.confirmation_task_queue.empty()
+    planner.process_home_bridge_fetcher_event(FetcherProgressEvent(20, 20))
+    assert get_available_events(planner.confirmation_task_queue) == [transfer_event]
+
+
+def test_planner_checks_orphans_against_cached_foreign_head(hashes):
+    foreign_head_tracker = HeadTracker(web3=None)
+    foreign_head_tracker.update(30)
+    planner = ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+        foreign_head_tracker=foreign_head_tracker,
+    )
+    transfer_hash = next(hashes)
+    planner.apply_home_bridge_events(
+        [get_transfer_hash_event(COMPLETION_EVENT_NAME, transfer_hash, next(hashes))]
+    )
+
+    transfer_state = planner.recorder.transfer_states[transfer_hash]
+    assert transfer_state.foreign_chain_check_block_number == 30
+
+
+def test_planner_does_not_stop_if_foreign_head_is_unavailable(hashes):
+    # without a cached head, the tracker fails to request it without web3
+    planner = ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+        foreign_head_tracker=HeadTracker(web3=None),
+    )
+    transfer_hash = next(hashes)
+    planner.apply_home_bridge_events(
+        [get_transfer_hash_event(COMPLETION_EVENT_NAME, transfer_hash, next(hashes))]
+    )
+
+    transfer_state = planner.recorder.transfer_states[transfer_hash]
+    assert transfer_state.foreign_chain_check_block_number is None
+
+
+def get_transfer_event_with_value(transaction_hash, block_number, value):
+    return get_transfer_event(transaction_hash, block_number)._replace(value=value)
+
+
+@pytest.mark.parametrize(
+    "confirmation_task_order, expected_order",
+    [("oldest", [0, 1, 2]), ("largest_value", [1, 2, 0])],
+)
+def test_planner_releases_confirmation_tasks_by_priority(
+    hashes, confirmation_task_order, expected_order
+):
+    planner = ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+        confirmation_task_order=confirmation_task_order,
+    )
+    transfer_events = [
+        get_transfer_event_with_value(next(hashes), block_number, value)
+        for block_number, value in [(3, 1), (4, 30), (5, 20)]
+    ]
+    planner.apply_transfer_events(list(reversed(transfer_events)))
+    planner.process_transfer_fetcher_event(FetcherReachedHeadEvent(10))
+    planner.process_home_bridge_fetcher_event(FetcherReachedHeadEvent(10))
+
+    assert get_available_events(planner.confirmation_task_queue) == [
+        transfer_events[index] for index in expected_order
+    ]
+
+
+def test_planner_caps_released_confirmation_tasks_per_tick(hashes):
+    planner = ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+        max_confirmation_tasks_per_tick=2,
+    )
+    planner.apply_transfer_events(
+        [get_transfer_event(next(hashes), block_number=5) for _ in range(3)]
+    )
+    planner.process_transfer_fetcher_event(FetcherReachedHeadEvent(10))
+    planner.process_home_bridge_fetcher_event(FetcherReachedHeadEvent(10))
+    assert planner.confirmation_task_queue.qsize() == 2
+    assert len(planner.pending_confirmation_tasks) == 1
+
+    planner.check_for_confirmation_tasks()
+    assert planner.confirmation_task_queue.qsize() == 3
+
+
+def test_planner_drops_pending_confirmation_tasks_resolved_meanwhile(hashes):
+    planner = ConfirmationTaskPlanner(
+        sync_persistence_time=1,
+        transfer_event_queue=Queue(),
+        home_bridge_event_queue=Queue(),
+        confirmation_task_queue=Queue(),
+        max_confirmation_tasks_per_tick=1,
+    )
+    transfer_events = [
+        get_transfer_event(next(hashes), block_number=block_number)
+        for block_number in [4, 5, 6]
+    ]
+    planner.apply_transfer_events(transfer_events)
+    planner.process_transfer_fetcher_event(FetcherReachedHeadEvent(10))
+    planner.process_home_bridge_fetcher_event(FetcherReachedHeadEvent(10))
+    assert get_available_events(planner.confirmation_task_queue) == [transfer_events[0]]
+
+    planner.process_transfer_fetcher_event(FetcherReorgEvent(6))
+    planner.apply_home_bridge_events(
+        [
+            get_transfer_hash_event(
+                CONFIRMATION_EVENT_NAME,
+                compute_transfer_hash(transfer_events[1]),
+                next(hashes),
+            )
+        ]
+    )
+    planner.check_for_confirmation_tasks()
+    planner.check_for_confirmation_tasks()
+    assert planner.confirmation_task_queue.qsize() == 0
+    assert len(planner.pending_confirmation_tasks) == 0
+
+    # the reverted transfer is scheduled again once it reappears
+    planner.apply_transfer_events([transfer_events[2]])
+    planner.process_transfer_fetcher_event(FetcherReachedHeadEvent(10))
+    planner.check_for_confirmation_tasks()
+    assert get_available_events(planner.confirmation_task_queue) == [transfer_events[2]]
+
+
+def test_planner_rejects_unknown_confirmation_task_order():
+    with pytest.raises(ValueError):
+        ConfirmationTaskPlanner(
+            sync_persistence_time=1,
+            transfer_event_queue=Queue(),
+            home_bridge_event_queue=Queue(),
+            confirmation_task_queue=Queue(),
+            confirmation_task_order="newest",
+        )
+
+
+def test_recorder_counts_scheduled_transfers(recorder, transfer_events):
+    recorder.apply_events([next(transfer_events) for _ in range(2)])
+    assert recorder.count_scheduled_transfers() == 0
+    recorder.pull_transfers_to_confirm()
+    assert recorder.count_scheduled_transfers() == 2
+
+
+def test_recorder_reports_age_of_unconfirmed_transfers(recorder, transfer_event):
+    assert recorder.get_oldest_unconfirmed_transfer_age() == 0
+    recorder.apply_proper_event(transfer_event)
+    assert recorder.get_oldest_unconfirmed_transfer_age() > 0
+
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            CONFIRMATION_EVENT_NAME, compute_transfer_hash(transfer_event), b"\x00"
+        )
+    )
+    assert recorder.get_oldest_unconfirmed_transfer_age() == 0
+
+
+def get_number_of_latency_observations(metric_name, validator):
+    return (
+        REGISTRY.get_sample_value(f"{metric_name}_count", {"validator": validator}) or 0
+    )
+
+
+def test_planner_observes_scheduling_latency(planner, transfer_event):
+    validator = "0x" + "11" * 20
+    other_validator = "0x" + "22" * 20
+    planner.expose_metrics(validator)
+    metric_name = "bridge_transfer_scheduling_latency_seconds"
+    number_of_observations = get_number_of_latency_observations(metric_name, validator)
+    number_of_other_observations = get_number_of_latency_observations(
+        metric_name, other_validator
+    )
+
+    planner.apply_transfer_events([transfer_event])
+    planner.process_transfer_fetcher_event(FetcherReachedHeadEvent(10))
+    planner.process_home_bridge_fetcher_event(FetcherReachedHeadEvent(10))
+
+    assert (
+        get_number_of_latency_observations(metric_name, validator)
+        == number_of_observations + 1
+    )
+    assert (
+        get_number_of_latency_observations(metric_name, other_validator)
+        == number_of_other_observations
+    )
+
+
+def test_recorder_observes_completion_latency(recorder, transfer_event):
+    validator = "0x" + "33" * 20
+    recorder.expose_metrics(validator)
+    metric_name = "bridge_transfer_completion_latency_seconds"
+    number_of_observations = get_number_of_latency_observations(metric_name, validator)
+
+    recorder.apply_proper_event(transfer_event)
+    recorder.apply_proper_event(
+        get_transfer_hash_event(
+            COMPLETION_EVENT_NAME, compute_transfer_hash(transfer_event), b"\x00"
+        )
+    )
+    assert (
+        get_number_of_latency_observations(metric_name, validator)
+        == number_of_observations + 1
+    )
@@ -0,0 +1,70 @@
+import pytest
+from eth_keys.datatypes import PrivateKey
+from eth_utils import to_canonical_address
+from web3 import Web3
+
+from bridge.confirmation_transaction import (
+    CONFIRM_TRANSFER_SELECTOR,
+    encode_confirm_transfer_call,
+    sign_transaction,
+)
+from bridge.contract_abis import HOME_BRIDGE_ABI
+
+HOME_BRIDGE_ADDRESS = "0x2B5AD5c4795c026514f8317c7a215E218DcCD6cF"
+RECIPIENT = "0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf"
+PRIVATE_KEY = PrivateKey(b"\x01" * 32)
+
+
+@pytest.fixture
+def home_bridge_contract():
+    """The home bridge contract on a web3 instance without a provider"""
+    return Web3().eth.contract(address=HOME_BRIDGE_ADDRESS, abi=HOME_BRIDGE_ABI)
+
+
+@pytest.mark.parametrize("amount", [0, 1, 2 ** 256 - 1])
+def test_encode_confirm_transfer_call(home_bridge_contract, amount):
+    arguments = (b"\x11" * 32, b"\x22" * 32, amount, RECIPIENT)
+    data = encode_confirm_transfer_call(*arguments)
+    assert data[:4] == CONFIRM_TRANSFER_SELECTOR
+    assert data == bytes.fromhex(
+        home_bridge_contract.encodeABI(fn_name="confirmTransfer", args=arguments)[2:]
+    )
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        (b"\x11" * 31, b"\x22" * 32, 1, RECIPIENT),
+        (b"\x11" * 32, b"\x22" * 33, 1, RECIPIENT),
+        (b"\x11" * 32, b"\x22" * 32, -1, RECIPIENT),
+        (b"\x11" * 32, b"\x22" * 32, 2 ** 256, RECIPIENT),
+    ],
+)
+def test_encode_invalid_confirm_transfer_call(arguments):
+    with pytest.raises(ValueError):
+        encode_confirm_transfer_call(*arguments)
+
+
+def test_sign_transaction_like_web3(home_bridge_contract):
+    arguments = (b"\x11" * 32, b"\x22" * 32, 10 ** 18, RECIPIENT)
+    transaction = home_bridge_contract.functions.confirmTransfer(
+        *arguments
+    ).buildTransaction({"gasPrice": 10, "nonce": 7, "gas": 400_000, "chainId": 4660})
+    expected_signed_transaction = home_bridge_contract.web3.eth.account.sign_transaction(
+        transaction, PRIVATE_KEY.to_bytes()
+    )
+
+    signed_transaction = sign_transaction(
+        private_key=PRIVATE_KEY,
+        nonce=7,
+        gas_price=10,
+        gas=400_000,
+        to=to_canonical_address(HOME_BRIDGE_ADDRESS),
+        value=0,
+        data=encode_confirm_transfer_call(*arguments),
+        chain_id=4660,
+    )
+    assert (
+        signed_transaction.rawTransaction == expected_signed_transaction.rawTransaction
+    )
+    assert signed_transaction.hash == expected_signed_transaction.hash
@@ -0,0 +1,75 @@
+import pytest
+from eth_utils import to_checksum_address
+from gevent.queue import Queue
+
+from bridge.constants import (
+    COMPLETION_EVENT_NAME,
+    CONFIRMATION_EVENT_NAME,
+    TRANSFER_EVENT_NAME,
+)
+from bridge.event_distributor import EventDistributor
+from bridge.event_fetcher import FetcherReachedHeadEvent
+from bridge.events import ChainEvent
+
+VALIDATOR_ADDRESS = b"\x11" * 20
+OTHER_VALIDATOR_ADDRESS = b"\x22" * 20
+
+
+def get_event(event_name, validator=None):
+    return ChainEvent(
+        event=event_name,
+        transactionHash=b"\x00" * 32,
+        logIndex=0,
+        blockNumber=1,
+        validator=validator,
+    )
+
+
+@pytest.fixture
+def validator_queues():
+    """An event queue for each of two validators."""
+    return {VALIDATOR_ADDRESS: Queue(), OTHER_VALIDATOR_ADDRESS: Queue()}
+
+
+@pytest.fixture
+def event_distributor(validator_queues):
+    """An event distributor to two validators."""
+    return EventDistributor(Queue(), validator_queues)
+
+
+@pytest.mark.parametrize(
+    "event",
+    [
+        get_event(TRANSFER_EVENT_NAME),
+        get_event(COMPLETION_EVENT_NAME),
+        FetcherReachedHeadEvent(10),
+    ],
+)
+def test_distribute_event_to_all_validators(event_distributor, validator_queues, event):
+    event_distributor.distribute_event(event)
+    for validator_queue in validator_queues.values():
+        assert validator_queue.get_nowait() is event
+
+
+def test_distribute_confirmation_event_to_its_validator(
+    event_distributor, validator_queues
+):
+    event = get_event(CONFIRMATION_EVENT_NAME, to_checksum_address(VALIDATOR_ADDRESS))
+    event_distributor.distribute_event(event)
+    assert validator_queues[VALIDATOR_ADDRESS].get_nowait() is event
+    assert validator_queues[OTHER_VALIDATOR_ADDRESS].empty()
+
+
+def test_drop_confirmation_event_of_unknown_validator(
+    event_distributor, validator_queues
+):
+    event_distributor.distribute_event(
+        get_event(CONFIRMATION_EVENT_NAME, to_checksum_address(b"\x33" * 20))
+    )
+    for validator_queue in validator_queues.values():
+        assert validator_queue.empty()
+
+
+def test_instantiate_event_distributor_without_validators():
+    with pytest.raises(ValueError):
+        EventDistributor(Queue(), {})
@@ -2,9 +2,25 @@ from typing import List
 
 import gevent
 import pytest
-
-from bridge.constants import TRANSFER_EVENT_NAME
-from bridge.event_fetcher import EventFetcher, FetcherReachedHeadEvent
+from gevent.queue import Queue
+from prometheus_client import REGISTRY
+
+from bridge.checkpoint_store import CheckpointStore
+from bridge.constants import (
+    COMPLETION_EVENT_NAME,
+    CONFIRMATION_EVENT_NAME,
+    TRANSFER_EVENT_NAME,
+)
+from bridge.contract_abis import HOME_BRIDGE_ABI
+from bridge.event_fetcher import (
+    EventFetcher,
+    FetcherProgressEvent,
+    FetcherReachedHeadEvent,
+    FetcherReorgEvent,
+)
+from bridge.events import ChainEvent
+from bridge.head_tracker import HeadTracker
+from bridge.utils import compute_transfer_hashes
 
 
 def fetch_all_events(fetcher: EventFetcher) -> List:
@@ -132,7 +148,7 @@ def test_instantiate_event_fetcher_with_negative_start_block_number(
 def test_fetch_events_in_range(
     transfer_event_fetcher,
     w3_foreign,
-    transfer_event_filter_definition,
+    premint_token_address,
     transfer_tokens_to_foreign_bridge,
 ):
     transfer_tokens_to_foreign_bridge()
@@ -142,11 +158,15 @@ def test_fetch_events_in_range(
 
     event = events[0]
 
-    assert event["event"] == TRANSFER_EVENT_NAME
-
-    transfer_arguments = transfer_event_filter_definition[TRANSFER_EVENT_NAME]
-    for argument_name, argument_value in transfer_arguments.items():
-        assert event.args[argument_name] == argument_value
+    assert event == ChainEvent(
+        event=TRANSFER_EVENT_NAME,
+        transactionHash=event.transactionHash,
+        logIndex=0,
+        blockNumber=event.blockNumber,
+        value=1,
+        sender=premint_token_address,
+        transferHash=compute_transfer_hashes([(event.transactionHash, 0)])[0],
+    )
 
 
 def test_fetch_events_in_range_ignore_not_matching_arguments(
@@ -257,6 +277,27 @@ def test_fetch_event_synthetic_sync_event(
         assert isinstance(transfer_event_queue.get(), FetcherReachedHeadEvent)
 
 
+def test_fetch_events_reports_progress_before_reaching_head(
+    make_transfer_event_fetcher,
+    transfer_event_queue,
+    transfer_tokens_to_foreign_bridge,
+    w3_foreign,
+    spawn,
+):
+    transfer_tokens_to_foreign_bridge()
+    poll_time = 0.1
+    transfer_event_fetcher = make_transfer_event_fetcher(max_reorg_depth=0)
+    spawn(transfer_event_fetcher.fetch_events, poll_time)
+
+    with gevent.Timeout(poll_time + 0.05):
+        assert isinstance(transfer_event_queue.get(), ChainEvent)
+        progress_event = transfer_event_queue.get()
+        assert isinstance(progress_event, FetcherProgressEvent)
+        assert progress_event.finalized_block_number == progress_event.block_number
+        assert progress_event.block_number <= w3_foreign.eth.blockNumber
+        assert isinstance(transfer_event_queue.get(), FetcherReachedHeadEvent)
+
+
 def test_fetch_events_continuously(
     make_transfer_event_fetcher,
     transfer_event_queue,
@@ -315,3 +356,338 @@ def test_fetch_multiple_events(
     ]  # there might be earlier events we don't care about
     event_names = [event.event for event in events]
     assert event_names == ["Transfer", "Approval", "Approval", "Transfer"]
+
+
+@pytest.mark.parametrize(
+    "combine_event_filters, expected_number_of_queries", [(True, 1), (False, 2)]
+)
+def test_fetch_multiple_events_combined_filter(
+    make_transfer_event_fetcher,
+    token_contract,
+    premint_token_address,
+    w3_foreign,
+    monkeypatch,
+    combine_event_filters,
+    expected_number_of_queries,
+):
+    transfer_and_approval_fetcher = make_transfer_event_fetcher(
+        filter_definition={"Transfer": {}, "Approval": {}},
+        combine_event_filters=combine_event_filters,
+    )
+
+    token_contract.functions.transfer(premint_token_address, 1).transact(
+        {"from": premint_token_address}
+    )
+    token_contract.functions.approve(premint_token_address, 1).transact(
+        {"from": premint_token_address}
+    )
+
+    get_logs_calls = []
+    get_logs = w3_foreign.eth.getLogs
+
+    def counting_get_logs(filter_params):
+        get_logs_calls.append(filter_params)
+        return get_logs(filter_params)
+
+    monkeypatch.setattr(w3_foreign.eth, "getLogs", counting_get_logs)
+
+    events = transfer_and_approval_fetcher.fetch_events_in_range(
+        0, w3_foreign.eth.blockNumber
+    )
+
+    assert len(get_logs_calls) == expected_number_of_queries
+    assert [event.event for event in events][-2:] == ["Transfer", "Approval"]
+
+
+def test_fetch_events_in_range_with_indexed_filter_uses_own_query(
+    make_transfer_event_fetcher, transfer_event_filter_definition
+):
+    fetcher = make_transfer_event_fetcher(
+        filter_definition={**transfer_event_filter_definition, "Approval": {}}
+    )
+    assert len(fetcher.log_queries) == 2
+
+
+def test_fetch_events_in_range_filters_validator_on_node(
+    w3_home, home_bridge_contract, proxy_validators, validator_address, monkeypatch
+):
+    for validator in proxy_validators[:2]:
+        home_bridge_contract.functions.confirmTransfer(
+            b"\x01" * 32, b"\x02" * 32, 1, validator_address
+        ).transact({"from": validator})
+
+    home_bridge_event_fetcher = EventFetcher(
+        web3=w3_home,
+        contract=w3_home.eth.contract(
+            address=home_bridge_contract.address, abi=HOME_BRIDGE_ABI
+        ),
+        filter_definition={
+            CONFIRMATION_EVENT_NAME: {"validator": validator_address},
+            COMPLETION_EVENT_NAME: {},
+        },
+        event_queue=Queue(),
+        max_reorg_depth=0,
+        start_block_number=0,
+    )
+
+    get_logs_calls = []
+    get_logs = w3_home.eth.getLogs
+
+    def counting_get_logs(filter_params):
+        logs = get_logs(filter_params)
+        get_logs_calls.append((filter_params, logs))
+        return logs
+
+    monkeypatch.setattr(w3_home.eth, "getLogs", counting_get_logs)
+
+    events = home_bridge_event_fetcher.fetch_events_in_range(0, w3_home.eth.blockNumber)
+
+    assert [event.validator for event in events] == [validator_address]
+
+    confirmation_query, confirmation_logs = get_logs_calls[0]
+    assert len(confirmation_query["topics"]) == 2
+    assert len(confirmation_logs) == 1
+
+
+def test_fetch_events_in_range_filters_several_validators(
+    w3_home, home_bridge_contract, proxy_validators, validator_address
+):
+    for validator in proxy_validators[:2]:
+        home_bridge_contract.functions.confirmTransfer(
+            b"\x01" * 32, b"\x02" * 32, 1, validator_address
+        ).transact({"from": validator})
+
+    home_bridge_event_fetcher = EventFetcher(
+        web3=w3_home,
+        contract=w3_home.eth.contract(
+            address=home_bridge_contract.address, abi=HOME_BRIDGE_ABI
+        ),
+        filter_definition={
+            CONFIRMATION_EVENT_NAME: {"validator": proxy_validators[:2]}
+        },
+        event_queue=Queue(),
+        max_reorg_depth=0,
+        start_block_number=0,
+    )
+
+    events = home_bridge_event_fetcher.fetch_events_in_range(0, w3_home.eth.blockNumber)
+    assert [event.validator for event in events] == proxy_validators[:2]
+
+
+def test_fetch_some_events_bisects_too_large_ranges(
+    make_transfer_event_fetcher,
+    tester_foreign,
+    w3_foreign,
+    transfer_tokens_to_foreign_bridge,
+    foreign_chain_max_reorg_depth,
+    monkeypatch,
+):
+    transfer_event_fetcher = make_transfer_event_fetcher(event_fetch_limit=32)
+
+    for _ in range(5):
+        transfer_tokens_to_foreign_bridge()
+
+    tester_foreign.mine_blocks(foreign_chain_max_reorg_depth + 32)
+
+    get_logs = w3_foreign.eth.getLogs
+
+    def limited_get_logs(filter_params):
+        if filter_params["toBlock"] - filter_params["fromBlock"] >= 4:
+            raise ValueError({"code": -32005, "message": "query timed out"})
+        return get_logs(filter_params)
+
+    monkeypatch.setattr(w3_foreign.eth, "getLogs", limited_get_logs)
+
+    events = fetch_all_events(transfer_event_fetcher)
+    assert len(events) == 5
+    assert transfer_event_fetcher.block_range_controller.size < 32
+
+
+def test_fetch_some_events_grows_range_on_sparse_blocks(
+    make_transfer_event_fetcher, tester_foreign, foreign_chain_max_reorg_depth
+):
+    transfer_event_fetcher = make_transfer_event_fetcher(event_fetch_limit=2)
+    tester_foreign.mine_blocks(foreign_chain_max_reorg_depth + 20)
+
+    fetch_all_events(transfer_event_fetcher)
+    assert transfer_event_fetcher.block_range_controller.size > 2
+
+
+def test_instantiate_event_fetcher_with_zero_prefetch_depth(
+    make_transfer_event_fetcher
+):
+    with pytest.raises(ValueError):
+        make_transfer_event_fetcher(prefetch_depth=0)
+
+
+@pytest.mark.parametrize("prefetch_depth", [1, 2, 5])
+def test_fetch_some_events_with_prefetching(
+    make_transfer_event_fetcher,
+    tester_foreign,
+    transfer_tokens_to_foreign_bridge,
+    foreign_chain_max_reorg_depth,
+    prefetch_depth,
+):
+    transfer_event_fetcher = make_transfer_event_fetcher(
+        event_fetch_limit=3, max_event_fetch_limit=3, prefetch_depth=prefetch_depth
+    )
+
+    for _ in range(20):
+        transfer_tokens_to_foreign_bridge()
+
+    tester_foreign.mine_blocks(foreign_chain_max_reorg_depth)
+    events = fetch_all_events(transfer_event_fetcher)
+
+    assert len(events) == 20
+    event_positions = [(event.blockNumber, event.logIndex) for event in events]
+    assert event_positions == sorted(event_positions)
+
+
+def test_fetch_some_events_with_shared_head_tracker(
+    make_transfer_event_fetcher,
+    w3_foreign,
+    tester_foreign,
+    transfer_tokens_to_foreign_bridge,
+    foreign_chain_max_reorg_depth,
+):
+    head_tracker = HeadTracker(w3_foreign, max_age=60)
+    transfer_event_fetcher = make_transfer_event_fetcher(head_tracker=head_tracker)
+
+    transfer_tokens_to_foreign_bridge()
+    head_tracker.refresh()
+    tester_foreign.mine_blocks(foreign_chain_max_reorg_depth)
+
+    # the cached head is not old enough to see the event after the reorg depth
+    assert len(fetch_all_events(transfer_event_fetcher)) == 0
+
+    head_tracker.refresh()
+    assert len(fetch_all_events(transfer_event_fetcher)) == 1
+
+
+def test_fetch_events_resumes_from_checkpoint(
+    make_transfer_event_fetcher,
+    tester_foreign,
+    w3_foreign,
+    transfer_tokens_to_foreign_bridge,
+    foreign_chain_max_reorg_depth,
+    tmp_path,
+):
+    checkpoint_store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+
+    transfer_tokens_to_foreign_bridge()
+    tester_foreign.mine_blocks(foreign_chain_max_reorg_depth)
+    transfer_event_fetcher = make_transfer_event_fetcher(
+        checkpoint_store=checkpoint_store
+    )
+    events = fetch_all_events(transfer_event_fetcher)
+    assert len(events) == 1
+
+    checkpoint_store.store(
+        transfer_event_fetcher.contract.address, events[0].blockNumber
+    )
+
+    transfer_tokens_to_foreign_bridge()
+    tester_foreign.mine_blocks(foreign_chain_max_reorg_depth)
+    resumed_transfer_event_fetcher = make_transfer_event_fetcher(
+        checkpoint_store=checkpoint_store
+    )
+    assert (
+        resumed_transfer_event_fetcher.last_fetched_block_number
+        == events[0].blockNumber
+    )
+    assert len(fetch_all_events(resumed_transfer_event_fetcher)) == 1
+
+
+def test_wait_for_new_blocks_wakes_up_on_new_head(
+    make_transfer_event_fetcher, w3_foreign, foreign_chain_max_reorg_depth, spawn
+):
+    head_tracker = HeadTracker(w3_foreign, max_age=60)
+    transfer_event_fetcher = make_transfer_event_fetcher(head_tracker=head_tracker)
+    fetch_all_events(transfer_event_fetcher)
+
+    greenlet = spawn(transfer_event_fetcher.wait_for_new_blocks, 10)
+    gevent.sleep(0.01)
+
+    # a new head within the reorg depth is not of interest
+    head_tracker.update(
+        transfer_event_fetcher.last_fetched_block_number + foreign_chain_max_reorg_depth
+    )
+    gevent.sleep(0.01)
+    assert not greenlet.dead
+
+    head_tracker.update(
+        transfer_event_fetcher.last_fetched_block_number
+        + foreign_chain_max_reorg_depth
+        + 1
+    )
+    with gevent.Timeout(0.1):
+        greenlet.join()
+
+
+def test_fetch_some_events_following_the_head(
+    make_transfer_event_fetcher, transfer_tokens_to_foreign_bridge
+):
+    transfer_event_fetcher = make_transfer_event_fetcher(follow_head=True)
+    transfer_tokens_to_foreign_bridge()
+
+    assert len(fetch_all_events(transfer_event_fetcher)) == 1
+
+
+def test_fetch_some_events_following_the_head_reverts_reorged_events(
+    make_transfer_event_fetcher, tester_foreign, transfer_tokens_to_foreign_bridge
+):
+    transfer_event_fetcher = make_transfer_event_fetcher(follow_head=True)
+    snapshot = tester_foreign.take_snapshot()
+    transfer_tokens_to_foreign_bridge()
+    reorged_events = fetch_all_events(transfer_event_fetcher)
+    reorged_block_number = reorged_events[0].blockNumber
+
+    tester_foreign.revert_to_snapshot(snapshot)
+    tester_foreign.mine_block()
+    transfer_tokens_to_foreign_bridge()
+
+    events = fetch_all_events(transfer_event_fetcher)
+    assert isinstance(events[0], FetcherReorgEvent)
+    assert events[0].block_number == reorged_block_number
+    assert [event.blockNumber for event in events[1:]] == [reorged_block_number + 1]
+
+
+def get_decoded_event_cache_counts(contract_address):
+    labels = {"contract_address": contract_address}
+    return tuple(
+        REGISTRY.get_sample_value(f"{metric_name}_total", labels) or 0
+        for metric_name in (
+            "bridge_decoded_event_cache_hits",
+            "bridge_decoded_event_cache_misses",
+        )
+    )
+
+
+def test_fetch_events_in_range_decodes_logs_once(
+    transfer_event_fetcher,
+    w3_foreign,
+    transfer_tokens_to_foreign_bridge,
+    token_contract,
+):
+    transfer_tokens_to_foreign_bridge()
+    head_block_number = w3_foreign.eth.blockNumber
+    hits, misses = get_decoded_event_cache_counts(token_contract.address)
+
+    events = transfer_event_fetcher.fetch_events_in_range(0, head_block_number)
+    assert get_decoded_event_cache_counts(token_contract.address) == (
+        hits,
+        misses + len(events),
+    )
+
+    assert transfer_event_fetcher.fetch_events_in_range(0, head_block_number) == events
+    assert get_decoded_event_cache_counts(token_contract.address) == (
+        hits + len(events),
+        misses + len(events),
+    )
+
+
+def test_instantiate_event_fetcher_with_zero_decoded_event_cache_size(
+    make_transfer_event_fetcher
+):
+    with pytest.raises(ValueError):
+        make_transfer_event_fetcher(decoded_event_cache_size=0)
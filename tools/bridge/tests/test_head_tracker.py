@@ -0,0 +1,68 @@
+import gevent
+import pytest
+
+from bridge.head_tracker import HeadTracker
+
+
+@pytest.fixture
+def head_tracker(w3_foreign):
+    """A head tracker caching the head of the foreign chain for a long time"""
+    return HeadTracker(w3_foreign, max_age=60)
+
+
+def test_instantiate_head_tracker_with_negative_max_age(w3_foreign):
+    with pytest.raises(ValueError):
+        HeadTracker(w3_foreign, max_age=-1)
+
+
+def test_head_tracker_initially_requests_head(head_tracker, w3_foreign):
+    assert head_tracker.get_block_number() == w3_foreign.eth.blockNumber
+
+
+def test_head_tracker_caches_head(head_tracker, tester_foreign):
+    block_number = head_tracker.get_block_number()
+    tester_foreign.mine_blocks(3)
+    assert head_tracker.get_block_number() == block_number
+
+
+def test_head_tracker_refreshes_head(head_tracker, w3_foreign, tester_foreign):
+    head_tracker.get_block_number()
+    tester_foreign.mine_blocks(3)
+    assert head_tracker.refresh() == w3_foreign.eth.blockNumber
+    assert head_tracker.get_block_number() == w3_foreign.eth.blockNumber
+
+
+def test_head_tracker_refreshes_head_after_max_age(w3_foreign, tester_foreign):
+    head_tracker = HeadTracker(w3_foreign, max_age=0.05)
+    head_tracker.get_block_number()
+    tester_foreign.mine_blocks(3)
+    gevent.sleep(0.1)
+    assert head_tracker.get_block_number() == w3_foreign.eth.blockNumber
+
+
+def test_head_tracker_without_max_age_always_refreshes(w3_foreign, tester_foreign):
+    head_tracker = HeadTracker(w3_foreign)
+    head_tracker.get_block_number()
+    tester_foreign.mine_blocks(3)
+    assert head_tracker.get_block_number() == w3_foreign.eth.blockNumber
+
+
+def test_head_tracker_age(head_tracker):
+    assert head_tracker.age == float("inf")
+    _, age = head_tracker.get_block_number_with_age()
+    assert 0 <= age < 1
+
+
+def test_head_tracker_update(head_tracker):
+    head_tracker.update(1234)
+    assert head_tracker.get_block_number() == 1234
+
+
+def test_head_tracker_wait_for_update_times_out(head_tracker):
+    assert not head_tracker.wait_for_update(0.01)
+
+
+def test_head_tracker_wait_for_update(head_tracker, spawn):
+    spawn(head_tracker.update, 1234)
+    assert head_tracker.wait_for_update(1)
+    assert head_tracker.block_number == 1234
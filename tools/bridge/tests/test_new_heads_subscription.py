@@ -0,0 +1,91 @@
+import json
+
+import gevent
+import pytest
+from gevent.queue import Queue
+from gevent.server import StreamServer
+from gevent.socket import AF_UNIX, SOCK_STREAM, socket
+
+from bridge.head_tracker import HeadTracker
+from bridge.new_heads_subscription import NewHeadsSubscription
+
+SUBSCRIPTION_ID = "0xcd0c3e8af590364c09d0fa6a1210faf5"
+
+
+def make_new_head_notification(block_number):
+    return {
+        "jsonrpc": "2.0",
+        "method": "eth_subscription",
+        "params": {
+            "subscription": SUBSCRIPTION_ID,
+            "result": {"number": hex(block_number)},
+        },
+    }
+
+
+@pytest.fixture
+def ipc_path(tmp_path):
+    """Path of the IPC socket of the fake node"""
+    return str(tmp_path / "node.ipc")
+
+
+@pytest.fixture
+def fake_node(ipc_path):
+    """Fake node answering a new heads subscription via IPC
+
+    It pushes all block numbers put into the returned queue as new heads.
+    """
+    new_heads = Queue()
+
+    def handle(connection, address):
+        request = json.loads(connection.recv(4096).decode())
+        assert request["method"] == "eth_subscribe"
+        assert request["params"] == ["newHeads"]
+        connection.sendall(
+            json.dumps(
+                {"jsonrpc": "2.0", "id": request["id"], "result": SUBSCRIPTION_ID}
+            ).encode()
+        )
+        for block_number in new_heads:
+            connection.sendall(
+                json.dumps(make_new_head_notification(block_number)).encode()
+            )
+
+    listener = socket(AF_UNIX, SOCK_STREAM)
+    listener.bind(ipc_path)
+    listener.listen(1)
+    server = StreamServer(listener, handle)
+    server.start()
+    yield new_heads
+    server.stop()
+
+
+@pytest.fixture
+def head_tracker(w3_foreign):
+    """A head tracker which does not poll on its own during the tests"""
+    return HeadTracker(w3_foreign, max_age=60)
+
+
+def test_new_heads_subscription_updates_head_tracker(
+    fake_node, ipc_path, head_tracker, spawn
+):
+    subscription = NewHeadsSubscription(url=ipc_path, head_tracker=head_tracker)
+    spawn(subscription.run)
+
+    fake_node.put(16)
+    assert head_tracker.wait_for_update(1)
+    assert head_tracker.get_block_number() == 16
+
+    fake_node.put(17)
+    assert head_tracker.wait_for_update(1)
+    assert head_tracker.get_block_number() == 17
+
+
+def test_new_heads_subscription_survives_missing_node(ipc_path, head_tracker, spawn):
+    subscription = NewHeadsSubscription(
+        url=ipc_path, head_tracker=head_tracker, reconnect_delay=0.01
+    )
+    greenlet = spawn(subscription.run)
+    gevent.sleep(0.05)
+    assert not greenlet.dead
+    assert head_tracker.block_number is None
@@ -0,0 +1,56 @@
+import pytest
+from eth_utils import to_canonical_address
+
+from bridge.nonce_manager import NonceManager, is_nonce_error
+
+
+@pytest.fixture
+def account(w3_home):
+    """An account with funds on the home chain."""
+    return w3_home.eth.accounts[0]
+
+
+@pytest.fixture
+def nonce_manager(w3_home, account):
+    """A nonce manager for the account."""
+    return NonceManager(w3_home, to_canonical_address(account))
+
+
+def send_transaction(w3_home, account):
+    w3_home.eth.sendTransaction({"from": account, "to": account, "value": 0})
+
+
+def test_allocate_nonces_locally(nonce_manager, w3_home, account, monkeypatch):
+    send_transaction(w3_home, account)
+    assert nonce_manager.allocate() == 1
+
+    monkeypatch.setattr(w3_home.eth, "getTransactionCount", None)
+    assert nonce_manager.allocate() == 2
+
+
+def test_synchronize_after_reset(nonce_manager, w3_home, account):
+    assert nonce_manager.allocate() == 0
+    nonce_manager.reset()
+    assert nonce_manager.allocate() == 0
+
+
+def test_check_for_gap(nonce_manager, w3_home, account):
+    nonce_manager.allocate()
+    assert nonce_manager.check_for_gap()
+    assert nonce_manager.allocate() == 0
+
+    send_transaction(w3_home, account)
+    assert not nonce_manager.check_for_gap()
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("nonce too low", True),
+        ("Transaction nonce is too low. Try incrementing the nonce.", True),
+        ("replacement transaction underpriced", True),
+        ("insufficient funds for gas * price + value", False),
+    ],
+)
+def test_is_nonce_error(message, expected):
+    assert is_nonce_error(ValueError({"code": -32000, "message": message})) is expected
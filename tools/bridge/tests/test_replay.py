@@ -0,0 +1,105 @@
+import pytest
+from eth_utils import to_checksum_address
+
+from bridge.constants import (
+    COMPLETION_EVENT_NAME,
+    CONFIRMATION_EVENT_NAME,
+    TRANSFER_EVENT_NAME,
+)
+from bridge.replay import (
+    HOME_CHAIN,
+    Replayer,
+    benchmark_confirmation_transactions,
+    decode_trace_event,
+    encode_trace_event,
+    generate_trace,
+    read_trace,
+    write_trace,
+)
+
+VALIDATOR_ADDRESS = b"\x01" * 20
+OTHER_VALIDATOR_ADDRESS = b"\x02" * 20
+
+
+@pytest.fixture
+def trace_events():
+    """A small synthetic trace with some completed transfers."""
+    return generate_trace(50, completed_share=0.5, transfers_per_block=3)
+
+
+def count_incomplete_transfers(trace_events):
+    number_of_transfers = sum(
+        trace_event.event.event == TRANSFER_EVENT_NAME for trace_event in trace_events
+    )
+    number_of_completed_transfers = (
+        sum(trace_event.chain == HOME_CHAIN for trace_event in trace_events) // 2
+    )
+    return number_of_transfers - number_of_completed_transfers
+
+
+def test_encode_and_decode_trace_event(trace_events):
+    for trace_event in trace_events:
+        assert decode_trace_event(encode_trace_event(trace_event)) == trace_event
+
+
+def test_write_and_read_trace(trace_events, tmp_path):
+    trace_path = str(tmp_path / "trace.jsonl")
+    assert write_trace(trace_path, trace_events) == len(trace_events)
+    assert read_trace(trace_path) == trace_events
+
+
+def test_replay_confirms_incomplete_transfers(trace_events):
+    report = Replayer(trace_events, max_confirmation_tasks_per_tick=2).run()
+    assert report.number_of_events == len(trace_events)
+    assert report.number_of_confirmation_tasks == count_incomplete_transfers(
+        trace_events
+    )
+    assert len(report.planning_latencies) == report.number_of_confirmation_tasks
+    assert report.stage_durations.keys() == {"fetch", "record", "plan"}
+    assert all(duration > 0 for duration in report.stage_durations.values())
+    assert "Stage durations" in report.format()
+
+
+def test_replay_ignores_confirmations_of_other_validators():
+    # all transfers are confirmed by another validator, but not completed
+    trace_events = [
+        trace_event._replace(
+            event=trace_event.event._replace(
+                validator=to_checksum_address(OTHER_VALIDATOR_ADDRESS)
+            )
+        )
+        if trace_event.event.event == CONFIRMATION_EVENT_NAME
+        else trace_event
+        for trace_event in generate_trace(20, completed_share=1.0)
+        if trace_event.event.event != COMPLETION_EVENT_NAME
+    ]
+
+    report = Replayer(trace_events, validator_address=VALIDATOR_ADDRESS).run()
+    assert report.number_of_events == 40
+    assert report.number_of_confirmation_tasks == 20
+
+    report = Replayer(trace_events, validator_address=OTHER_VALIDATOR_ADDRESS).run()
+    assert report.number_of_confirmation_tasks == 0
+
+
+def test_replay_at_limited_speed(trace_events):
+    # The trace spans 80 seconds of blocks. Transfers get confirmed before
+    # the home chain reaches their completion events now.
+    report = Replayer(trace_events, speed=1000).run()
+    assert report.duration >= 0.08
+    assert (
+        count_incomplete_transfers(trace_events)
+        <= report.number_of_confirmation_tasks
+        <= 50
+    )
+
+
+def test_replayer_rejects_zero_speed(trace_events):
+    with pytest.raises(ValueError):
+        Replayer(trace_events, speed=0)
+
+
+def test_benchmark_confirmation_transactions():
+    durations = benchmark_confirmation_transactions(3)
+    assert durations.keys() == {"web3", "offline"}
+    assert all(duration > 0 for duration in durations.values())
@@ -0,0 +1,42 @@
+from eth_utils import int_to_big_endian, keccak
+
+from bridge.constants import CONFIRMATION_EVENT_NAME, TRANSFER_EVENT_NAME
+from bridge.events import ChainEvent
+from bridge.utils import (
+    add_transfer_hashes,
+    compute_transfer_hash,
+    compute_transfer_hashes,
+)
+
+
+def get_event(event_name, log_index, transfer_hash=None):
+    return ChainEvent(
+        event=event_name,
+        transactionHash=b"\x11" * 32,
+        logIndex=log_index,
+        blockNumber=1,
+        transferHash=transfer_hash,
+    )
+
+
+def test_compute_transfer_hashes():
+    assert compute_transfer_hashes([(b"\x11" * 32, 0), (b"\x11" * 32, 300)]) == [
+        keccak(b"\x11" * 32 + b"\x00"),
+        keccak(b"\x11" * 32 + int_to_big_endian(300)),
+    ]
+
+
+def test_compute_transfer_hash_uses_hash_of_event():
+    transfer_event = get_event(TRANSFER_EVENT_NAME, 1, transfer_hash=b"\x22" * 32)
+    assert compute_transfer_hash(transfer_event) == b"\x22" * 32
+
+
+def test_add_transfer_hashes_only_to_transfer_events():
+    transfer_event = get_event(TRANSFER_EVENT_NAME, 1)
+    confirmation_event = get_event(CONFIRMATION_EVENT_NAME, 2, b"\x22" * 32)
+
+    events = add_transfer_hashes([transfer_event, confirmation_event])
+    assert events == [
+        transfer_event._replace(transferHash=compute_transfer_hash(transfer_event)),
+        confirmation_event,
+    ]
@@ -0,0 +1,60 @@
+import pytest
+
+from bridge.validator_status import ValidatorStatus
+
+
+@pytest.fixture
+def validator_status(home_bridge_contract, validator_address):
+    """Validator status of a validator, cached forever"""
+    return ValidatorStatus(
+        home_bridge_contract, validator_address, max_age=float("inf")
+    )
+
+
+def test_negative_max_age(home_bridge_contract, validator_address):
+    with pytest.raises(ValueError):
+        ValidatorStatus(home_bridge_contract, validator_address, max_age=-1)
+
+
+def test_check_validator(validator_status):
+    assert validator_status.check()
+
+
+def test_check_non_validator(home_bridge_contract, non_validator_address):
+    validator_status = ValidatorStatus(home_bridge_contract, non_validator_address)
+    assert not validator_status.check()
+
+
+def test_status_is_cached(
+    validator_status, validator_proxy_with_validators, system_address
+):
+    assert validator_status.check()
+    validator_proxy_with_validators.functions.updateValidators([]).transact(
+        {"from": system_address}
+    )
+    assert validator_status.check()
+
+
+def test_status_is_requested_again_after_invalidation(
+    validator_status, validator_proxy_with_validators, system_address
+):
+    assert validator_status.check()
+    validator_proxy_with_validators.functions.updateValidators([]).transact(
+        {"from": system_address}
+    )
+    validator_status.invalidate()
+    assert not validator_status.check()
+
+
+def test_status_is_requested_again_without_max_age(
+    home_bridge_contract,
+    validator_address,
+    validator_proxy_with_validators,
+    system_address,
+):
+    validator_status = ValidatorStatus(home_bridge_contract, validator_address)
+    assert validator_status.check()
+    validator_proxy_with_validators.functions.updateValidators([]).transact(
+        {"from": system_address}
+    )
+    assert not validator_status.check()